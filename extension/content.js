@@ -7,10 +7,62 @@ const serverUrl = 'http://127.0.0.1:8000';
 let clientGeneratedUserId = null;
 let databaseUserId = null;
 
+// Views that could not be sent yet, kept in storage and sent in one batch later
+const PENDING_WATCH_EVENTS_KEY = 'pendingWatchEvents';
+const MAX_PENDING_WATCH_EVENTS = 1000;
+
+function loadPendingWatchEvents() {
+    return new Promise((resolve) => {
+        chrome.storage.local.get([PENDING_WATCH_EVENTS_KEY], (result) => {
+            resolve(result[PENDING_WATCH_EVENTS_KEY] || []);
+        });
+    });
+}
+
+function savePendingWatchEvents(events) {
+    return new Promise((resolve) => {
+        chrome.storage.local.set({ [PENDING_WATCH_EVENTS_KEY]: events.slice(-MAX_PENDING_WATCH_EVENTS) }, resolve);
+    });
+}
+
+// Send any stored backlog of watched videos in a single request
+async function flushPendingWatchEvents() {
+    const events = await loadPendingWatchEvents();
+    if (!databaseUserId || events.length === 0) {
+        return;
+    }
+    
+    try {
+        const response = await fetch(`${serverUrl}/users/${databaseUserId}/watched_videos/batch`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ events: events }),
+        });
+        
+        if (response.ok) {
+            // Views queued while the request was in flight stay for the next flush
+            const eventKey = (event) => `${event.video_id}|${event.watched_at}`;
+            const sent = new Set(events.map(eventKey));
+            const remaining = (await loadPendingWatchEvents()).filter((event) => !sent.has(eventKey(event)));
+            await savePendingWatchEvents(remaining);
+            console.log(`Sent ${events.length} pending watched videos.`);
+        } else {
+            console.error('Error sending pending watched videos:', response.status);
+        }
+    } catch (error) {
+        console.error('Fetch error while sending pending watched videos:', error);
+    }
+}
+
 // Function to log watched videos
 async function logWatchedVideo(videoId) {
+    const event = { video_id: videoId, watched_at: Date.now() / 1000 };
+    
     if (!databaseUserId) {
-        console.log('Cannot log watched video: databaseUserId is not available.');
+        console.log('Cannot log watched video yet: databaseUserId is not available. Queued for later.');
+        await savePendingWatchEvents([...(await loadPendingWatchEvents()), event]);
         return;
     }
     
@@ -25,11 +77,59 @@ async function logWatchedVideo(videoId) {
         
         if (response.ok) {
             console.log('Watched video logged successfully.');
+            await flushPendingWatchEvents();
         } else {
             console.error('Error logging watched video:', response.status);
         }
     } catch (error) {
         console.error('Fetch error while logging watched video:', error);
+        await savePendingWatchEvents([...(await loadPendingWatchEvents()), event]);
+    }
+}
+
+// Ask the server to summarize the likely-next videos in the background
+const MAX_PREFETCH_VIDEOS = 5;
+
+function getUpNextVideoIds(currentVideoId) {
+    const ids = [];
+    const links = document.querySelectorAll('#secondary a[href*="/watch?v="], ytd-compact-video-renderer a[href*="/watch?v="]');
+    for (const link of links) {
+        const id = new URL(link.href, window.location.origin).searchParams.get('v');
+        if (id && id !== currentVideoId && !ids.includes(id)) {
+            ids.push(id);
+            if (ids.length >= MAX_PREFETCH_VIDEOS) {
+                break;
+            }
+        }
+    }
+    return ids;
+}
+
+// The browser's language preferences: transcripts are picked from these and
+// summaries are written in the first one.
+function languageOptions() {
+    return {
+        languages: Array.from(navigator.languages || []).slice(0, 10),
+        outputLanguage: navigator.language,
+    };
+}
+
+async function prefetchUpNextSummaries(currentVideoId) {
+    const videoIds = getUpNextVideoIds(currentVideoId);
+    if (videoIds.length === 0) {
+        return;
+    }
+    
+    try {
+        await fetch(`${serverUrl}/prefetch`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ videoIds: videoIds, userId: databaseUserId, ...languageOptions() }),
+        });
+    } catch (error) {
+        console.log('Prefetch request failed:', error);
     }
 }
 
@@ -400,99 +500,111 @@ function createSummaryContainer() {
     return container;
 }
 
-// Parse timestamp string to seconds
+// Parse "MM:SS" or "HH:MM:SS" timestamp string to seconds
 function timestampToSeconds(timestamp) {
-    const [minutes, seconds] = timestamp.split(':').map(Number);
-    return minutes * 60 + seconds;
+    return timestamp.split(':').map(Number).reduce((total, part) => total * 60 + part, 0);
 }
 
-// Handle timestamp clicks
+// Handle timestamp clicks (accepts seconds or a timestamp string)
 function handleTimestampClick(timestamp) {
-    const seconds = timestampToSeconds(timestamp);
+    const seconds = typeof timestamp === 'number' ? timestamp : timestampToSeconds(timestamp);
     const video = document.querySelector('video');
     if (video) {
         video.currentTime = seconds;
     }
 }
 
-// Format the summary points
-function formatSummaryPoints(summary) {
-    try {
-        console.log('Raw summary text:', summary);
-        
-        if (!summary || summary.trim() === '') {
-            console.error('Summary is empty or blank');
-            return `<div style="color: #ff6e6e; padding: 12px; background: rgba(255, 0, 0, 0.1); border-radius: 4px;">Error: Received empty summary</div>`;
-        }
-        
-        const points = summary.split('\n').filter(line => line.trim());
-        console.log('Parsed points:', points);
-        
-        if (points.length === 0) {
-            console.error('No points parsed from summary');
-            return `<div style="color: #ff6e6e; padding: 12px; background: rgba(255, 0, 0, 0.1); border-radius: 4px;">Error: No summary points found</div>`;
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+// Render one {seconds, label, text} summary point parsed by the server
+function renderSummaryPoint(point, colors) {
+    const { pointBgColor, pointBorderColor, pointTextColor, timestampColor } = colors;
+    return `
+        <div style="margin-bottom: 10px; padding: 10px; background: ${pointBgColor}; border-radius: 4px; border: 1px solid ${pointBorderColor};">
+            <span class="yt-summary-timestamp" data-seconds="${Number(point.seconds)}" 
+                  style="color: ${timestampColor}; font-weight: 500; cursor: pointer; display: inline-block; margin-bottom: 6px;">
+                ${escapeHtml(point.label)}
+            </span>
+            <div style="color: ${pointTextColor};">${escapeHtml(point.text)}</div>
+        </div>
+    `;
+}
+
+// Attach seek handlers to the timestamps rendered inside element
+function bindTimestampClicks(element) {
+    element.querySelectorAll('.yt-summary-timestamp').forEach(timestampElement => {
+        timestampElement.addEventListener('click', () => {
+            handleTimestampClick(Number(timestampElement.dataset.seconds));
+        });
+    });
+}
+
+// Stream summary points from the server's Server-Sent Events endpoint.
+// Calls onPoint for each {seconds, label, text} point and resolves with the final points.
+async function streamSummary(videoId, onPoint) {
+    const response = await fetch(`${serverUrl}/summarize/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream'
+        },
+        body: JSON.stringify({ videoId: videoId, ...languageOptions() })
+    });
+
+    console.log('Response status:', response.status, 'cache:', response.headers.get('X-Cache'));
+    
+    if (!response.ok) {
+        const errorText = await response.text();
+        console.error('Server response error:', errorText);
+        throw new Error(`Server error: ${response.status} - ${errorText}`);
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            break;
         }
+        buffer += decoder.decode(value, { stream: true });
         
-        const isDarkMode = detectYouTubeDarkMode();
-        const pointBgColor = isDarkMode ? '#2d2d2d' : '#ffffff';
-        const pointBorderColor = isDarkMode ? '#383838' : '#efefef';
-        const pointTextColor = isDarkMode ? '#aaa' : '#606060';
-        const timestampColor = isDarkMode ? '#3ea6ff' : '#065fd4';
-        
-        let formattedPoints = '';
-        let matchFound = false;
-        
-        for (const point of points) {
-            // Try multiple formats that might be returned by the server
-            let match = point.match(/Timestamp: \[(\d{2}:\d{2})\] - Key Point: (.*)/);
-            
-            if (!match) {
-                // Try alternative format: "00:27 - Key Point: ..."
-                match = point.match(/^(\d{2}:\d{2}) - Key Point: (.*)/);
-            }
+        // SSE events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
             
-            if (!match) {
-                // Try another alternative format: "[00:27] - ..."
-                match = point.match(/\[(\d{2}:\d{2})\] - (.*)/);
+            let eventType = 'message';
+            let eventData = '';
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event: ')) {
+                    eventType = line.slice(7);
+                } else if (line.startsWith('data: ')) {
+                    eventData += line.slice(6);
+                }
             }
             
-            if (match) {
-                matchFound = true;
-                const [_, timestamp, text] = match;
-                formattedPoints += `
-                    <div style="margin-bottom: 10px; padding: 10px; background: ${pointBgColor}; border-radius: 4px; border: 1px solid ${pointBorderColor};">
-                        <span class="yt-summary-timestamp" data-timestamp="${timestamp}" 
-                              style="color: ${timestampColor}; font-weight: 500; cursor: pointer; display: inline-block; margin-bottom: 6px;">
-                            ${timestamp}
-                        </span>
-                        <div style="color: ${pointTextColor};">${text}</div>
-                    </div>
-                `;
-            } else if (point.trim() !== '') {
-                // For non-matching lines that aren't empty, show them as plain text
-                formattedPoints += `<div style="margin-bottom: 10px; padding: 10px; background: ${pointBgColor}; border-radius: 4px; border: 1px solid ${pointBorderColor}; color: ${pointTextColor};">${point}</div>`;
+            const payload = JSON.parse(eventData);
+            if (eventType === 'point') {
+                onPoint(payload);
+            } else if (eventType === 'done') {
+                if (!payload.points || payload.points.length === 0) {
+                    throw new Error('No summary data received from server');
+                }
+                return payload.points;
+            } else if (eventType === 'error') {
+                throw new Error(`Server error: ${payload.error}`);
             }
         }
-        
-        // If no matches were found, show the raw summary
-        if (!matchFound) {
-            console.warn('No timestamp formatting matches found in summary');
-            const rawBgColor = isDarkMode ? '#2d2d2d' : '#f5f5f5';
-            const rawTextColor = isDarkMode ? '#aaa' : '#606060';
-            formattedPoints = `
-                <div style="color: #ff6e6e; padding: 12px; background: rgba(255, 0, 0, 0.1); border-radius: 4px; margin-bottom: 10px;">No formatted points found. Raw summary:</div>
-                <pre style="white-space: pre-wrap; background: ${rawBgColor}; padding: 10px; font-family: monospace; font-size: 12px; color: ${rawTextColor};">${summary}</pre>
-            `;
-        }
-        
-        return formattedPoints;
-    } catch (error) {
-        console.error('Error formatting summary points:', error);
-        return `
-            <div style="color: #ff6e6e; padding: 12px; background: rgba(255, 0, 0, 0.1); border-radius: 4px; margin-bottom: 10px;">Error formatting summary: ${error.message}</div>
-            <pre style="white-space: pre-wrap; background: #f5f5f5; padding: 10px; font-family: monospace; font-size: 12px;">${summary}</pre>
-        `;
     }
+    
+    throw new Error('Summary stream ended unexpectedly');
 }
 
 // Fetch and display summary
@@ -531,51 +643,38 @@ async function fetchAndDisplaySummary() {
         // Test server connection first (already done in checkServerStatus, but good to have as a pre-check if called independently)
         // For now, we assume checkServerStatus has already run.
 
-        // Fetch summary from backend
-        const response = await fetch(`${serverUrl}/summarize`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json'
-            },
-            body: JSON.stringify({ videoId: videoId })
-        });
-
-        console.log('Response status:', response.status);
-        
-        if (!response.ok) {
-            const errorText = await response.text();
-            console.error('Server response error:', errorText);
-            throw new Error(`Server error: ${response.status} - ${errorText}`);
-        }
-
-        const data = await response.json();
-        console.log('Received summary data:', data);
-        
-        if (!data.summary) {
-            throw new Error('No summary data received from server');
-        }
-
-        // Log the full summary to console for debugging
-        console.log('%c Full Summary From Server:', 'background: #3f51b5; color: white; padding: 4px;');
-        console.log(data.summary);
+        // Stream summary points from the backend as they are generated
+        const isDarkMode = detectYouTubeDarkMode();
+        const colors = {
+            pointBgColor: isDarkMode ? '#2d2d2d' : '#ffffff',
+            pointBorderColor: isDarkMode ? '#383838' : '#efefef',
+            pointTextColor: isDarkMode ? '#aaa' : '#606060',
+            timestampColor: isDarkMode ? '#3ea6ff' : '#065fd4'
+        };
         
-        if (data.debug_info) {
-            console.log('Debug info:', data.debug_info);
-        }
+        let pointsDiv = null;
         
-        console.log('Setting innerHTML with formatted summary points');
+        const points = await streamSummary(videoId, (point) => {
+            if (!pointsDiv) {
+                // Replace the loading indicator on the first point
+                contentDiv.innerHTML = '<div style="margin-bottom: 0;"></div>';
+                pointsDiv = contentDiv.firstElementChild;
+            }
+            
+            pointsDiv.insertAdjacentHTML('beforeend', renderSummaryPoint(point, colors));
+            bindTimestampClicks(pointsDiv.lastElementChild);
+        });
         
-        // Format and show the points with debug
-        const formattedHTML = formatSummaryPoints(data.summary);
-        console.log('Formatted HTML length:', formattedHTML.length);
+        console.log('%c Summary points from server:', 'background: #3f51b5; color: white; padding: 4px;');
+        console.log(points);
         
-        // Display the formatted summary
+        // The final list is validated and ordered by the server; render it as the source of truth
         contentDiv.innerHTML = `
             <div style="margin-bottom: 0;">
-                ${formattedHTML}
+                ${points.map(point => renderSummaryPoint(point, colors)).join('')}
             </div>
         `;
+        bindTimestampClicks(contentDiv);
         
         // Force styles to be visible
         container.style.display = 'block';
@@ -585,13 +684,6 @@ async function fetchAndDisplaySummary() {
         
         console.log('Summary content added to DOM');
 
-        // Add click handlers for timestamps
-        contentDiv.querySelectorAll('.yt-summary-timestamp').forEach(element => {
-            element.addEventListener('click', () => {
-                handleTimestampClick(element.dataset.timestamp);
-            });
-        });
-
         // Create and display notes section
         createNotesSection(contentDiv, videoId); // Pass contentDiv and videoId
         // Fetch and display existing notes
@@ -602,6 +694,9 @@ async function fetchAndDisplaySummary() {
 
         // Log watched video
         logWatchedVideo(videoId);
+        
+        // Warm the cache for the videos the user is likely to open next
+        prefetchUpNextSummaries(videoId);
 
 
     } catch (error) {
@@ -784,6 +879,7 @@ function getOrCreateUser() {
                     if (data.user_id) {
                         databaseUserId = data.user_id;
                         console.log('User identified/created. Client ID:', clientGeneratedUserId, 'DB ID:', databaseUserId);
+                        flushPendingWatchEvents(); // Send views recorded before the user was known
                         resolve(); // Resolve the promise when user identification is complete
                     } else {
                         console.error('Error: user_id not found in backend response', data);
@@ -908,6 +1004,45 @@ function createNotesSection(parentContainer, videoId) {
 }
 
 // Function to fetch and display notes
+function createNoteElement(note, isDarkMode) {
+    const noteElement = document.createElement('div');
+    noteElement.className = 'yt-individual-note';
+    // Basic styling here, more in styles.css
+    noteElement.style.padding = '8px';
+    noteElement.style.border = `1px solid ${isDarkMode ? '#444' : '#ddd'}`;
+    noteElement.style.marginBottom = '8px';
+    noteElement.style.borderRadius = '4px';
+    noteElement.style.backgroundColor = isDarkMode ? '#2b2b2b' : '#f9f9f9';
+    
+    const contentP = document.createElement('p');
+    contentP.textContent = note.content;
+    contentP.style.margin = '0 0 5px 0'; // Add some margin below content
+    noteElement.appendChild(contentP);
+
+    const timestampP = document.createElement('p');
+    timestampP.style.fontSize = '0.8em';
+    timestampP.style.color = isDarkMode ? '#aaa' : '#777';
+    timestampP.textContent = `Created: ${new Date(note.created_at).toUTCString()} | Updated: ${new Date(note.updated_at).toUTCString()}`;
+    noteElement.appendChild(timestampP);
+    
+    return noteElement;
+}
+
+// Fetch one page of notes; the server answers 304 (served from the browser cache) when nothing changed
+async function fetchNotesPage(videoId, cursor) {
+    const params = new URLSearchParams();
+    if (cursor) {
+        params.set('cursor', cursor);
+    }
+    const response = await fetch(`${serverUrl}/users/${databaseUserId}/notes_by_video/${videoId}?${params}`);
+    if (!response.ok) {
+        const errorData = await response.json();
+        console.error('Error fetching notes:', response.status, errorData);
+        throw new Error(errorData.error || response.statusText);
+    }
+    return response.json();
+}
+
 async function fetchAndDisplayNotes(videoId, notesDisplayContainer) {
     if (!databaseUserId) {
         console.log('Cannot fetch notes: databaseUserId is not available.');
@@ -917,49 +1052,42 @@ async function fetchAndDisplayNotes(videoId, notesDisplayContainer) {
 
     console.log(`Fetching notes for video: ${videoId}, user: ${databaseUserId}`);
     try {
-        const response = await fetch(`${serverUrl}/users/${databaseUserId}/notes_by_video/${videoId}`);
-        
-        if (!response.ok) {
-            const errorData = await response.json();
-            console.error('Error fetching notes:', response.status, errorData);
-            notesDisplayContainer.innerHTML = `<p style="color: #ff6e6e;">Error loading notes: ${errorData.error || response.statusText}</p>`;
-            return;
-        }
-
-        const notes = await response.json();
+        const page = await fetchNotesPage(videoId, null);
         notesDisplayContainer.innerHTML = ''; // Clear previous notes
 
-        if (notes.length === 0) {
+        if (page.notes.length === 0) {
             notesDisplayContainer.innerHTML = '<p style="font-style: italic; color: #888;">No notes for this video yet.</p>';
-        } else {
-            const isDarkMode = detectYouTubeDarkMode();
-            notes.forEach(note => {
-                const noteElement = document.createElement('div');
-                noteElement.className = 'yt-individual-note';
-                // Basic styling here, more in styles.css
-                noteElement.style.padding = '8px';
-                noteElement.style.border = `1px solid ${isDarkMode ? '#444' : '#ddd'}`;
-                noteElement.style.marginBottom = '8px';
-                noteElement.style.borderRadius = '4px';
-                noteElement.style.backgroundColor = isDarkMode ? '#2b2b2b' : '#f9f9f9';
-                
-                const contentP = document.createElement('p');
-                contentP.textContent = note.content;
-                contentP.style.margin = '0 0 5px 0'; // Add some margin below content
-                noteElement.appendChild(contentP);
-
-                const timestampP = document.createElement('p');
-                timestampP.style.fontSize = '0.8em';
-                timestampP.style.color = isDarkMode ? '#aaa' : '#777';
-                timestampP.textContent = `Created: ${new Date(note.created_at).toUTCString()} | Updated: ${new Date(note.updated_at).toUTCString()}`;
-                noteElement.appendChild(timestampP);
-                
-                notesDisplayContainer.appendChild(noteElement);
-            });
+            return;
         }
+        
+        const isDarkMode = detectYouTubeDarkMode();
+        const appendPage = (currentPage) => {
+            currentPage.notes.forEach(note => {
+                notesDisplayContainer.appendChild(createNoteElement(note, isDarkMode));
+            });
+            
+            if (currentPage.next_cursor) {
+                const moreButton = document.createElement('button');
+                moreButton.textContent = 'Load more notes';
+                moreButton.className = 'yt-notes-load-more';
+                moreButton.addEventListener('click', async () => {
+                    moreButton.disabled = true;
+                    try {
+                        const nextPage = await fetchNotesPage(videoId, currentPage.next_cursor);
+                        moreButton.remove();
+                        appendPage(nextPage);
+                    } catch (error) {
+                        console.error('Fetch error while fetching more notes:', error);
+                        moreButton.disabled = false;
+                    }
+                });
+                notesDisplayContainer.appendChild(moreButton);
+            }
+        };
+        appendPage(page);
     } catch (error) {
         console.error('Fetch error while fetching notes:', error);
-        notesDisplayContainer.innerHTML = '<p style="color: #ff6e6e;">An unexpected error occurred while fetching notes.</p>';
+        notesDisplayContainer.innerHTML = `<p style="color: #ff6e6e;">Error loading notes: ${error.message}</p>`;
     }
 }
 
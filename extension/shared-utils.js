@@ -17,10 +17,9 @@ function getCurrentVideoInfo() {
     return { videoId, videoUrl };
 }
 
-// Format timestamp to seconds
+// Format "MM:SS" or "HH:MM:SS" timestamp to seconds
 function timestampToSeconds(timestamp) {
-    const [minutes, seconds] = timestamp.split(':').map(Number);
-    return minutes * 60 + seconds;
+    return timestamp.split(':').map(Number).reduce((total, part) => total * 60 + part, 0);
 }
 
 // Handle timestamp clicks
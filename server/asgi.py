@@ -0,0 +1,267 @@
+"""Async (ASGI) serving mode for the summarizer.
+
+/summarize and /summarize/stream are served natively on the event loop:
+transcript fetches and Gemini calls are awaited through the shared
+Upstreams clients, so one process can hold hundreds of in-flight summaries.
+Every other route is handled by the Flask app mounted underneath.
+
+Run with:
+    uvicorn asgi:app --host 0.0.0.0 --port 8000
+or, with several preloaded workers:
+    SERVER_MODE=asgi gunicorn -c gunicorn.conf.py
+"""
+import asyncio
+import contextlib
+import functools
+import logging
+import time
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import metrics
+import server
+from chunked_summary import estimate_tokens
+from metrics import stage
+from singleflight import AsyncSingleFlight, FlightTimeout
+from sse import SummaryEventEncoder, replay_summary
+from summary_points import SUMMARY_GENERATION_CONFIG, PointStream, load_points, transcript_starts
+
+logger = logging.getLogger(__name__)
+
+summary_flights = AsyncSingleFlight()
+transcript_flights = AsyncSingleFlight()
+# Counted with the Flask flights by the summaries_in_flight gauge and the prefetch yield check
+server.summary_flight_groups.append(summary_flights)
+
+
+async def resolve_summary_transcript_async(video_id, languages, output_language):
+    """Async counterpart of server.resolve_summary_transcript(), coalesced the same way"""
+    resolved, _ = await transcript_flights.do(
+        (video_id, output_language),
+        lambda: load_summary_transcript_async(video_id, languages, output_language),
+        timeout=server.SUMMARY_FLIGHT_TIMEOUT,
+    )
+    return resolved
+
+
+async def load_summary_transcript_async(video_id, languages, output_language):
+    with stage('transcript_store'):
+        stored = await asyncio.to_thread(server.transcript_store.get, video_id, output_language, languages)
+    if stored:
+        logger.info(f"Reusing stored {stored.language_code} transcript for video {video_id}")
+        return stored
+    try:
+        with stage('resolve_transcript'):
+            fetched = await server.upstreams.resolve_transcript(video_id, languages, output_language)
+    except Exception:
+        with stage('transcript_store'):
+            stored = await asyncio.to_thread(server.transcript_store.get, video_id, None, languages)
+        if stored is None:
+            raise
+        logger.warning(f"Transcript fetch for video {video_id} failed; using the stored {stored.language_code} one")
+        return stored
+    with stage('transcript_store'):
+        return await asyncio.to_thread(server.transcript_store.put, fetched)
+
+
+async def build_summary_async(video_id, on_point=None, languages=None,
+                              output_language=server.DEFAULT_OUTPUT_LANGUAGE):
+    """Async counterpart of server.build_summary()"""
+    # Translating a cached summary is one short blocking call
+    points = await asyncio.to_thread(server.cached_translation, video_id, output_language)
+    if points is not None:
+        # on_point is emitted here, on the event loop, not from the worker thread
+        if on_point is not None:
+            for point in points:
+                on_point(point)
+        return points
+
+    try:
+        resolved = await resolve_summary_transcript_async(video_id, languages, output_language)
+    except Exception as e:
+        raise server.transcript_error(e)
+
+    with stage('build_prompt'):
+        formatted_transcript = server.prepare_transcript_lines(resolved.entries)
+        transcript_text = "\n".join(formatted_transcript)
+
+    try:
+        if estimate_tokens(transcript_text) > server.LONG_VIDEO_TOKEN_THRESHOLD:
+            # Chunk workers already run in their own thread pool
+            summary = await asyncio.to_thread(
+                server.chunked_summarizer.summarize,
+                formatted_transcript,
+                lambda reduce_prompt: server.generate_content(
+                    reduce_prompt + server.language_instruction(output_language),
+                    generation_config=SUMMARY_GENERATION_CONFIG),
+            )
+        elif on_point is None:
+            with stage('generate'):
+                summary = await server.upstreams.generate(
+                    server.build_summary_prompt(transcript_text, output_language), generation_config=SUMMARY_GENERATION_CONFIG)
+        else:
+            points = PointStream(transcript_starts(resolved.entries), on_point)
+            parts = []
+            with stage('generate'):
+                async for text in server.upstreams.stream(
+                        server.build_summary_prompt(transcript_text, output_language), generation_config=SUMMARY_GENERATION_CONFIG):
+                    parts.append(text)
+                    points.feed(text)
+            summary = "".join(parts)
+    except Exception as e:
+        raise server.generation_error(e)
+
+    points = await asyncio.to_thread(server.finish_summary, video_id, resolved, summary, output_language)
+    server.SUMMARY_SOURCES.inc(server.summary_source(resolved, output_language))
+    return points
+
+
+async def read_summary_request(request):
+    """Return (video_id, languages, output_language, error_response) for a summarize request body"""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not data:
+        return None, None, None, JSONResponse({'error': 'No data provided'}, status_code=400)
+    video_id = data.get('videoId')
+    if not video_id:
+        return None, None, None, JSONResponse({'error': 'No video ID provided'}, status_code=400)
+    try:
+        languages, output_language = server.language_options(data)
+    except ValueError as e:
+        return None, None, None, JSONResponse({'error': str(e)}, status_code=400)
+    return video_id, languages, output_language, None
+
+
+def instrumented(endpoint):
+    """Record request latency and a Server-Timing breakdown, as server.py does for Flask routes"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            started = time.perf_counter()
+            trace = metrics.start_trace()
+            try:
+                response = await handler(request)
+            finally:
+                metrics.end_trace()
+            server.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint,
+                                                request.method, str(response.status_code))
+            timing = trace.server_timing()
+            if timing:
+                response.headers['Server-Timing'] = timing
+            return response
+        return wrapper
+    return decorator
+
+
+@instrumented('summarize')
+async def summarize(request):
+    video_id, languages, output_language, error = await read_summary_request(request)
+    if error:
+        return error
+
+    logger.info(f"Processing video ID: {video_id} ({output_language})")
+
+    with stage('cache_lookup'):
+        cached, tier = await asyncio.to_thread(
+            server.summary_cache.get, video_id, server.MODEL_NAME, server.PROMPT_VERSION, output_language)
+    if cached:
+        server.SUMMARY_REQUESTS.inc(f'hit_{tier}')
+        logger.info(f"Summary cache hit ({tier}) for video {video_id}")
+        return JSONResponse(server.summary_payload(load_points(cached.summary), output_language),
+                            headers={'X-Cache': 'HIT', 'X-Cache-Tier': tier})
+
+    try:
+        points, shared = await summary_flights.do(
+            (video_id, server.MODEL_NAME, server.PROMPT_VERSION, output_language),
+            lambda: build_summary_async(video_id, languages=languages, output_language=output_language),
+            timeout=server.SUMMARY_FLIGHT_TIMEOUT,
+        )
+    except FlightTimeout as e:
+        logger.warning(f"Coalesced request for video {video_id} timed out: {e}")
+        return JSONResponse({'error': 'Summary is still being generated, please retry shortly'},
+                            status_code=503)
+    except server.SummaryError as e:
+        server.SUMMARY_REQUESTS.inc('error')
+        return JSONResponse({'error': e.message}, status_code=e.status_code, headers=e.headers())
+
+    server.SUMMARY_REQUESTS.inc('coalesced' if shared else 'miss')
+    return JSONResponse(server.summary_payload(points, output_language),
+                        headers={'X-Cache': 'COALESCED' if shared else 'MISS'})
+
+
+@instrumented('summarize_stream')
+async def summarize_stream(request):
+    video_id, languages, output_language, error = await read_summary_request(request)
+    if error:
+        return error
+
+    logger.info(f"Streaming summary for video ID: {video_id} ({output_language})")
+
+    with stage('cache_lookup'):
+        cached, tier = await asyncio.to_thread(
+            server.summary_cache.get, video_id, server.MODEL_NAME, server.PROMPT_VERSION, output_language)
+    if cached:
+        server.SUMMARY_REQUESTS.inc(f'hit_{tier}')
+        logger.info(f"Summary cache hit ({tier}) for video {video_id}")
+        return StreamingResponse(iter(replay_summary(load_points(cached.summary))), media_type='text/event-stream',
+                                 headers={'X-Cache': 'HIT', 'X-Cache-Tier': tier})
+
+    events = asyncio.Queue()
+
+    async def run():
+        try:
+            points, shared = await summary_flights.do(
+                (video_id, server.MODEL_NAME, server.PROMPT_VERSION, output_language),
+                lambda: build_summary_async(video_id, on_point=lambda point: events.put_nowait(('point', point)),
+                                            languages=languages, output_language=output_language),
+                timeout=server.SUMMARY_FLIGHT_TIMEOUT,
+            )
+            server.SUMMARY_REQUESTS.inc('coalesced' if shared else 'miss')
+            events.put_nowait(('done', points))
+        except FlightTimeout:
+            events.put_nowait(('error', 'Summary is still being generated, please retry shortly'))
+        except server.SummaryError as e:
+            server.SUMMARY_REQUESTS.inc('error')
+            events.put_nowait(('error', e.message))
+        except Exception as e:
+            logger.error(f"Unexpected error while streaming summary: {str(e)}")
+            events.put_nowait(('error', str(e)))
+
+    async def generate():
+        runner = asyncio.ensure_future(run())
+        encoder = SummaryEventEncoder()
+        while not encoder.finished:
+            for frame in encoder.encode(*await events.get()):
+                yield frame
+        await runner
+
+    return StreamingResponse(generate(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Cache': 'MISS'})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    server.init_database()
+    server.gemini_health.ensure_started()
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route('/summarize', summarize, methods=['POST']),
+        Route('/summarize/stream', summarize_stream, methods=['POST']),
+        Mount('/', app=WSGIMiddleware(server.app)),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'],
+                   expose_headers=['X-Cache', 'X-Cache-Tier', 'Retry-After', 'Server-Timing', 'X-Profile-Id']),
+    ],
+    lifespan=lifespan,
+)
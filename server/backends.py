@@ -0,0 +1,105 @@
+"""Backends that Upstreams talks to for transcripts and text generation.
+
+The server only depends on these small interfaces, so a different backend
+(e.g. the fakes in utils/bench_server.py) can be swapped in without touching
+the request pipeline. Rate limiting, retries and timeouts stay in Upstreams. The interfaces are
+abstract, so a backend that misses a method fails when it is constructed
+rather than halfway through a request or benchmark run.
+"""
+import threading
+from abc import ABC, abstractmethod
+
+from transcripts import resolve_transcript
+
+
+class TranscriptBackend(ABC):
+    @abstractmethod
+    def resolve(self, video_id, languages=None, output_language=None):
+        """Return a ResolvedTranscript for video_id (see transcripts.resolve_transcript)"""
+
+
+class LLMBackend(ABC):
+    @abstractmethod
+    def generate(self, prompt, **kwargs):
+        """Return the full response text"""
+
+    @abstractmethod
+    def stream(self, prompt, **kwargs):
+        """Iterate over the response text fragments as they arrive"""
+
+    @abstractmethod
+    async def generate_async(self, prompt, **kwargs):
+        """Awaitable counterpart of generate()"""
+
+    @abstractmethod
+    async def open_stream_async(self, prompt, **kwargs):
+        """Start a streamed response; returns an async iterator of text fragments"""
+
+    def probe(self):
+        """Raise if the backend is unusable; called by the background health check"""
+
+
+class YouTubeTranscripts(TranscriptBackend):
+    def __init__(self, http_client=None):
+        self.http_client = http_client
+
+    def resolve(self, video_id, languages=None, output_language=None):
+        return resolve_transcript(video_id, languages, http_client=self.http_client,
+                                  output_language=output_language)
+
+
+class GeminiBackend(LLMBackend):
+    """Gemini through one shared client, created on first use.
+
+    google.generativeai is slow to import, so neither importing nor
+    constructing this backend touches it; the first call (or probe()) does.
+    """
+
+    def __init__(self, model_name, api_key=None, timeout=None):
+        self.model_name = model_name
+        self.api_key = api_key
+        self.request_options = {'timeout': timeout} if timeout else None
+        self._genai = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                self._genai = genai
+                self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    @property
+    def model(self):
+        return self._model if self._model is not None else self._load()
+
+    def probe(self):
+        """Cheap authenticated request (model metadata, no tokens) for health checks"""
+        model = self.model
+        self._genai.get_model(model.model_name, request_options=self.request_options)
+
+    def generate(self, prompt, **kwargs):
+        return self.model.generate_content(prompt, request_options=self.request_options, **kwargs).text
+
+    def stream(self, prompt, **kwargs):
+        for chunk in self.model.generate_content(prompt, stream=True, request_options=self.request_options,
+                                                 **kwargs):
+            if chunk.text:
+                yield chunk.text
+
+    async def generate_async(self, prompt, **kwargs):
+        response = await self.model.generate_content_async(prompt, request_options=self.request_options, **kwargs)
+        return response.text
+
+    async def open_stream_async(self, prompt, **kwargs):
+        response = await self.model.generate_content_async(
+            prompt, stream=True, request_options=self.request_options, **kwargs)
+
+        async def texts():
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        return texts()
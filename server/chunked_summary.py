@@ -0,0 +1,167 @@
+"""Map-reduce summarization for transcripts too long for one prompt.
+
+The formatted transcript lines are split into time-aligned chunks that fit a
+token budget. Each chunk is summarized in a bounded thread pool and the
+chunk summaries are merged by a final reduce prompt. Chunk summaries are
+cached by content hash, so retrying a partially failed run only redoes the
+chunks that failed.
+"""
+import hashlib
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Bump when CHUNK_PROMPT or REDUCE_PROMPT changes
+CHUNK_PROMPT_VERSION = 2
+
+CHUNK_PROMPT = """This is one part ({index} of {total}) of a longer video transcript.
+Summarize the most important points of this part. For each point:
+1. Identify the most relevant timestamp
+2. Extract the main point
+3. Format as: "Timestamp: [time] - Key Point: [point]", copying the time exactly from the transcript line
+
+Transcript part:
+{transcript}
+
+Provide 3-5 key points for this part, each with its timestamp. Format exactly as shown above.
+"""
+
+REDUCE_PROMPT = """Below are key points extracted, in order, from consecutive parts of one long video.
+Merge them into a single structured summary of the whole video. For each key point:
+1. Keep the timestamp of the original point it is based on
+2. Extract the main point
+3. Return it as a JSON object: {{"timestamp": "<that timestamp, e.g. 04:15 or 01:02:03>", "point": "<point>"}}
+
+Key points by part:
+{points}
+
+Respond with a JSON array of 5-7 such key points in the order they occur in the video.
+Focus on main topics, important statements, and significant transitions in the video.
+"""
+
+
+class ChunkSummaryError(Exception):
+    """Raised when one or more chunks failed; successful chunks stay cached"""
+
+    def __init__(self, failed, total, errors=()):
+        super().__init__(f"{len(failed)} of {total} transcript chunks failed to summarize")
+        self.failed = failed
+        self.total = total
+        self.errors = list(errors)
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+
+def split_into_chunks(lines, token_budget):
+    """Group consecutive transcript lines into chunks of at most token_budget tokens"""
+    chunks = []
+    current = []
+    current_tokens = 0
+    for line in lines:
+        tokens = estimate_tokens(line)
+        if current and current_tokens + tokens > token_budget:
+            chunks.append(current)
+            current = []
+            current_tokens = 0
+        current.append(line)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def init_chunk_cache_table(cursor):
+    """Create the chunk_summaries table; called from migrations.create_base_schema"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chunk_summaries (
+            chunk_hash TEXT NOT NULL,
+            model TEXT NOT NULL,
+            prompt_version INTEGER NOT NULL,
+            summary TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (chunk_hash, model, prompt_version)
+        )
+    ''')
+
+
+class ChunkedSummarizer:
+    def __init__(self, db, generate, model, token_budget=8000, max_workers=4):
+        """generate(prompt) must return the model's text response"""
+        self.db = db
+        self.generate = generate
+        self.model = model
+        self.token_budget = token_budget
+        self.max_workers = max_workers
+
+    def _cached(self, chunk_hash):
+        try:
+            with self.db.connection() as conn:
+                row = conn.execute('''
+                    SELECT summary FROM chunk_summaries
+                    WHERE chunk_hash = ? AND model = ? AND prompt_version = ?
+                ''', (chunk_hash, self.model, CHUNK_PROMPT_VERSION)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Chunk cache lookup failed: {e}")
+            return None
+        return row[0] if row else None
+
+    def _store(self, chunk_hash, summary):
+        try:
+            with self.db.connection() as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO chunk_summaries
+                        (chunk_hash, model, prompt_version, summary, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (chunk_hash, self.model, CHUNK_PROMPT_VERSION, summary, time.time()))
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to cache chunk summary: {e}")
+
+    def _summarize_chunk(self, index, total, chunk_text):
+        chunk_hash = hashlib.sha256(chunk_text.encode('utf-8')).hexdigest()
+        summary = self._cached(chunk_hash)
+        if summary is not None:
+            logger.info(f"Chunk {index}/{total} served from cache")
+            return summary
+
+        summary = self.generate(CHUNK_PROMPT.format(index=index, total=total, transcript=chunk_text))
+        if not summary or not summary.strip():
+            raise ValueError(f"Empty summary for chunk {index}")
+        self._store(chunk_hash, summary)
+        return summary
+
+    def summarize(self, lines, reduce=None):
+        """Summarize formatted "[MM:SS] text" lines; returns the merged summary text.
+
+        reduce, if given, replaces self.generate for the final merge prompt
+        (used to request structured output and to stream the merged summary).
+        """
+        chunks = ["\n".join(chunk) for chunk in split_into_chunks(lines, self.token_budget)]
+        total = len(chunks)
+        logger.info(f"Summarizing long transcript in {total} chunks with {self.max_workers} workers")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._summarize_chunk, index, total, chunk)
+                       for index, chunk in enumerate(chunks, start=1)]
+
+        summaries = []
+        failed = []
+        errors = []
+        for index, future in enumerate(futures, start=1):
+            try:
+                summaries.append(future.result())
+            except Exception as e:
+                logger.error(f"Chunk {index}/{total} failed: {e}")
+                failed.append(index)
+                errors.append(e)
+        if failed:
+            raise ChunkSummaryError(failed, total, errors)
+
+        points = "\n\n".join(f"Part {index}:\n{summary}"
+                             for index, summary in enumerate(summaries, start=1))
+        return (reduce or self.generate)(REDUCE_PROMPT.format(points=points))
@@ -0,0 +1,87 @@
+"""Transcript compaction ahead of the summary prompt.
+
+Caption tracks (auto-generated ones especially) arrive as thousands of 2-3
+second fragments. Rolling captions repeat the tail of the previous fragment,
+and non-speech cues like "[Music]" carry no content. compact_entries() drops
+the cues and the repeated text, then merges adjacent fragments into segments
+that end at a sentence boundary or a time/length cap. Each segment keeps the
+start time of its first fragment, so timestamps in the summary still point
+at where the point is made.
+"""
+import re
+
+# Non-speech cues emitted by YouTube captioning, e.g. "[Music]", "(Applause)", "♪"
+FILLER_PATTERN = re.compile(
+    r'\[\s*(?:music|applause|laughter|laughs|cheering|inaudible|silence|noise|background noise)\s*\]'
+    r'|\(\s*(?:music|applause|laughter|laughs|cheering|inaudible)\s*\)'
+    r'|[♪♫]+',
+    re.IGNORECASE,
+)
+WHITESPACE = re.compile(r'\s+')
+SENTENCE_END = ('.', '?', '!', '…')
+
+# How many trailing words of the previous fragment to compare against
+OVERLAP_WINDOW = 24
+
+
+def clean_caption(text):
+    """Strip non-speech cues and collapse whitespace and line breaks"""
+    return WHITESPACE.sub(' ', FILLER_PATTERN.sub(' ', text)).strip()
+
+
+def _normalize(word):
+    return word.lower().strip('.,?!…"\'')
+
+
+def strip_overlap(previous_words, text):
+    """Drop the prefix of text that repeats the tail of the previous fragment"""
+    words = text.split()
+    if not previous_words or not words:
+        return text
+    tail = [_normalize(word) for word in previous_words[-OVERLAP_WINDOW:]]
+    head = [_normalize(word) for word in words[:len(tail)]]
+    for size in range(min(len(tail), len(head)), 0, -1):
+        if tail[-size:] == head[:size]:
+            return ' '.join(words[size:])
+    return text
+
+
+def compact_entries(entries, max_seconds=20.0, max_chars=320, min_seconds=4.0):
+    """Merge caption entries into de-duplicated segments.
+
+    A segment is closed after a sentence ends (once it spans at least
+    min_seconds), or before it would span more than max_seconds or
+    max_chars. Returns a list of {'start', 'duration', 'text'} dicts.
+    """
+    segments = []
+    parts = []
+    start = end = 0.0
+    previous_words = []
+
+    def close():
+        if parts:
+            segments.append({'start': start, 'duration': end - start, 'text': ' '.join(parts)})
+            parts.clear()
+
+    for entry in entries:
+        raw = clean_caption(entry['text'])
+        text = strip_overlap(previous_words, raw)
+        if raw:
+            previous_words = raw.split()
+        if not text:
+            continue
+
+        entry_start = entry['start']
+        entry_end = entry_start + entry.get('duration', 0.0)
+        if parts and (entry_start - start >= max_seconds
+                      or sum(map(len, parts)) + len(parts) + len(text) > max_chars):
+            close()
+        if not parts:
+            start = end = entry_start
+        parts.append(text)
+        end = max(end, entry_end)
+        if text.endswith(SENTENCE_END) and end - start >= min_seconds:
+            close()
+
+    close()
+    return segments
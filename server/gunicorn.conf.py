@@ -0,0 +1,43 @@
+"""Production launcher: gunicorn -c gunicorn.conf.py
+
+SERVER_MODE=wsgi (default) serves the Flask app with threaded workers;
+SERVER_MODE=asgi serves asgi:app with uvicorn workers. The app is preloaded
+in the master, so workers fork with every module already imported, and
+database migrations run once, in the master, before any worker starts.
+Importing the server opens no connections and starts no threads (they are
+created on first use), which is what makes forking after preload safe.
+
+Rate limits, caches and request coalescing are per worker process.
+"""
+import multiprocessing
+import os
+
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+
+bind = os.getenv('BIND', f"0.0.0.0:{os.getenv('PORT', 8000)}")
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+preload_app = True
+# A long video's chunked summary can take minutes
+timeout = int(os.getenv('WORKER_TIMEOUT', 180))
+graceful_timeout = 30
+keepalive = 5
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'asgi:app'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'server:app'
+    worker_class = 'gthread'
+    threads = int(os.getenv('WORKER_THREADS', 16))
+
+
+def on_starting(arbiter):
+    import server
+    server.init_database()
+    # Workers must not inherit the master's SQLite handles
+    server.db.close()
+
+
+def post_fork(arbiter, worker):
+    import server
+    server.gemini_health.ensure_started()
@@ -0,0 +1,63 @@
+"""Background health checks for upstream dependencies.
+
+A HealthCheck runs its probe in a daemon thread, once as soon as it is
+started and then every `interval` seconds, and keeps the latest result for
+status reporting. Requests never wait for a probe.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+
+class HealthCheck:
+    def __init__(self, name, probe, interval=300.0):
+        self.name = name
+        self.probe = probe
+        self.interval = interval
+        self._status = {'status': 'pending'}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def ensure_started(self):
+        """Start the probe thread unless it is already running (cheap to call per request)"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(target=self._run, name=f'{self.name}-health', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self.check()
+            if self._stop.wait(self.interval):
+                return
+
+    def check(self):
+        """Run the probe once and record the result"""
+        started = time.perf_counter()
+        try:
+            self.probe()
+            status = {'status': 'ok'}
+        except Exception as e:
+            logger.warning(f"{self.name} health check failed: {e}")
+            status = {'status': 'error', 'error': str(e)}
+        status['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        status['checked_at'] = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        with self._lock:
+            previous = self._status['status']
+            self._status = status
+        if status['status'] == 'ok' and previous != 'ok':
+            logger.info(f"{self.name} is healthy ({status['latency_ms']} ms)")
+        return status
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    def close(self):
+        self._stop.set()
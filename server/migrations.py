@@ -0,0 +1,255 @@
+"""Versioned schema migrations.
+
+create_base_schema() is the original (unversioned) schema. Every later
+change is a numbered migration; the version applied last is recorded in
+SQLite's user_version, so each migration runs exactly once per database,
+in its own transaction.
+"""
+import logging
+import sqlite3
+
+from chunked_summary import init_chunk_cache_table
+from search import index_transcript, init_search_tables
+from summary_cache import init_summary_cache_table
+from summary_tree import init_summary_tree_table
+from transcript_store import compact_from_columns, init_transcript_store_table
+
+logger = logging.getLogger(__name__)
+
+# ON CONFLICT upserts (users, watch history) need 3.24; row-value keyset
+# comparisons (pagination) need 3.15
+MIN_SQLITE_VERSION = (3, 24, 0)
+
+
+def check_sqlite_version(version=sqlite3.sqlite_version_info):
+    """Raise RuntimeError if the linked SQLite library is too old for the schema and queries"""
+    if tuple(version) < MIN_SQLITE_VERSION:
+        required = '.'.join(map(str, MIN_SQLITE_VERSION))
+        found = '.'.join(map(str, version))
+        raise RuntimeError(f"SQLite {required} or newer is required, but Python is linked against {found}; "
+                           f"upgrade SQLite or use a Python build that bundles a newer one")
+
+
+def create_base_schema(cursor):
+    # Create users table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_generated_user_id TEXT UNIQUE NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Create videos table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS videos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            video_id TEXT UNIQUE NOT NULL,
+            title TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Create notes table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            video_id TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Create watched_videos table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS watched_videos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            video_id TEXT NOT NULL,
+            watched_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            UNIQUE(user_id, video_id)
+        )
+    ''')
+
+    # Create summaries cache table
+    init_summary_cache_table(cursor)
+
+    # Create transcripts store table
+    init_transcript_store_table(cursor)
+
+    # Create per-chunk summary cache for long videos
+    init_chunk_cache_table(cursor)
+
+
+def migration_1_video_foreign_keys(cursor):
+    """Reference videos from notes and watched_videos"""
+    # Foreign keys were never enforced before this migration, so rows can
+    # reference users that do not exist. Move them to orphaned_* tables
+    # (rather than dropping notes) so the rebuilt tables pass the check.
+    for table in ('notes', 'watched_videos'):
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS orphaned_{table} AS SELECT * FROM {table} WHERE 0')
+        cursor.execute(f'''
+            INSERT INTO orphaned_{table}
+            SELECT * FROM {table} WHERE user_id NOT IN (SELECT id FROM users)
+        ''')
+        cursor.execute(f'DELETE FROM {table} WHERE user_id NOT IN (SELECT id FROM users)')
+        if cursor.rowcount:
+            logger.warning(f"Moved {cursor.rowcount} {table} rows of unknown users to orphaned_{table}")
+
+    # Backfill videos so existing rows satisfy the new foreign keys
+    cursor.execute('''
+        INSERT OR IGNORE INTO videos (video_id)
+        SELECT video_id FROM notes UNION SELECT video_id FROM watched_videos
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE notes_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            video_id TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (video_id) REFERENCES videos (video_id)
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO notes_new (id, user_id, video_id, content, created_at, updated_at)
+        SELECT id, user_id, video_id, content, created_at, updated_at FROM notes
+    ''')
+    cursor.execute('DROP TABLE notes')
+    cursor.execute('ALTER TABLE notes_new RENAME TO notes')
+
+    cursor.execute('''
+        CREATE TABLE watched_videos_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            video_id TEXT NOT NULL,
+            watched_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (video_id) REFERENCES videos (video_id),
+            UNIQUE(user_id, video_id)
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO watched_videos_new (id, user_id, video_id, watched_at)
+        SELECT id, user_id, video_id, watched_at FROM watched_videos
+    ''')
+    cursor.execute('DROP TABLE watched_videos')
+    cursor.execute('ALTER TABLE watched_videos_new RENAME TO watched_videos')
+
+
+def migration_2_read_path_indexes(cursor):
+    """Index the sidebar notes query and per-user watch history"""
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notes_user_video_created
+        ON notes (user_id, video_id, created_at)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_watched_videos_user_watched
+        ON watched_videos (user_id, watched_at)
+    ''')
+
+
+def migration_3_full_text_search(cursor):
+    """Add FTS5 search over transcripts and notes"""
+    init_search_tables(cursor)
+    cursor.execute("INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')")
+    transcripts = cursor.execute('''
+        SELECT video_id, language, starts, durations, text_ends, text FROM transcripts
+    ''').fetchall()
+    for video_id, language, *columns in transcripts:
+        index_transcript(cursor, video_id, language, compact_from_columns(*columns))
+
+
+def migration_4_summary_output_language(cursor):
+    """Key cached summaries by output language"""
+    cursor.execute('''
+        CREATE TABLE summaries_new (
+            video_id TEXT NOT NULL,
+            output_language TEXT NOT NULL,
+            language TEXT NOT NULL,
+            transcript_hash TEXT NOT NULL,
+            model TEXT NOT NULL,
+            prompt_version INTEGER NOT NULL,
+            summary TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (video_id, output_language, language, transcript_hash, model, prompt_version),
+            FOREIGN KEY (video_id) REFERENCES videos (video_id)
+        )
+    ''')
+    # Earlier summaries were all requested in English
+    cursor.execute('''
+        INSERT INTO summaries_new
+            (video_id, output_language, language, transcript_hash, model, prompt_version, summary, created_at)
+        SELECT video_id, 'en', language, transcript_hash, model, prompt_version, summary, created_at
+        FROM summaries
+    ''')
+    cursor.execute('DROP TABLE summaries')
+    cursor.execute('ALTER TABLE summaries_new RENAME TO summaries')
+    cursor.execute('''
+        CREATE INDEX idx_summaries_lookup
+        ON summaries (video_id, model, prompt_version, output_language, created_at)
+    ''')
+
+
+def migration_5_summary_tree(cursor):
+    """Store hierarchical summary nodes for range and detail requests"""
+    init_summary_tree_table(cursor)
+
+
+def migration_6_transcript_translations(cursor):
+    """Remember which stored transcripts are YouTube translations, and of what"""
+    cursor.execute('ALTER TABLE transcripts ADD COLUMN translated_from TEXT')
+
+
+MIGRATIONS = [
+    (1, migration_1_video_foreign_keys),
+    (2, migration_2_read_path_indexes),
+    (3, migration_3_full_text_search),
+    (4, migration_4_summary_output_language),
+    (5, migration_5_summary_tree),
+    (6, migration_6_transcript_translations),
+]
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Bring the database up to the latest schema version"""
+    check_sqlite_version()
+    if conn.in_transaction:
+        conn.commit()
+
+    create_base_schema(conn.cursor())
+    conn.commit()
+
+    # Table rebuilds need foreign key enforcement off; this PRAGMA is a
+    # no-op inside a transaction, so toggle it around the migrations
+    conn.execute('PRAGMA foreign_keys=OFF')
+    try:
+        current = schema_version(conn)
+        for version, migration in MIGRATIONS:
+            if version <= current:
+                continue
+            conn.execute('BEGIN')
+            try:
+                migration(conn.cursor())
+                violations = conn.execute('PRAGMA foreign_key_check').fetchall()
+                if violations:
+                    raise RuntimeError(f"Migration {version} left foreign key violations: {violations[:5]}")
+                conn.execute(f'PRAGMA user_version = {version}')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            logger.info(f"Applied schema migration {version}: {migration.__doc__}")
+    finally:
+        conn.execute('PRAGMA foreign_keys=ON')
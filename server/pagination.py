@@ -0,0 +1,73 @@
+"""Keyset pagination helpers for the list endpoints.
+
+A cursor is the opaque, URL-safe encoding of the sort key of the last row
+on a page; the next page is read with a `(key, id) < cursor` range on an
+index, so every page costs the same regardless of how deep it is.
+"""
+import base64
+import binascii
+import hashlib
+import json
+from datetime import datetime, timezone
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor, arity):
+    """Return the values packed by encode_cursor(); raises ValueError if malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError('Malformed cursor')
+    if not isinstance(values, list) or len(values) != arity:
+        raise ValueError('Malformed cursor')
+    return values
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Parse a limit query parameter; raises ValueError if it is not an integer"""
+    if value is None:
+        return default
+    return min(max(int(value), 1), maximum)
+
+
+def split_page(rows, limit, key):
+    """Trim a LIMIT limit+1 result to one page; returns (rows, next_cursor)"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
+
+
+def read_page(conn, first_query, after_query, params, cursor, limit):
+    """Run a keyset-paginated query; returns (rows, next_cursor).
+
+    The queries select the row id first and the sort timestamp third.
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor, 2)
+        if not isinstance(timestamp, str) or isinstance(row_id, bool) or not isinstance(row_id, int):
+            raise ValueError('Malformed cursor')
+        rows = conn.execute(after_query, (*params, timestamp, row_id, limit + 1)).fetchall()
+    else:
+        rows = conn.execute(first_query, (*params, limit + 1)).fetchall()
+    return split_page(rows, limit, key=lambda row: (row[2], row[0]))
+
+
+def page_etag(rows, next_cursor):
+    """Validator for one page, computed from the rows without serializing them"""
+    return hashlib.sha1(repr((rows, next_cursor)).encode('utf-8')).hexdigest()
+
+
+def parse_sqlite_timestamp(value):
+    """Parse SQLite's CURRENT_TIMESTAMP format (UTC); None if it does not match"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,156 @@
+"""Low-priority background prefetching of summaries.
+
+Clients submit candidate video IDs (e.g. the "up next" sidebar) and a small
+pool of worker threads summarizes them ahead of time so the summary is
+usually cached by the time the user clicks. Prefetching never competes with
+interactive requests for long:
+
+- each client has its own token bucket, so one client cannot fill the queue;
+- a global token bucket caps how fast prefetches start overall;
+- the queue is bounded, and when it is full the oldest candidates are dropped;
+- workers hold back while interactive load (is_busy()) is high.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class PrefetchQueue:
+    def __init__(self, run, workers=2, max_queued=200, global_rate=0.2, global_burst=5,
+                 user_rate=0.05, user_burst=10, is_busy=None, busy_poll=1.0, max_users=4096):
+        self.run = run
+        self.max_queued = max_queued
+        self.is_busy = is_busy or (lambda: False)
+        self.busy_poll = busy_poll
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_users = max_users
+        self._user_buckets = OrderedDict()
+        self._queue = deque()
+        self._queued = set()
+        self._claimed = set()
+        self._active = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self.counters = {'submitted': 0, 'rejected': 0, 'dropped': 0, 'completed': 0, 'failed': 0}
+        self.workers = workers
+        self._threads = []
+
+    def _ensure_started(self):
+        # Caller holds self._lock; workers start with the first submission
+        # so that importing (and forking) the server starts no threads
+        if not self._threads:
+            self._threads = [
+                threading.Thread(target=self._work, name=f'prefetch-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _user_bucket(self, user_key):
+        # Caller holds self._lock; least recently seen clients are forgotten first
+        bucket = self._user_buckets.pop(user_key, None)
+        if bucket is None:
+            bucket = TokenBucket(self.user_rate, self.user_burst)
+            if len(self._user_buckets) >= self.max_users:
+                self._user_buckets.popitem(last=False)
+        self._user_buckets[user_key] = bucket
+        return bucket
+
+    def submit(self, user_key, video_ids):
+        """Queue video_ids for prefetching; returns (queued, skipped) counts"""
+        queued = 0
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Prefetch queue is closed')
+            self._ensure_started()
+            bucket = self._user_bucket(user_key)
+            for video_id in dict.fromkeys(video_ids):
+                if video_id in self._queued or video_id in self._claimed:
+                    continue
+                if bucket.try_acquire() > 0:
+                    self.counters['rejected'] += 1
+                    continue
+                if len(self._queue) >= self.max_queued:
+                    self._queued.discard(self._queue.popleft())
+                    self.counters['dropped'] += 1
+                self._queue.append(video_id)
+                self._queued.add(video_id)
+                queued += 1
+            self.counters['submitted'] += queued
+            if queued:
+                self._wakeup.notify(queued)
+        return queued, len(video_ids) - queued
+
+    def _next(self):
+        with self._lock:
+            while not self._queue and not self._closed:
+                self._wakeup.wait()
+            if self._closed:
+                return None
+            video_id = self._queue.popleft()
+            self._queued.discard(video_id)
+            self._claimed.add(video_id)
+            return video_id
+
+    def _wait_for_capacity(self):
+        """Block while interactive load is high or the global quota is spent"""
+        while not self._closed:
+            if self.is_busy():
+                time.sleep(self.busy_poll)
+                continue
+            wait = self.global_bucket.try_acquire()
+            if wait == 0.0:
+                return True
+            time.sleep(min(wait, self.busy_poll))
+        return False
+
+    def _work(self):
+        while True:
+            video_id = self._next()
+            if video_id is None:
+                return
+            if not self._wait_for_capacity():
+                return
+            with self._lock:
+                self._active += 1
+            try:
+                self.run(video_id)
+                outcome = 'completed'
+            except Exception as e:
+                logger.info(f"Prefetch of video {video_id} failed: {e}")
+                outcome = 'failed'
+            with self._lock:
+                self._active -= 1
+                self._claimed.discard(video_id)
+                self.counters[outcome] += 1
+
+    def running(self):
+        """Number of prefetches currently executing"""
+        with self._lock:
+            return self._active
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['queued'] = len(self._queue)
+            stats['running'] = self._active
+        return stats
+
+    def close(self, timeout=5.0):
+        """Drop queued candidates and stop the workers; in-progress runs finish"""
+        with self._lock:
+            self._closed = True
+            self._queue.clear()
+            self._queued.clear()
+            self._wakeup.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
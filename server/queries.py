@@ -0,0 +1,51 @@
+"""SQL for the hot request paths.
+
+Kept in one place so tests/test_query_plan.py checks the exact statements the
+routes run.
+"""
+
+# get_or_create_user: race-free create. rowcount is 0 if the user exists,
+# else lastrowid is the new id (RETURNING would need SQLite 3.35)
+INSERT_USER = '''
+    INSERT INTO users (client_generated_user_id) VALUES (?)
+    ON CONFLICT (client_generated_user_id) DO NOTHING
+'''
+
+SELECT_USER_BY_CLIENT_ID = 'SELECT id FROM users WHERE client_generated_user_id = ?'
+
+ENSURE_VIDEO = 'INSERT OR IGNORE INTO videos (video_id) VALUES (?)'
+
+# Keyset-paginated reads: newest first, (timestamp, id) breaks ties so a
+# cursor always resumes exactly after the last row of the previous page.
+# Both forms walk the read-path indexes without sorting.
+NOTES_BY_VIDEO = '''
+    SELECT id, content, created_at, updated_at
+    FROM notes
+    WHERE user_id = ? AND video_id = ?
+    ORDER BY created_at DESC, id DESC
+    LIMIT ?
+'''
+
+NOTES_BY_VIDEO_AFTER = '''
+    SELECT id, content, created_at, updated_at
+    FROM notes
+    WHERE user_id = ? AND video_id = ? AND (created_at, id) < (?, ?)
+    ORDER BY created_at DESC, id DESC
+    LIMIT ?
+'''
+
+WATCH_HISTORY = '''
+    SELECT id, video_id, watched_at
+    FROM watched_videos
+    WHERE user_id = ?
+    ORDER BY watched_at DESC, id DESC
+    LIMIT ?
+'''
+
+WATCH_HISTORY_AFTER = '''
+    SELECT id, video_id, watched_at
+    FROM watched_videos
+    WHERE user_id = ? AND (watched_at, id) < (?, ?)
+    ORDER BY watched_at DESC, id DESC
+    LIMIT ?
+'''
@@ -0,0 +1,322 @@
+"""Client-side throttling, retries and circuit breaking for upstream calls.
+
+UpstreamGuard wraps every call to a rate-limited upstream (Gemini, YouTube):
+a circuit breaker fails fast while the upstream is unhealthy, a token bucket
+keeps the request rate under quota, a semaphore caps concurrent calls (from
+threads and coroutines alike, so one limit holds per upstream key), and
+retryable failures are retried with full-jitter exponential backoff that
+honours Retry-After hints.
+"""
+import asyncio
+import contextlib
+import logging
+import random
+import threading
+import time
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_ERRORS = REGISTRY.counter(
+    'upstream_errors', 'Failed upstream calls by upstream and exception type', labelnames=('upstream', 'error'))
+UPSTREAM_REJECTIONS = REGISTRY.counter(
+    'upstream_rejections', 'Calls refused without reaching the upstream', labelnames=('upstream', 'reason'))
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, up to `burst` banked"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, self.rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        # Caller holds self._lock
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available; otherwise return the seconds until they will be"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1, timeout=None):
+        """Block until tokens are taken; returns False if timeout expires first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining < wait:
+                    return False
+            time.sleep(wait)
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling an upstream that is throttled or unhealthy"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures; after
+    `reset_timeout` seconds one trial call is let through (half-open)."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _retry_in(self):
+        # Caller holds self._lock
+        if self.state == self.CLOSED:
+            return 0.0
+        remaining = self._opened_at + self.reset_timeout - time.monotonic()
+        if remaining > 0:
+            return remaining
+        return 1.0 if self._trial_in_flight else 0.0
+
+    def retry_in(self):
+        """Seconds until allow() would let a call through, without claiming the trial"""
+        with self._lock:
+            return self._retry_in()
+
+    def admit(self):
+        """Return (wait, trial): wait as for allow(), and whether the caller got the half-open trial.
+
+        The trial holder must record its outcome, or release_trial() if its
+        call never reached the upstream.
+        """
+        with self._lock:
+            wait = self._retry_in()
+            if wait > 0 or self.state == self.CLOSED:
+                return wait, False
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = True
+            return 0.0, True
+
+    def allow(self):
+        """Return 0 if a call may proceed, else the seconds until the next trial"""
+        return self.admit()[0]
+
+    def release_trial(self):
+        """Let another caller take the half-open trial"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit for {self.name} opened after {self._failures} failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+def retry_after_seconds(exc):
+    """Extract a Retry-After delay (in seconds) from an upstream error, if any"""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers:
+        value = headers.get('Retry-After')
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                return None
+    return None
+
+
+class UpstreamGuard:
+    def __init__(self, name, is_retryable, rate=5.0, burst=None, concurrency=8,
+                 max_retries=3, backoff_base=0.5, backoff_max=20.0,
+                 failure_threshold=5, reset_timeout=30.0, max_wait=10.0):
+        self.name = name
+        self.is_retryable = is_retryable
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_wait = max_wait
+        self.counters = {
+            'calls': 0, 'successes': 0, 'failures': 0, 'retries': 0,
+            'throttled': 0, 'short_circuited': 0,
+        }
+        self._counter_lock = threading.Lock()
+
+    def _count(self, name):
+        with self._counter_lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self._counter_lock:
+            stats = dict(self.counters)
+        stats['circuit'] = self.breaker.state
+        return stats
+
+    def _short_circuit(self, wait):
+        if wait > 0:
+            self._count('short_circuited')
+            UPSTREAM_REJECTIONS.inc(self.name, 'circuit_open')
+            raise UpstreamUnavailable(
+                f"{self.name} is temporarily unavailable (circuit open)", retry_after=wait)
+
+    def _admission_delay(self):
+        """Fail fast if the circuit is open; otherwise return the wait for a token"""
+        self._short_circuit(self.breaker.retry_in())
+        wait = self.bucket.try_acquire()
+        if wait > self.max_wait:
+            self._count('throttled')
+            UPSTREAM_REJECTIONS.inc(self.name, 'rate_limited')
+            raise UpstreamUnavailable(f"{self.name} rate limit reached", retry_after=wait)
+        return wait
+
+    def _enter_circuit(self):
+        """Pass the breaker once a token is held; returns True if this call is the half-open trial.
+
+        The trial is only claimed here, so a call that is throttled or
+        cancelled while waiting for a token never holds it.
+        """
+        wait, trial = self.breaker.admit()
+        self._short_circuit(wait)
+        return trial
+
+    def _backoff(self, exc, attempt, retry):
+        """Return the delay before retrying exc, or None if it must be raised.
+
+        A retryable error that is out of retries is raised as
+        UpstreamUnavailable (a 503 with Retry-After for clients), carrying the
+        upstream's Retry-After hint or the backoff delay that would have come next.
+        """
+        UPSTREAM_ERRORS.inc(self.name, type(exc).__name__)
+        if not self.is_retryable(exc):
+            # The upstream answered (e.g. "no transcript"), so it is healthy
+            self.breaker.record_success()
+            return None
+        self.breaker.record_failure()
+        self._count('failures')
+        hinted = retry_after_seconds(exc)
+        ceiling = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        if not retry or attempt >= self.max_retries:
+            raise UpstreamUnavailable(
+                f"{self.name} is failing ({type(exc).__name__}: {exc})",
+                retry_after=hinted if hinted is not None else ceiling) from exc
+        if hinted is not None:
+            delay = min(hinted, self.backoff_max)
+        else:
+            delay = random.uniform(0, ceiling)
+        self._count('retries')
+        logger.warning(f"{self.name} call failed ({type(exc).__name__}: {exc}); "
+                       f"retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+        return delay
+
+    def _succeeded(self):
+        self.breaker.record_success()
+        self._count('successes')
+
+    def call(self, fn, *args, retry=True, **kwargs):
+        """Run fn(*args, **kwargs) under the guard (blocking)"""
+        self._count('calls')
+        attempt = 0
+        while True:
+            wait = self._admission_delay()
+            while wait > 0:
+                time.sleep(wait)
+                wait = self.bucket.try_acquire()
+            trial = self._enter_circuit()
+            try:
+                with self.slots:
+                    result = fn(*args, **kwargs)
+                self._succeeded()
+                return result
+            except Exception as e:
+                # _backoff records the outcome, which ends the trial
+                trial = False
+                delay = self._backoff(e, attempt, retry)
+                if delay is None:
+                    raise
+            finally:
+                if trial:
+                    self.breaker.release_trial()
+            time.sleep(delay)
+            attempt += 1
+
+    @contextlib.asynccontextmanager
+    async def slot_async(self):
+        """Hold one of the concurrency slots shared with call(), without blocking the event loop"""
+        delay = 0.005
+        while not self.slots.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        try:
+            yield
+        finally:
+            self.slots.release()
+
+    async def call_async(self, coro_fn, retry=True, hold_slot=True):
+        """Await coro_fn() under the guard.
+
+        hold_slot=False is for callers that already hold a slot_async() for
+        longer than the call (e.g. while consuming a stream it opens).
+        """
+        self._count('calls')
+        attempt = 0
+        while True:
+            wait = self._admission_delay()
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self.bucket.try_acquire()
+            trial = self._enter_circuit()
+            try:
+                if hold_slot:
+                    async with self.slot_async():
+                        result = await coro_fn()
+                else:
+                    result = await coro_fn()
+                self._succeeded()
+                return result
+            except Exception as e:
+                trial = False
+                delay = self._backoff(e, attempt, retry)
+                if delay is None:
+                    raise
+            finally:
+                # Also reached on CancelledError, which is not an Exception
+                if trial:
+                    self.breaker.release_trial()
+            await asyncio.sleep(delay)
+            attempt += 1
@@ -0,0 +1,156 @@
+"""Full-text search over stored transcripts and notes (SQLite FTS5).
+
+Transcripts are indexed as compacted segments (see compaction.py) in
+transcript_segments, one row per segment with its start time, so every hit
+carries an exact timestamp. Both transcript_segments_fts and notes_fts are
+external-content FTS5 tables kept in sync by triggers, so the index is
+updated incrementally by the same statements that write the rows.
+"""
+import re
+
+from compaction import compact_entries
+from summary_points import format_time
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+MAX_QUERY_TERMS = 16
+
+# Hits are ranked by bm25 across both kinds; lower is better
+TRANSCRIPT_HITS = '''
+    SELECT 'transcript', s.video_id, s.language, s.start, NULL,
+           snippet(transcript_segments_fts, 0, '<mark>', '</mark>', '…', 16),
+           bm25(transcript_segments_fts) AS score
+    FROM transcript_segments_fts
+    JOIN transcript_segments s ON s.id = transcript_segments_fts.rowid
+    WHERE transcript_segments_fts MATCH ?
+'''
+
+WATCHED_BY_USER = 'AND s.video_id IN (SELECT video_id FROM watched_videos WHERE user_id = ?)'
+
+NOTE_HITS = '''
+    SELECT 'note', n.video_id, NULL, NULL, n.id,
+           snippet(notes_fts, 0, '<mark>', '</mark>', '…', 16),
+           bm25(notes_fts) AS score
+    FROM notes_fts
+    JOIN notes n ON n.id = notes_fts.rowid
+    WHERE notes_fts MATCH ? AND n.user_id = ?
+'''
+
+
+def init_search_tables(cursor):
+    """Create the FTS5 indexes and the triggers that maintain them"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transcript_segments (
+            id INTEGER PRIMARY KEY,
+            video_id TEXT NOT NULL,
+            language TEXT NOT NULL,
+            start REAL NOT NULL,
+            text TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transcript_segments_video
+        ON transcript_segments (video_id, language)
+    ''')
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS transcript_segments_fts USING fts5(
+            text, content='transcript_segments', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS transcript_segments_ai AFTER INSERT ON transcript_segments BEGIN
+            INSERT INTO transcript_segments_fts (rowid, text) VALUES (new.id, new.text);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS transcript_segments_ad AFTER DELETE ON transcript_segments BEGIN
+            INSERT INTO transcript_segments_fts (transcript_segments_fts, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END
+    ''')
+
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            content, content='notes', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS notes_ai AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts (rowid, content) VALUES (new.id, new.content);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS notes_ad AFTER DELETE ON notes BEGIN
+            INSERT INTO notes_fts (notes_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS notes_au AFTER UPDATE OF content ON notes BEGIN
+            INSERT INTO notes_fts (notes_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO notes_fts (rowid, content) VALUES (new.id, new.content);
+        END
+    ''')
+
+
+def index_transcript(conn, video_id, language, entries):
+    """(Re)index one stored transcript track; runs in the caller's transaction"""
+    conn.execute('DELETE FROM transcript_segments WHERE video_id = ? AND language = ?', (video_id, language))
+    conn.executemany(
+        'INSERT INTO transcript_segments (video_id, language, start, text) VALUES (?, ?, ?, ?)',
+        [(video_id, language, segment['start'], segment['text']) for segment in compact_entries(entries)],
+    )
+
+
+def fts_query(text):
+    """Turn free text into a safe FTS5 query: all terms must match, the last as a prefix"""
+    terms = TOKEN_PATTERN.findall(text)[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search_statement(query, user_id=None, kinds=('transcript', 'note')):
+    """Build the ranked UNION ALL statement for an FTS5 query; None if nothing to search"""
+    parts = []
+    params = []
+    if 'transcript' in kinds:
+        if user_id is not None:
+            parts.append(TRANSCRIPT_HITS + WATCHED_BY_USER)
+            params += [query, user_id]
+        else:
+            parts.append(TRANSCRIPT_HITS)
+            params.append(query)
+    if 'note' in kinds and user_id is not None:
+        parts.append(NOTE_HITS)
+        params += [query, user_id]
+    if not parts:
+        return None, None
+    return ' UNION ALL '.join(parts) + ' ORDER BY score LIMIT ? OFFSET ?', params
+
+
+def search_hits(conn, text, user_id=None, kinds=('transcript', 'note'), limit=20, offset=0):
+    """Return (hits, has_more) for a free-text query, best matches first.
+
+    Transcript hits are limited to videos the user has watched when user_id
+    is given; note hits require user_id.
+    """
+    query = fts_query(text)
+    if query is None:
+        return [], False
+    sql, params = search_statement(query, user_id, kinds)
+    if sql is None:
+        return [], False
+    rows = conn.execute(sql, params + [limit + 1, offset]).fetchall()
+
+    hits = []
+    for kind, video_id, language, start, note_id, snippet, score in rows[:limit]:
+        hit = {'type': kind, 'video_id': video_id, 'snippet': snippet, 'score': round(-score, 4)}
+        if kind == 'transcript':
+            hit.update(language=language, seconds=start, label=format_time(start))
+        else:
+            hit['note_id'] = note_id
+        hits.append(hit)
+    return hits, len(rows) > limit
@@ -1,12 +1,41 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
-import google.generativeai as genai
+from youtube_transcript_api import TranscriptsDisabled, NoTranscriptFound
 import os
-import sqlite3
+import atexit
 from datetime import datetime
 from dotenv import load_dotenv
 import logging
+import queue
+import re
+import threading
+import time
+import uuid
+
+from backends import GeminiBackend
+from chunked_summary import ChunkedSummarizer, ChunkSummaryError, estimate_tokens
+from compaction import compact_entries
+from db import ConnectionPool
+from health import HealthCheck
+import metrics
+from metrics import REGISTRY, SamplingProfiler, stage
+from migrations import migrate
+from pagination import page_etag, page_size, parse_sqlite_timestamp, read_page
+from prefetch import PrefetchQueue
+import queries
+from ratelimit import UpstreamGuard, UpstreamUnavailable
+from search import search_hits
+from singleflight import FlightTimeout, SingleFlight
+from sse import SummaryEventEncoder, replay_summary
+from summary_cache import SummaryCache, transcript_hash
+from summary_points import (SUMMARY_GENERATION_CONFIG, PointStream, dump_points, format_time, language_name,
+                            load_points, parse_summary_points, points_as_items, render_summary,
+                            transcript_starts)
+from summary_tree import InvalidRange, SummaryTree, range_options
+from transcript_store import TranscriptStore
+from transcripts import TranscriptUnavailable, normalize_language, summary_source
+from upstream import Upstreams, is_retryable_gemini_error, is_retryable_transcript_error
+from watch_history import WatchHistoryWriter, sqlite_timestamp
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,11 +46,26 @@ PORT = 8000
 
 app = Flask(__name__)
 # Configure CORS to allow extensions to access the API
-CORS(app, resources={r"/*": {"origins": "*"}})
+CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=['X-Cache', 'X-Cache-Tier', 'Retry-After',
+                                                                  'Server-Timing', 'X-Profile-Id'])
 
 # Load environment variables
 load_dotenv()
 
+# Flask's debug server (reloader, debugger) for local development only
+DEBUG = os.getenv('FLASK_DEBUG', '0') == '1'
+
+# Gemini model used for summaries. Bump PROMPT_VERSION whenever the prompt in
+# build_summary_prompt (or the cached summary format) changes so cached
+# summaries are not reused.
+MODEL_NAME = 'gemini-1.5-flash'
+PROMPT_VERSION = 4
+
+# Summaries are written in the client's outputLanguage (this one by default)
+# and cached per output language; languages orders the transcript tracks tried
+DEFAULT_OUTPUT_LANGUAGE = normalize_language(os.getenv('DEFAULT_OUTPUT_LANGUAGE', 'en'))
+MAX_PREFERRED_LANGUAGES = 10
+
 # Configure Gemini API with better error handling
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 if not GEMINI_API_KEY:
@@ -35,107 +79,270 @@ if not GEMINI_API_KEY:
     logger.error("="*60)
     exit(1)
 
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-    # Test the API key by trying to create a model
-    test_model = genai.GenerativeModel('gemini-1.5-flash')
-    logger.info("✅ Gemini API key configured successfully")
-except Exception as e:
-    logger.error("="*60)
-    logger.error(f"CRITICAL: Invalid Gemini API key! Error: {e}")
-    logger.error("Please check your GEMINI_API_KEY in the .env file")
-    logger.error("Get a new key from: https://makersuite.google.com/app/apikey")
-    logger.error("="*60)
-    exit(1)
+# The Gemini client is created on first use and the key is verified by a
+# background health check (reported on /), so startup never waits on the API
+GEMINI_HEALTH_INTERVAL = float(os.getenv('GEMINI_HEALTH_INTERVAL', 300))
 
 # Database setup for notes and user management
-DB_FILE = 'youtube_extension_notes.db'
+DB_FILE = os.getenv('DB_FILE', 'youtube_extension_notes.db')
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))
+DB_BUSY_TIMEOUT = float(os.getenv('DB_BUSY_TIMEOUT', 5))
+
+db = ConnectionPool(DB_FILE, size=DB_POOL_SIZE, busy_timeout=DB_BUSY_TIMEOUT)
+
+# Summary cache configuration
+SUMMARY_CACHE_TTL = int(os.getenv('SUMMARY_CACHE_TTL', 7 * 24 * 3600))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv('SUMMARY_CACHE_MAX_ENTRIES', 1024))
+SUMMARY_CACHE_MAX_BYTES = int(os.getenv('SUMMARY_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+summary_cache = SummaryCache(
+    db,
+    ttl_seconds=SUMMARY_CACHE_TTL,
+    max_entries=SUMMARY_CACHE_MAX_ENTRIES,
+    max_bytes=SUMMARY_CACHE_MAX_BYTES,
+)
+
+# Fetched transcripts are kept so re-summarizing never has to hit YouTube
+transcript_store = TranscriptStore(db)
+
+# How long a coalesced request waits for the in-flight summary of the same video
+SUMMARY_FLIGHT_TIMEOUT = float(os.getenv('SUMMARY_FLIGHT_TIMEOUT', 120))
+summary_flights = SingleFlight()
+# asgi.py adds its own flight group, so load checks see summaries from both serving modes
+summary_flight_groups = [summary_flights]
+transcript_flights = SingleFlight()
+
+# Transcript compaction: caption fragments are merged into segments of at most
+# COMPACT_WINDOW_SECONDS / COMPACT_MAX_CHARS before prompting
+COMPACT_WINDOW_SECONDS = float(os.getenv('COMPACT_WINDOW_SECONDS', 20))
+COMPACT_MAX_CHARS = int(os.getenv('COMPACT_MAX_CHARS', 320))
+
+# Long-video (map-reduce) summarization configuration
+LONG_VIDEO_TOKEN_THRESHOLD = int(os.getenv('LONG_VIDEO_TOKEN_THRESHOLD', 30000))
+CHUNK_TOKEN_BUDGET = int(os.getenv('CHUNK_TOKEN_BUDGET', 8000))
+CHUNK_WORKERS = int(os.getenv('CHUNK_WORKERS', 4))
+
+# Summary tree for /summarize/range: segment length of the finest level, nodes
+# merged per level, and how many nodes a view without an explicit level spans
+TREE_SEGMENT_SECONDS = int(os.getenv('TREE_SEGMENT_SECONDS', 300))
+TREE_FANOUT = int(os.getenv('TREE_FANOUT', 4))
+TREE_MAX_VIEW_NODES = int(os.getenv('TREE_MAX_VIEW_NODES', 4))
+
+# Upstream connection pooling, concurrency limits and timeouts
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 32))
+TRANSCRIPT_CONCURRENCY = int(os.getenv('TRANSCRIPT_CONCURRENCY', 32))
+TRANSCRIPT_TIMEOUT = float(os.getenv('TRANSCRIPT_TIMEOUT', 15))
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 120))
+
+# Client-side rate limits, retries and circuit breaking. Gemini quotas are
+# per API key, so these describe the single configured key.
+GEMINI_RATE = float(os.getenv('GEMINI_RATE', 4))
+GEMINI_BURST = int(os.getenv('GEMINI_BURST', 8))
+GEMINI_CONCURRENCY = int(os.getenv('GEMINI_CONCURRENCY', 8))
+TRANSCRIPT_RATE = float(os.getenv('TRANSCRIPT_RATE', 5))
+TRANSCRIPT_BURST = int(os.getenv('TRANSCRIPT_BURST', 10))
+UPSTREAM_MAX_RETRIES = int(os.getenv('UPSTREAM_MAX_RETRIES', 3))
+UPSTREAM_BACKOFF_BASE = float(os.getenv('UPSTREAM_BACKOFF_BASE', 0.5))
+UPSTREAM_BACKOFF_MAX = float(os.getenv('UPSTREAM_BACKOFF_MAX', 20))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5))
+BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', 30))
+RATE_LIMIT_MAX_WAIT = float(os.getenv('RATE_LIMIT_MAX_WAIT', 10))
+
+def upstream_guard(name, is_retryable, rate, burst, concurrency):
+    return UpstreamGuard(
+        name,
+        is_retryable,
+        rate=rate,
+        burst=burst,
+        concurrency=concurrency,
+        max_retries=UPSTREAM_MAX_RETRIES,
+        backoff_base=UPSTREAM_BACKOFF_BASE,
+        backoff_max=UPSTREAM_BACKOFF_MAX,
+        failure_threshold=BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=BREAKER_RESET_TIMEOUT,
+        max_wait=RATE_LIMIT_MAX_WAIT,
+    )
+
+upstreams = Upstreams(
+    GeminiBackend(MODEL_NAME, api_key=GEMINI_API_KEY, timeout=LLM_TIMEOUT),
+    transcript_timeout=TRANSCRIPT_TIMEOUT,
+    llm_timeout=LLM_TIMEOUT,
+    pool_size=HTTP_POOL_SIZE,
+    transcript_guard=upstream_guard(
+        'youtube', is_retryable_transcript_error,
+        TRANSCRIPT_RATE, TRANSCRIPT_BURST, TRANSCRIPT_CONCURRENCY),
+    llm_guard=upstream_guard(
+        'gemini', is_retryable_gemini_error,
+        GEMINI_RATE, GEMINI_BURST, GEMINI_CONCURRENCY),
+)
+
+# Watch history write-behind buffer
+WATCH_FLUSH_INTERVAL = float(os.getenv('WATCH_FLUSH_INTERVAL', 1.0))
+WATCH_FLUSH_BATCH = int(os.getenv('WATCH_FLUSH_BATCH', 500))
+WATCH_BATCH_MAX_EVENTS = 1000
+
+watch_history = WatchHistoryWriter(db, max_batch=WATCH_FLUSH_BATCH, flush_interval=WATCH_FLUSH_INTERVAL)
+
+# Background prefetch of likely-next videos. Workers hold back while
+# PREFETCH_YIELD_AT or more interactive summaries are in flight.
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', 2))
+PREFETCH_MAX_QUEUED = int(os.getenv('PREFETCH_MAX_QUEUED', 200))
+PREFETCH_GLOBAL_PER_MINUTE = float(os.getenv('PREFETCH_GLOBAL_PER_MINUTE', 12))
+PREFETCH_USER_PER_MINUTE = float(os.getenv('PREFETCH_USER_PER_MINUTE', 3))
+PREFETCH_USER_BURST = int(os.getenv('PREFETCH_USER_BURST', 10))
+PREFETCH_YIELD_AT = int(os.getenv('PREFETCH_YIELD_AT', 2))
+PREFETCH_MAX_IDS = 20
+VIDEO_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]{11}')
+
+# Full-text search paging
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_TYPES = {
+    'all': ('transcript', 'note'),
+    'transcripts': ('transcript',),
+    'notes': ('note',),
+}
+
+# Metrics and profiling. GET /metrics serves Prometheus text format; with
+# PROFILING_ENABLED=1 a request carrying "X-Profile: 1" is stack-sampled and
+# its collapsed stacks written to PROFILE_DIR/<X-Profile-Id>.folded.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '0') == '1'
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.005))
+TOKEN_BUCKETS = (250, 500, 1000, 2500, 5000, 10000, 20000, 30000, 50000, 100000, 200000)
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_seconds', 'HTTP request latency', labelnames=('endpoint', 'method', 'status'))
+SUMMARY_REQUESTS = REGISTRY.counter(
+    'summary_requests', 'Summary requests by how they were served', labelnames=('result',))
+SUMMARY_SOURCES = REGISTRY.counter(
+    'summary_sources', 'Generated summaries by how the output language was reached', labelnames=('source',))
+PROMPT_TOKENS = REGISTRY.histogram(
+    'prompt_tokens', 'Estimated transcript prompt tokens before and after compaction',
+    buckets=TOKEN_BUCKETS, labelnames=('compaction',))
+REGISTRY.gauge_callback(
+    'summaries_in_flight', 'Summary pipeline runs in progress', lambda: {(): summaries_in_flight()})
+REGISTRY.gauge_callback(
+    'upstream_circuit_open', '1 while the upstream circuit breaker is open',
+    lambda: {name: int(guard.stats()['circuit'] == 'open')
+             for name, guard in (('youtube', upstreams.transcript_guard), ('gemini', upstreams.llm_guard))},
+    labelnames=('upstream',))
+REGISTRY.gauge_callback(
+    'prefetch_queued', 'Videos waiting in the prefetch queue', lambda: {(): prefetcher.stats()['queued']})
+
+gemini_health = HealthCheck('gemini', lambda: upstreams.llm.probe(), interval=GEMINI_HEALTH_INTERVAL)
+
+def shutdown():
+    """Stop prefetching, flush buffered writes and close pooled connections"""
+    gemini_health.close()
+    prefetcher.close()
+    watch_history.close()
+    db.close()
+
+atexit.register(shutdown)
 
 def init_database():
-    """Initialize the database with users, videos, and notes tables"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # Create users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            client_generated_user_id TEXT UNIQUE NOT NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create videos table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS videos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            video_id TEXT UNIQUE NOT NULL,
-            title TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+    """Initialize the database schema and apply pending migrations"""
+    with db.connection() as conn:
+        migrate(conn)
     
-    # Create notes table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS notes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            video_id TEXT NOT NULL,
-            content TEXT NOT NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    # Create watched_videos table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS watched_videos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            video_id TEXT NOT NULL,
-            watched_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            UNIQUE(user_id, video_id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
     logger.info("Database initialized successfully")
 
-def format_time(seconds):
-    minutes = int(seconds // 60)
-    remaining_seconds = int(seconds % 60)
-    return f"{minutes:02d}:{remaining_seconds:02d}"
+def format_transcript_lines(transcript_entries):
+    """Render transcript entries as "[MM:SS] text" prompt lines"""
+    return [f"[{format_time(entry['start'])}] {entry['text']}" for entry in transcript_entries]
 
-def generate_summary_with_timestamps(transcript_entries):
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # Create a structured format of the transcript with timestamps
-        formatted_transcript = []
-        for entry in transcript_entries:
-            timestamp = format_time(entry['start'])
-            text = entry['text']
-            formatted_transcript.append(f"[{timestamp}] {text}")
-        
-        transcript_text = "\n".join(formatted_transcript)
-        
-        prompt = f"""Analyze this video transcript and create a structured summary. For each key point:
-1. Identify the most relevant timestamp
+def compact_transcript_lines(transcript_entries):
+    """Compact transcript entries into prompt lines"""
+    segments = compact_entries(transcript_entries, max_seconds=COMPACT_WINDOW_SECONDS, max_chars=COMPACT_MAX_CHARS)
+    return format_transcript_lines(segments)
+
+def prepare_transcript_lines(transcript_entries):
+    """Compact a whole transcript into prompt lines, logging and recording the token savings"""
+    lines = compact_transcript_lines(transcript_entries)
+    tokens_before = estimate_tokens("\n".join(format_transcript_lines(transcript_entries)))
+    tokens_after = estimate_tokens("\n".join(lines))
+    PROMPT_TOKENS.observe(tokens_before, 'before')
+    PROMPT_TOKENS.observe(tokens_after, 'after')
+    logger.info(f"Prompt compaction: {len(transcript_entries)} entries -> {len(lines)} segments, "
+                f"~{tokens_before} -> ~{tokens_after} tokens "
+                f"({100 - 100 * tokens_after // tokens_before}% saved)")
+    return lines
+
+def generate_content(prompt, on_text=None, generation_config=None):
+    """Run a prompt through the LLM backend and return the full response text.
+
+    When on_text is given the response is streamed and on_text is called
+    with each text fragment as it arrives. Calls go through the Gemini
+    upstream guard; streamed calls are not retried, since fragments may
+    already have been handed to on_text.
+    """
+    with stage('generate'):
+        if on_text is None:
+            return upstreams.generate_sync(prompt, generation_config=generation_config)
+        return upstreams.stream_sync(prompt, on_text, generation_config=generation_config)
+
+chunked_summarizer = ChunkedSummarizer(
+    db,
+    generate_content,
+    MODEL_NAME,
+    token_budget=CHUNK_TOKEN_BUDGET,
+    max_workers=CHUNK_WORKERS,
+)
+
+summary_tree = SummaryTree(
+    db,
+    lambda prompt: generate_content(prompt, generation_config=SUMMARY_GENERATION_CONFIG),
+    MODEL_NAME,
+    # Per segment, so not counted in the per-request prompt_tokens histogram
+    compact_transcript_lines,
+    segment_seconds=TREE_SEGMENT_SECONDS,
+    fanout=TREE_FANOUT,
+    max_view_nodes=TREE_MAX_VIEW_NODES,
+    max_workers=CHUNK_WORKERS,
+)
+
+def language_instruction(output_language):
+    return f"Write every point in {language_name(output_language)}, whatever the language of the transcript.\n"
+
+def build_summary_prompt(transcript_text, output_language=DEFAULT_OUTPUT_LANGUAGE):
+    return f"""Analyze this video transcript and create a structured summary. For each key point:
+1. Identify the most relevant transcript line
 2. Extract the main point
-3. Format as: "Timestamp: [MM:SS] - Key Point: [point]"
+3. Return it as a JSON object: {{"timestamp": "<time of that line, copied exactly, e.g. 04:15 or 01:02:03>", "point": "<point>"}}
 
 Transcript:
 {transcript_text}
 
-Please provide a summary with 5-7 key points, each with its timestamp. Format exactly as shown above.
+Respond with a JSON array of 5-7 such key points in the order they occur in the video.
 Focus on main topics, important statements, and significant transitions in the video.
+""" + language_instruction(output_language)
+
+def build_translation_prompt(points, output_language):
+    return f"""Translate the "point" of every item in this JSON array of video summary points into {language_name(output_language)}.
+Keep each "timestamp" exactly as it is and keep the items in the same order.
+
+{points_as_items(points)}
+
+Respond with the translated JSON array.
 """
+
+def generate_summary_with_timestamps(transcript_entries, on_text=None, output_language=DEFAULT_OUTPUT_LANGUAGE):
+    try:
+        # Create a structured format of the transcript with timestamps
+        with stage('build_prompt'):
+            formatted_transcript = prepare_transcript_lines(transcript_entries)
+            transcript_text = "\n".join(formatted_transcript)
         
-        response = model.generate_content(prompt)
-        return response.text
+        # Long videos are summarized chunk by chunk and merged
+        if estimate_tokens(transcript_text) > LONG_VIDEO_TOKEN_THRESHOLD:
+            return chunked_summarizer.summarize(
+                formatted_transcript,
+                reduce=lambda reduce_prompt: generate_content(
+                    reduce_prompt + language_instruction(output_language), on_text, SUMMARY_GENERATION_CONFIG))
+        
+        prompt = build_summary_prompt(transcript_text, output_language)
+        return generate_content(prompt, on_text, SUMMARY_GENERATION_CONFIG)
     except Exception as e:
         logger.error(f"Error generating summary: {str(e)}")
         raise
@@ -145,10 +352,276 @@ def test():
     return jsonify({
         "status": "ok", 
         "message": "YouTube Summarizer Server is running",
-        "features": ["video_summarization", "user_notes", "watch_history"],
-        "api_key_status": "configured" if GEMINI_API_KEY else "missing"
+        "features": ["video_summarization", "range_summaries", "summary_prefetch", "user_notes", "watch_history", "search"],
+        "api_key_status": "configured" if GEMINI_API_KEY else "missing",
+        "gemini": gemini_health.status(),
+        "upstreams": {
+            "youtube": upstreams.transcript_guard.stats(),
+            "gemini": upstreams.llm_guard.stats(),
+        },
+        "prefetch": prefetcher.stats()
     })
 
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.before_request
+def start_health_checks():
+    # No-op once started; covers servers that skip the startup hooks
+    gemini_health.ensure_started()
+
+@app.before_request
+def start_request_trace():
+    g.request_started = time.perf_counter()
+    g.request_trace = metrics.start_trace()
+    g.profiler = None
+    if PROFILING_ENABLED and request.headers.get('X-Profile') == '1':
+        g.profiler = SamplingProfiler(interval=PROFILE_INTERVAL).start()
+
+def save_profile(profiler):
+    """Write a profiler's collapsed stacks to PROFILE_DIR; returns the profile id"""
+    profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{request.endpoint or 'unknown'}-{uuid.uuid4().hex[:8]}"
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, f'{profile_id}.folded'), 'w') as f:
+        f.write(profiler.collapsed())
+    logger.info(f"Saved profile {profile_id} ({profiler.samples} samples)")
+    return profile_id
+
+@app.after_request
+def finish_request_trace(response):
+    """Record request latency and report the per-stage breakdown.
+
+    For streamed responses this measures the time until the response
+    starts; the stages that run while streaming are still recorded in
+    summarizer_stage_seconds.
+    """
+    started = g.get('request_started')
+    if started is None:
+        return response
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, request.endpoint or 'unknown',
+                                 request.method, str(response.status_code))
+    timing = g.request_trace.server_timing()
+    if timing:
+        response.headers['Server-Timing'] = timing
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        try:
+            response.headers['X-Profile-Id'] = save_profile(profiler.stop())
+        except OSError as e:
+            logger.error(f"Failed to save profile: {e}")
+    return response
+
+@app.teardown_request
+def end_request_trace(exc):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+    metrics.end_trace()
+
+class SummaryError(Exception):
+    """A summarization failure that maps to an HTTP error response"""
+
+    def __init__(self, message, status_code=500, retry_after=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    def headers(self):
+        if self.retry_after is None:
+            return {}
+        return {'Retry-After': str(max(1, int(self.retry_after + 0.5)))}
+
+
+def upstream_unavailable_error(e):
+    logger.warning(f"Upstream unavailable: {e}")
+    return SummaryError(f'{e}, please retry later', 503, retry_after=e.retry_after)
+
+
+def transcript_error(e):
+    """Map a transcript fetch failure to the SummaryError reported to clients"""
+    if isinstance(e, SummaryError):
+        return e
+    if isinstance(e, UpstreamUnavailable):
+        return upstream_unavailable_error(e)
+    if isinstance(e, FlightTimeout):
+        return SummaryError('Transcript is still being fetched, please retry shortly', 503)
+    if isinstance(e, TranscriptUnavailable):
+        logger.error(f"Failed to retrieve any transcript despite available languages: {e.available_languages}")
+        return SummaryError('No usable transcript found for this video', 400)
+    if isinstance(e, TranscriptsDisabled):
+        return SummaryError('Transcripts are disabled for this video', 400)
+    if isinstance(e, NoTranscriptFound):
+        return SummaryError('No transcript found for this video', 400)
+    error_msg = str(e)
+    if "no element found" in error_msg.lower():
+        return SummaryError('This video does not have captions available or captions are corrupted', 400)
+    logger.error(f"Error getting transcript: {error_msg}")
+    return SummaryError(f'Error getting transcript: {error_msg}', 500)
+
+def generation_error(e):
+    """Map a summary generation failure to the SummaryError reported to clients"""
+    if isinstance(e, ChunkSummaryError):
+        # Chunks that ran out of retries make the whole summary retryable later
+        unavailable = [error for error in e.errors if isinstance(error, UpstreamUnavailable)]
+        if unavailable:
+            e = max(unavailable, key=lambda error: error.retry_after or 0)
+    if isinstance(e, UpstreamUnavailable):
+        return upstream_unavailable_error(e)
+    logger.error(f"Error generating summary: {str(e)}")
+    return SummaryError(f'Error generating summary: {str(e)}', 500)
+
+def language_options(data):
+    """(languages, output_language) from a summarize request body; raises ValueError"""
+    languages = data.get('languages')
+    if languages is not None:
+        if not isinstance(languages, list) or len(languages) > MAX_PREFERRED_LANGUAGES:
+            raise ValueError(f'languages must be a list of at most {MAX_PREFERRED_LANGUAGES} language codes')
+        for language in languages:
+            normalize_language(language)
+        languages = tuple(languages) or None
+    output_language = data.get('outputLanguage')
+    output_language = normalize_language(output_language) if output_language else DEFAULT_OUTPUT_LANGUAGE
+    return languages, output_language
+
+def finish_summary(video_id, resolved, summary, output_language=DEFAULT_OUTPUT_LANGUAGE):
+    """Parse a freshly generated summary into points and store them in the summary cache"""
+    logger.info(f"Successfully generated summary for video {video_id}")
+    
+    if not summary or summary.strip() == '':
+        logger.error("Generated summary is empty")
+        raise SummaryError('Generated summary is empty', 500)
+    
+    with stage('parse_summary'):
+        points = parse_summary_points(summary, transcript_starts(resolved.entries))
+    if not points:
+        logger.error(f"Generated summary has no valid key points: {summary[:200]!r}")
+        raise SummaryError('Generated summary has no valid key points', 500)
+    
+    with stage('cache_write'):
+        summary_cache.put(video_id, resolved.language_code, transcript_hash(resolved.entries),
+                          MODEL_NAME, PROMPT_VERSION, dump_points(points), output_language)
+    return points
+
+def translate_summary(video_id, source, output_language):
+    """Translate a cached summary (a CacheEntry) into output_language and cache the result.
+
+    One short prompt instead of a full regeneration; raises if the model
+    does not return every point.
+    """
+    points = load_points(source.summary)
+    starts = sorted({point['seconds'] for point in points})
+    with stage('translate_summary'):
+        text = generate_content(build_translation_prompt(points, output_language),
+                                generation_config=SUMMARY_GENERATION_CONFIG)
+    translated = parse_summary_points(text, starts)
+    if len(translated) < len(points):
+        raise ValueError(f"translation returned {len(translated)} of {len(points)} points")
+    logger.info(f"Translated the {source.output_language} summary of video {video_id} into {output_language}")
+    with stage('cache_write'):
+        summary_cache.put(video_id, source.language, source.transcript_hash,
+                          MODEL_NAME, PROMPT_VERSION, dump_points(translated), output_language)
+    return translated
+
+def summary_payload(points, output_language=DEFAULT_OUTPUT_LANGUAGE):
+    """Response body for a summary: typed points plus the legacy text form"""
+    return {'summary': render_summary(points), 'points': points, 'language': output_language}
+
+def cached_translation(video_id, output_language, on_point=None):
+    """Points translated from a cached summary in another language, or None if there is none.
+
+    Falls back to None (regenerate) when the translation is unusable, but
+    not when Gemini itself is unavailable.
+    """
+    source = summary_cache.get_any(video_id, MODEL_NAME, PROMPT_VERSION)
+    if source is None:
+        return None
+    if source.output_language == output_language:
+        # Generated by a concurrent request since the caller's cache lookup
+        points = load_points(source.summary)
+    else:
+        try:
+            points = translate_summary(video_id, source, output_language)
+        except UpstreamUnavailable as e:
+            raise generation_error(e)
+        except Exception as e:
+            logger.warning(f"Could not translate the cached summary of video {video_id}, regenerating: {e}")
+            return None
+        SUMMARY_SOURCES.inc('translated_summary')
+    if on_point is not None:
+        for point in points:
+            on_point(point)
+    return points
+
+def resolve_summary_transcript(video_id, languages, output_language):
+    """Stored transcript in the output language, else the best one YouTube offers.
+
+    Concurrent callers for the same video and output language share one
+    lookup, so only one of them fetches from YouTube and writes the store.
+    """
+    resolved, _ = transcript_flights.do(
+        (video_id, output_language),
+        lambda: load_summary_transcript(video_id, languages, output_language),
+        timeout=SUMMARY_FLIGHT_TIMEOUT,
+    )
+    return resolved
+
+def load_summary_transcript(video_id, languages, output_language):
+    with stage('transcript_store'):
+        stored = transcript_store.get(video_id, output_language, languages)
+    if stored:
+        logger.info(f"Reusing stored {stored.language_code} transcript for video {video_id}")
+        return stored
+    try:
+        with stage('resolve_transcript'):
+            fetched = upstreams.resolve_transcript_sync(video_id, languages, output_language)
+    except Exception:
+        # A transcript stored in another language still beats failing
+        with stage('transcript_store'):
+            stored = transcript_store.get(video_id, preferred_languages=languages)
+        if stored is None:
+            raise
+        logger.warning(f"Transcript fetch for video {video_id} failed; using the stored {stored.language_code} one")
+        return stored
+    with stage('transcript_store'):
+        return transcript_store.put(fetched)
+
+def build_summary(video_id, on_point=None, languages=None, output_language=DEFAULT_OUTPUT_LANGUAGE):
+    """Summarize a video in output_language and cache the result.
+
+    Takes the cheapest path available: translating a cached summary of the
+    video in another language, else summarizing a transcript, preferring a
+    native track, then YouTube's translation, then any track (the prompt
+    asks for output_language either way).
+
+    Returns the summary's {'seconds', 'label', 'text'} points. on_point, if
+    given, receives each point as soon as it has been generated.
+    Raises SummaryError with the status code to report to the client.
+    """
+    points = cached_translation(video_id, output_language, on_point)
+    if points is not None:
+        return points
+    
+    try:
+        resolved = resolve_summary_transcript(video_id, languages, output_language)
+        logger.info(f"Successfully retrieved transcript for video {video_id} in language {resolved.language_code}")
+    except Exception as e:
+        raise transcript_error(e)
+    
+    # Generate summary
+    on_text = None
+    if on_point is not None:
+        on_text = PointStream(transcript_starts(resolved.entries), on_point).feed
+    try:
+        summary = generate_summary_with_timestamps(resolved.entries, on_text, output_language)
+    except Exception as e:
+        raise generation_error(e)
+    
+    points = finish_summary(video_id, resolved, summary, output_language)
+    SUMMARY_SOURCES.inc(summary_source(resolved, output_language))
+    return points
+
 @app.route('/summarize', methods=['POST'])
 def summarize():
     try:
@@ -159,99 +632,225 @@ def summarize():
         video_id = data.get('videoId')
         if not video_id:
             return jsonify({'error': 'No video ID provided'}), 400
+        try:
+            languages, output_language = language_options(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        logger.info(f"Processing video ID: {video_id}")
+        logger.info(f"Processing video ID: {video_id} ({output_language})")
         
-        try:
-            # First try to get available transcripts to see what's available
-            transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
-            available_languages = []
-            manual_transcripts = []
-            auto_transcripts = []
-            
-            for transcript_info in transcript_list:
-                available_languages.append(transcript_info.language_code)
-                if transcript_info.is_generated:
-                    auto_transcripts.append(transcript_info.language_code)
-                else:
-                    manual_transcripts.append(transcript_info.language_code)
-            
-            logger.info(f"Available transcripts for video {video_id}: {available_languages}")
-            logger.info(f"Manual transcripts: {manual_transcripts}")
-            logger.info(f"Auto-generated transcripts: {auto_transcripts}")
-            
-            # Try to get transcript in order of preference
-            transcript = None
-            used_language = None
-            
-            # First try manual English transcripts
-            for lang in ['en', 'en-US', 'en-GB']:
-                if lang in manual_transcripts:
-                    try:
-                        transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=[lang])
-                        used_language = lang
-                        logger.info(f"Using manual transcript in: {lang}")
-                        break
-                    except Exception as e:
-                        logger.warning(f"Failed to get manual transcript in {lang}: {e}")
-            
-            # Then try auto-generated English transcripts
-            if not transcript:
-                for lang in ['en', 'en-US', 'en-GB']:
-                    if lang in auto_transcripts:
-                        try:
-                            transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=[lang])
-                            used_language = lang
-                            logger.info(f"Using auto-generated transcript in: {lang}")
-                            break
-                        except Exception as e:
-                            logger.warning(f"Failed to get auto-generated transcript in {lang}: {e}")
-            
-            # Finally try any available transcript
-            if not transcript and available_languages:
-                for lang in available_languages:
-                    try:
-                        transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=[lang])
-                        used_language = lang
-                        logger.info(f"Using transcript in: {lang}")
-                        break
-                    except Exception as e:
-                        logger.warning(f"Failed to get transcript in {lang}: {e}")
-            
-            if not transcript:
-                logger.error(f"Failed to retrieve any transcript despite available languages: {available_languages}")
-                return jsonify({'error': 'No usable transcript found for this video'}), 400
-                
-            logger.info(f"Successfully retrieved transcript for video {video_id} in language {used_language}")
-        except TranscriptsDisabled:
-            return jsonify({'error': 'Transcripts are disabled for this video'}), 400
-        except NoTranscriptFound:
-            return jsonify({'error': 'No transcript found for this video'}), 400
-        except Exception as e:
-            error_msg = str(e)
-            if "no element found" in error_msg.lower():
-                return jsonify({'error': 'This video does not have captions available or captions are corrupted'}), 400
-            logger.error(f"Error getting transcript: {error_msg}")
-            return jsonify({'error': f'Error getting transcript: {error_msg}'}), 500
+        with stage('cache_lookup'):
+            cached, tier = summary_cache.get(video_id, MODEL_NAME, PROMPT_VERSION, output_language)
+        if cached:
+            SUMMARY_REQUESTS.inc(f'hit_{tier}')
+            logger.info(f"Summary cache hit ({tier}) for video {video_id}")
+            response = jsonify(summary_payload(load_points(cached.summary), output_language))
+            response.headers['X-Cache'] = 'HIT'
+            response.headers['X-Cache-Tier'] = tier
+            return response
         
-        # Generate summary
+        # Concurrent requests for the same video share one pipeline run
         try:
-            summary = generate_summary_with_timestamps(transcript)
-            logger.info(f"Successfully generated summary for video {video_id}")
-            
-            if not summary or summary.strip() == '':
-                logger.error("Generated summary is empty")
-                return jsonify({'error': 'Generated summary is empty'}), 500
-                
-            return jsonify({'summary': summary})
-        except Exception as e:
-            logger.error(f"Error generating summary: {str(e)}")
-            return jsonify({'error': f'Error generating summary: {str(e)}'}), 500
+            points, shared = summary_flights.do(
+                (video_id, MODEL_NAME, PROMPT_VERSION, output_language),
+                lambda: build_summary(video_id, languages=languages, output_language=output_language),
+                timeout=SUMMARY_FLIGHT_TIMEOUT,
+            )
+        except FlightTimeout as e:
+            logger.warning(f"Coalesced request for video {video_id} timed out: {e}")
+            return jsonify({'error': 'Summary is still being generated, please retry shortly'}), 503
+        except SummaryError as e:
+            SUMMARY_REQUESTS.inc('error')
+            return jsonify({'error': e.message}), e.status_code, e.headers()
+        
+        SUMMARY_REQUESTS.inc('coalesced' if shared else 'miss')
+        response = jsonify(summary_payload(points, output_language))
+        response.headers['X-Cache'] = 'COALESCED' if shared else 'MISS'
+        return response
     
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/summarize/stream', methods=['POST'])
+def summarize_stream():
+    """Server-Sent Events variant of /summarize.
+
+    Emits a `point` event for every summary point as soon as Gemini
+    produces it, then `done` with the full summary, or `error`.
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    
+    video_id = data.get('videoId')
+    if not video_id:
+        return jsonify({'error': 'No video ID provided'}), 400
+    try:
+        languages, output_language = language_options(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    logger.info(f"Streaming summary for video ID: {video_id} ({output_language})")
+    
+    with stage('cache_lookup'):
+        cached, tier = summary_cache.get(video_id, MODEL_NAME, PROMPT_VERSION, output_language)
+    if cached:
+        SUMMARY_REQUESTS.inc(f'hit_{tier}')
+        logger.info(f"Summary cache hit ({tier}) for video {video_id}")
+        
+        response = Response(replay_summary(load_points(cached.summary)), mimetype='text/event-stream')
+        response.headers['X-Cache'] = 'HIT'
+        response.headers['X-Cache-Tier'] = tier
+        return response
+    
+    events = queue.Queue()
+    
+    def run():
+        try:
+            points, shared = summary_flights.do(
+                (video_id, MODEL_NAME, PROMPT_VERSION, output_language),
+                lambda: build_summary(video_id, on_point=lambda point: events.put(('point', point)),
+                                      languages=languages, output_language=output_language),
+                timeout=SUMMARY_FLIGHT_TIMEOUT,
+            )
+            SUMMARY_REQUESTS.inc('coalesced' if shared else 'miss')
+            events.put(('done', points))
+        except FlightTimeout:
+            events.put(('error', 'Summary is still being generated, please retry shortly'))
+        except SummaryError as e:
+            SUMMARY_REQUESTS.inc('error')
+            events.put(('error', e.message))
+        except Exception as e:
+            logger.error(f"Unexpected error while streaming summary: {str(e)}")
+            events.put(('error', str(e)))
+    
+    threading.Thread(target=run, daemon=True).start()
+    
+    def generate():
+        encoder = SummaryEventEncoder()
+        while not encoder.finished:
+            yield from encoder.encode(*events.get())
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Cache'] = 'MISS'
+    return response
+
+@app.route('/summarize/range', methods=['POST'])
+def summarize_range():
+    """Summary of part of a video at a chosen level of detail.
+
+    Body: {"videoId", "start", "end", "level", "languages", "outputLanguage"}.
+    start and end are seconds or timestamps (default: the whole video);
+    level 0 is the finest view, and the default is the finest one that needs
+    at most TREE_MAX_VIEW_NODES nodes. Answered from the summary tree, so
+    only nodes that no earlier request needed are generated.
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    
+    video_id = data.get('videoId')
+    if not video_id:
+        return jsonify({'error': 'No video ID provided'}), 400
+    try:
+        languages, output_language = language_options(data)
+        start, end, level = range_options(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    logger.info(f"Range summary for video ID: {video_id} ({output_language}), {start}-{end}s, level {level}")
+    
+    try:
+        try:
+            resolved = resolve_summary_transcript(video_id, languages, output_language)
+        except Exception as e:
+            raise transcript_error(e)
+        try:
+            with stage('summary_tree'):
+                view = summary_tree.summarize_range(video_id, resolved.entries, transcript_hash(resolved.entries),
+                                                    output_language, start, end, level)
+        except InvalidRange as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            raise generation_error(e)
+    except SummaryError as e:
+        SUMMARY_REQUESTS.inc('error')
+        return jsonify({'error': e.message}), e.status_code, e.headers()
+    
+    SUMMARY_REQUESTS.inc('range_miss' if view.generated else 'range_hit')
+    payload = summary_payload(view.points, output_language)
+    payload.update({
+        'start': view.start,
+        'end': view.end,
+        'level': view.level,
+        'max_level': view.levels,
+        'nodes': view.nodes,
+        'generated_nodes': view.generated,
+    })
+    response = jsonify(payload)
+    response.headers['X-Cache'] = 'MISS' if view.generated else 'HIT'
+    return response
+
+def prefetch_summary(candidate):
+    """Summarize a (video_id, languages, output_language) candidate into the cache unless it is there"""
+    video_id, languages, output_language = candidate
+    cached, _ = summary_cache.get(video_id, MODEL_NAME, PROMPT_VERSION, output_language)
+    if cached:
+        return
+    # Joins (or is joined by) an interactive request for the same video
+    _, shared = summary_flights.do(
+        (video_id, MODEL_NAME, PROMPT_VERSION, output_language),
+        lambda: build_summary(video_id, languages=languages, output_language=output_language),
+        timeout=SUMMARY_FLIGHT_TIMEOUT,
+    )
+    if not shared:
+        logger.info(f"Prefetched summary for video {video_id}")
+
+def summaries_in_flight():
+    """Summary pipeline runs in progress, whichever server started them"""
+    return sum(flights.in_flight() for flights in summary_flight_groups)
+
+def interactive_load_high():
+    return summaries_in_flight() - prefetcher.running() >= PREFETCH_YIELD_AT
+
+prefetcher = PrefetchQueue(
+    prefetch_summary,
+    workers=PREFETCH_WORKERS,
+    max_queued=PREFETCH_MAX_QUEUED,
+    global_rate=PREFETCH_GLOBAL_PER_MINUTE / 60,
+    user_rate=PREFETCH_USER_PER_MINUTE / 60,
+    user_burst=PREFETCH_USER_BURST,
+    is_busy=interactive_load_high,
+)
+
+@app.route('/prefetch', methods=['POST'])
+def prefetch():
+    """Queue candidate videos (e.g. "up next") for low-priority summarization.
+
+    Body: {"videoIds": [...], "userId", "languages", "outputLanguage": optional}.
+    Candidates beyond the caller's quota are skipped; the response reports
+    how many were queued.
+    """
+    data = request.get_json(silent=True)
+    video_ids = data.get('videoIds') if data else None
+    if not isinstance(video_ids, list) or not video_ids:
+        return jsonify({'error': 'videoIds must be a non-empty list'}), 400
+    if len(video_ids) > PREFETCH_MAX_IDS:
+        return jsonify({'error': f'At most {PREFETCH_MAX_IDS} videoIds per request'}), 400
+    if not all(isinstance(video_id, str) and VIDEO_ID_PATTERN.fullmatch(video_id) for video_id in video_ids):
+        return jsonify({'error': 'Invalid video ID'}), 400
+    try:
+        languages, output_language = language_options(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    user_key = str(data.get('userId') or request.remote_addr)
+    queued, skipped = prefetcher.submit(
+        user_key, [(video_id, languages, output_language) for video_id in video_ids])
+    return jsonify({'status': 'accepted', 'queued': queued, 'skipped': skipped}), 202
+
 @app.route('/get_or_create_user', methods=['POST'])
 def get_or_create_user():
     try:
@@ -261,24 +860,16 @@ def get_or_create_user():
         
         client_generated_user_id = data['client_generated_user_id']
         
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # Check if user exists
-        cursor.execute('SELECT id FROM users WHERE client_generated_user_id = ?', (client_generated_user_id,))
-        user = cursor.fetchone()
-        
-        if user:
-            user_id = user[0]
-            logger.info(f"Found existing user with ID: {user_id}")
-        else:
-            # Create new user
-            cursor.execute('INSERT INTO users (client_generated_user_id) VALUES (?)', (client_generated_user_id,))
-            user_id = cursor.lastrowid
-            logger.info(f"Created new user with ID: {user_id}")
-        
-        conn.commit()
-        conn.close()
+        with db.connection() as conn:
+            # Create the user unless it already exists, in one atomic statement
+            created = conn.execute(queries.INSERT_USER, (client_generated_user_id,))
+            
+            if created.rowcount:
+                user_id = created.lastrowid
+                logger.info(f"Created new user with ID: {user_id}")
+            else:
+                user_id = conn.execute(queries.SELECT_USER_BY_CLIENT_ID, (client_generated_user_id,)).fetchone()[0]
+                logger.info(f"Found existing user with ID: {user_id}")
         
         return jsonify({'user_id': user_id}), 200
     except Exception as e:
@@ -295,23 +886,22 @@ def save_note(user_id):
         video_id = data['video_id']
         content = data['content']
         
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # Verify user exists
-        cursor.execute('SELECT id FROM users WHERE id = ?', (user_id,))
-        if not cursor.fetchone():
-            return jsonify({'error': 'User not found'}), 404
-        
-        # Insert note
-        cursor.execute('''
-            INSERT INTO notes (user_id, video_id, content) 
-            VALUES (?, ?, ?)
-        ''', (user_id, video_id, content))
-        
-        note_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with db.connection() as conn:
+            cursor = conn.cursor()
+            
+            # Verify user exists
+            cursor.execute('SELECT id FROM users WHERE id = ?', (user_id,))
+            if not cursor.fetchone():
+                return jsonify({'error': 'User not found'}), 404
+            
+            # Insert note
+            cursor.execute(queries.ENSURE_VIDEO, (video_id,))
+            cursor.execute('''
+                INSERT INTO notes (user_id, video_id, content) 
+                VALUES (?, ?, ?)
+            ''', (user_id, video_id, content))
+            
+            note_id = cursor.lastrowid
         
         logger.info(f"Saved note {note_id} for user {user_id}, video {video_id}")
         return jsonify({'note_id': note_id}), 201
@@ -319,33 +909,106 @@ def save_note(user_id):
         logger.error(f"Error saving note: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def conditional_page(rows, next_cursor, last_modified, render):
+    """JSON response for one page with ETag/Last-Modified validators.
+
+    Answers 304 without rendering the page when the client's copy is current.
+    """
+    etag = page_etag(rows, next_cursor)
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = bool(last_modified and request.if_modified_since
+                            and last_modified <= request.if_modified_since)
+    
+    response = Response(status=304) if not_modified else jsonify(render())
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Let the browser cache pages but revalidate them on every use
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @app.route('/users/<int:user_id>/notes_by_video/<video_id>', methods=['GET'])
 def get_notes_by_video(user_id, video_id):
+    """Newest notes first, `limit` per page; pass `cursor` from next_cursor for more"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, content, created_at, updated_at 
-            FROM notes 
-            WHERE user_id = ? AND video_id = ?
-            ORDER BY created_at DESC
-        ''', (user_id, video_id))
-        
-        notes = []
-        for row in cursor.fetchall():
-            notes.append({
-                'id': row[0],
-                'content': row[1],
-                'created_at': row[2],
-                'updated_at': row[3]
-            })
-        
-        conn.close()
-        return jsonify(notes), 200
+        limit = page_size(request.args.get('limit'))
+        with db.connection() as conn:
+            rows, next_cursor = read_page(conn, queries.NOTES_BY_VIDEO, queries.NOTES_BY_VIDEO_AFTER,
+                                          (user_id, video_id), request.args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error getting notes: {str(e)}")
         return jsonify({'error': str(e)}), 500
+    
+    last_modified = max(filter(None, (parse_sqlite_timestamp(row[3]) for row in rows)), default=None)
+    return conditional_page(rows, next_cursor, last_modified, lambda: {
+        'notes': [
+            {'id': row[0], 'content': row[1], 'created_at': row[2], 'updated_at': row[3]}
+            for row in rows
+        ],
+        'next_cursor': next_cursor,
+    })
+
+@app.route('/users/<int:user_id>/watched_videos', methods=['GET'])
+def get_watch_history(user_id):
+    """Most recently watched first, `limit` per page; pass `cursor` from next_cursor for more.
+
+    Views still buffered by the watch history writer appear once flushed.
+    """
+    try:
+        limit = page_size(request.args.get('limit'))
+        with db.connection() as conn:
+            rows, next_cursor = read_page(conn, queries.WATCH_HISTORY, queries.WATCH_HISTORY_AFTER,
+                                          (user_id,), request.args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting watch history: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
+    last_modified = parse_sqlite_timestamp(rows[0][2]) if rows else None
+    return conditional_page(rows, next_cursor, last_modified, lambda: {
+        'videos': [{'video_id': row[1], 'watched_at': row[2]} for row in rows],
+        'next_cursor': next_cursor,
+    })
+
+@app.route('/search', methods=['GET'])
+def search():
+    """Full-text search over transcripts and notes.
+
+    Query parameters: q, user_id (limits transcripts to the user's watch
+    history and enables note hits), type (all, transcripts or notes),
+    limit and offset.
+    """
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({'error': 'q is required'}), 400
+
+    kinds = SEARCH_TYPES.get(request.args.get('type', 'all'))
+    if kinds is None:
+        return jsonify({'error': f"type must be one of: {', '.join(SEARCH_TYPES)}"}), 400
+
+    try:
+        user_id = request.args.get('user_id', type=int)
+        limit = min(max(int(request.args.get('limit', SEARCH_PAGE_SIZE)), 1), SEARCH_MAX_PAGE_SIZE)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+
+    try:
+        with db.connection() as conn:
+            hits, has_more = search_hits(conn, text, user_id, kinds, limit, offset)
+    except Exception as e:
+        logger.error(f"Error searching for {text!r}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({
+        'results': hits,
+        'next_offset': offset + limit if has_more else None,
+    }), 200
 
 @app.route('/users/<int:user_id>/watched_videos', methods=['POST'])
 def log_watched_video(user_id):
@@ -356,22 +1019,45 @@ def log_watched_video(user_id):
         
         video_id = data['video_id']
         
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        # Buffered and written in batches by the watch history writer
+        watch_history.add(user_id, video_id)
         
-        # Insert or update watched video record
-        cursor.execute('''
-            INSERT OR REPLACE INTO watched_videos (user_id, video_id, watched_at)
-            VALUES (?, ?, CURRENT_TIMESTAMP)
-        ''', (user_id, video_id))
+        logger.debug(f"Queued watched video {video_id} for user {user_id}")
+        return jsonify({'status': 'accepted'}), 202
+    except Exception as e:
+        logger.error(f"Error logging watched video: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/users/<int:user_id>/watched_videos/batch', methods=['POST'])
+def log_watched_videos_batch(user_id):
+    """Accept a backlog of views: {"events": [{"video_id": ..., "watched_at": <unix seconds>}]}"""
+    try:
+        data = request.get_json()
+        events = data.get('events') if data else None
+        if not isinstance(events, list) or not events:
+            return jsonify({'error': 'events must be a non-empty list'}), 400
+        if len(events) > WATCH_BATCH_MAX_EVENTS:
+            return jsonify({'error': f'At most {WATCH_BATCH_MAX_EVENTS} events per request'}), 400
         
-        conn.commit()
-        conn.close()
+        views = []
+        for event in events:
+            if not isinstance(event, dict) or not event.get('video_id'):
+                return jsonify({'error': 'Every event needs a video_id'}), 400
+            watched_at = event.get('watched_at')
+            if watched_at is not None:
+                # A future time would pin the video to the top of the history
+                watched_at = sqlite_timestamp(min(float(watched_at), time.time()))
+            views.append((event['video_id'], watched_at))
         
-        logger.info(f"Logged watched video {video_id} for user {user_id}")
-        return jsonify({'status': 'success'}), 200
+        for video_id, watched_at in views:
+            watch_history.add(user_id, video_id, watched_at)
+        
+        logger.info(f"Queued {len(events)} watched videos for user {user_id}")
+        return jsonify({'status': 'accepted', 'count': len(events)}), 202
+    except (TypeError, ValueError, OverflowError, OSError) as e:
+        return jsonify({'error': f'Invalid watched_at: {str(e)}'}), 400
     except Exception as e:
-        logger.error(f"Error logging watched video: {str(e)}")
+        logger.error(f"Error logging watched videos batch: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
@@ -381,10 +1067,12 @@ if __name__ == '__main__':
     
     # Initialize database
     init_database()
+    gemini_health.ensure_started()
     
     logger.info(f"📡 Server starting on port {PORT}...")
     logger.info("📊 Features: Video summarization, User notes, Watch history")
-    logger.info("🔑 Gemini API: Configured and tested")
+    logger.info("🔑 Gemini API: checked in the background (see / for status)")
+    logger.info("🏭 Production: gunicorn -c gunicorn.conf.py")
     logger.info("="*60)
     
-    app.run(host='0.0.0.0', port=PORT, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=PORT, debug=DEBUG, threaded=True)
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""Request coalescing for expensive, idempotent computations.
+
+The first caller for a key (the leader) runs the computation; callers that
+arrive while it is in flight (followers) block until it finishes and receive
+the same result, or the same exception.
+"""
+import asyncio
+import threading
+
+
+class FlightTimeout(Exception):
+    """Raised to a follower whose bounded wait for the leader expired"""
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'followers')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, timeout=None):
+        """Run fn() once per in-flight key and share its outcome.
+
+        Returns (result, shared) where shared is True for followers. Followers
+        wait at most `timeout` seconds before raising FlightTimeout; the
+        leader itself is never interrupted.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+            else:
+                call.followers += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise FlightTimeout(f"Timed out after {timeout}s waiting for in-flight request")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight for the ASGI server.
+
+    The computation runs as its own task, so a leader that disconnects does
+    not cancel the work its followers are waiting on.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+
+    async def do(self, key, coro_fn, timeout=None):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._tasks[key] = task
+
+            def forget(done):
+                if self._tasks.get(key) is done:
+                    del self._tasks[key]
+            task.add_done_callback(forget)
+            return await asyncio.shield(task), False
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout), True
+        except asyncio.TimeoutError:
+            raise FlightTimeout(f"Timed out after {timeout}s waiting for in-flight request")
+
+    def in_flight(self):
+        return len(self._tasks)
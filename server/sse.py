@@ -0,0 +1,45 @@
+"""Server-Sent Events framing for streamed summaries.
+
+Shared by the Flask and ASGI streaming endpoints. The summary pipeline
+reports ('point', point), ('done', points) or ('error', message) events;
+SummaryEventEncoder turns them into `point`, `done` and `error` SSE frames.
+Each `point` frame carries one {'seconds', 'label', 'text'} summary point.
+"""
+import json
+
+from summary_points import render_summary
+
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+def done_event(points):
+    return sse_event('done', {'summary': render_summary(points), 'points': points})
+
+
+def replay_summary(points):
+    """Frames for a summary that is already complete (e.g. a cache hit)"""
+    frames = [sse_event('point', point) for point in points]
+    frames.append(done_event(points))
+    return frames
+
+
+class SummaryEventEncoder:
+    def __init__(self):
+        self.streamed = False
+        self.finished = False
+
+    def encode(self, kind, payload):
+        """Return the SSE frames for one pipeline event"""
+        if kind == 'point':
+            self.streamed = True
+            return [sse_event('point', payload)]
+
+        self.finished = True
+        if kind == 'done':
+            # Followers of a coalesced request receive no streamed points
+            if not self.streamed:
+                return replay_summary(payload)
+            return [done_event(payload)]
+        return [sse_event('error', {'error': payload})]
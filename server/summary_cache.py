@@ -0,0 +1,163 @@
+"""Two-tier cache for generated video summaries.
+
+Summaries are content-addressed: the persistent row is keyed by video id,
+output language, transcript language, a hash of the transcript text, the
+model name and the prompt version, so a changed transcript or prompt never
+serves a stale summary. Lookups from the request path only know the video
+id, model, prompt version and output language, so both tiers are also
+indexed by those and return the newest matching entry. get_any() finds a
+summary of the video in any output language, to translate from.
+"""
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def transcript_hash(transcript_entries):
+    """Return a stable SHA-256 hex digest of a transcript's timings and text"""
+    digest = hashlib.sha256()
+    for entry in transcript_entries:
+        digest.update(f"{entry['start']:.3f}\x1f{entry['text']}\x1e".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def init_summary_cache_table(cursor):
+    """Create the pre-migration-4 summaries table; called from migrations.create_base_schema.
+
+    Migration 4 rebuilds it with the output_language column and the lookup
+    index the cache actually queries, so this must keep the original layout.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS summaries (
+            video_id TEXT NOT NULL,
+            language TEXT NOT NULL,
+            transcript_hash TEXT NOT NULL,
+            model TEXT NOT NULL,
+            prompt_version INTEGER NOT NULL,
+            summary TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (video_id, language, transcript_hash, model, prompt_version),
+            FOREIGN KEY (video_id) REFERENCES videos (video_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_summaries_lookup
+        ON summaries (video_id, model, prompt_version, created_at)
+    ''')
+
+
+class CacheEntry:
+    __slots__ = ('language', 'transcript_hash', 'summary', 'created_at', 'output_language', 'size')
+
+    def __init__(self, language, transcript_hash, summary, created_at, output_language):
+        self.language = language
+        self.transcript_hash = transcript_hash
+        self.summary = summary
+        self.created_at = created_at
+        self.output_language = output_language
+        self.size = len(summary.encode('utf-8'))
+
+
+class SummaryCache:
+    """In-process LRU (TTL + entry/byte limits) in front of the summaries table"""
+
+    def __init__(self, db, ttl_seconds=7 * 24 * 3600, max_entries=1024,
+                 max_bytes=16 * 1024 * 1024):
+        self.db = db
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _expired(self, created_at, now):
+        return now - created_at > self.ttl_seconds
+
+    def _remember(self, key, entry):
+        # Caller holds self._lock
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.size
+        if entry.size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+
+    def get(self, video_id, model, prompt_version, output_language):
+        """Return (entry, tier) for the newest fresh summary, or (None, None)"""
+        key = (video_id, model, prompt_version, output_language)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry.created_at, now):
+                    self._entries.move_to_end(key)
+                    return entry, 'memory'
+                self._entries.pop(key)
+                self._bytes -= entry.size
+
+        try:
+            with self.db.connection() as conn:
+                row = conn.execute('''
+                    SELECT language, transcript_hash, summary, created_at, output_language
+                    FROM summaries
+                    WHERE video_id = ? AND model = ? AND prompt_version = ? AND output_language = ?
+                      AND created_at >= ?
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                ''', (video_id, model, prompt_version, output_language, now - self.ttl_seconds)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Summary cache lookup failed for {video_id}: {e}")
+            return None, None
+
+        if row is None:
+            return None, None
+
+        entry = CacheEntry(*row)
+        with self._lock:
+            self._remember(key, entry)
+        return entry, 'db'
+
+    def get_any(self, video_id, model, prompt_version):
+        """Return the newest fresh summary of video_id in any output language, or None"""
+        try:
+            with self.db.connection() as conn:
+                row = conn.execute('''
+                    SELECT language, transcript_hash, summary, created_at, output_language
+                    FROM summaries
+                    WHERE video_id = ? AND model = ? AND prompt_version = ? AND created_at >= ?
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                ''', (video_id, model, prompt_version, time.time() - self.ttl_seconds)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Summary cache lookup failed for {video_id}: {e}")
+            return None
+        return CacheEntry(*row) if row else None
+
+    def put(self, video_id, language, transcript_digest, model, prompt_version, summary, output_language):
+        entry = CacheEntry(language, transcript_digest, summary, time.time(), output_language)
+        with self._lock:
+            self._remember((video_id, model, prompt_version, output_language), entry)
+
+        try:
+            with self.db.connection() as conn:
+                conn.execute('INSERT OR IGNORE INTO videos (video_id) VALUES (?)', (video_id,))
+                conn.execute('''
+                    INSERT OR REPLACE INTO summaries
+                        (video_id, output_language, language, transcript_hash, model, prompt_version,
+                         summary, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (video_id, output_language, language, transcript_digest, model, prompt_version,
+                      summary, entry.created_at))
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to persist summary for {video_id}: {e}")
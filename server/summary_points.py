@@ -0,0 +1,201 @@
+"""Structured summary output.
+
+Gemini is asked for a JSON array of {"timestamp", "point"} objects (see
+SUMMARY_SCHEMA). The response is parsed and validated once, at generation
+time, into {'seconds', 'label', 'text'} points whose times are snapped to the
+nearest real transcript entry start. Points are what gets cached and sent to
+clients; render_summary() keeps the legacy "Timestamp: [MM:SS] - Key Point:"
+text available for older clients.
+"""
+import json
+import logging
+import re
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# Gemini response_schema (OpenAPI subset) for summary generation
+SUMMARY_SCHEMA = {
+    'type': 'ARRAY',
+    'items': {
+        'type': 'OBJECT',
+        'properties': {
+            'timestamp': {'type': 'STRING'},
+            'point': {'type': 'STRING'},
+        },
+        'required': ['timestamp', 'point'],
+    },
+}
+
+SUMMARY_GENERATION_CONFIG = {
+    'response_mime_type': 'application/json',
+    'response_schema': SUMMARY_SCHEMA,
+}
+
+# Minutes are unbounded without an hour part, so "120:00" is two hours in
+TIMESTAMP_PATTERN = re.compile(r'(?:(\d+):(\d{1,2})|(\d+)):(\d{2})(?:\.\d+)?')
+LEGACY_LINE_PATTERN = re.compile(r'(?<![\d:])\[?(\d+(?::\d{1,2})?:\d{2})\]?\s*-\s*(?:Key Point:\s*)?(.+)')
+
+
+def format_time(seconds):
+    """Format seconds as MM:SS, or HH:MM:SS for an hour or more"""
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, remaining_seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours:02d}:{minutes:02d}:{remaining_seconds:02d}"
+    return f"{minutes:02d}:{remaining_seconds:02d}"
+
+
+def parse_timestamp(value):
+    """Seconds for "MM:SS", "HH:MM:SS" (optionally bracketed) or a number; None if invalid"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value >= 0 else None
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if value.startswith('[') and value.endswith(']'):
+        value = value[1:-1].strip()
+    match = TIMESTAMP_PATTERN.fullmatch(value)
+    if not match:
+        return None
+    hours, hour_minutes, minutes, seconds = match.groups()
+    if int(seconds) >= 60 or (hours is not None and int(hour_minutes) >= 60):
+        return None
+    return int(hours or 0) * 3600 + int(hour_minutes or minutes) * 60 + int(seconds)
+
+
+def transcript_starts(entries):
+    """Entry start times in transcript order (CompactTranscript keeps them in an array)"""
+    starts = getattr(entries, 'starts', None)
+    if starts is not None:
+        return starts
+    return [entry['start'] for entry in entries]
+
+
+def snap_seconds(starts, seconds):
+    """The transcript start time nearest to seconds (binary search over sorted starts)"""
+    if not starts:
+        return seconds
+    index = bisect_left(starts, seconds)
+    if index == 0:
+        return starts[0]
+    if index == len(starts):
+        return starts[-1]
+    before, after = starts[index - 1], starts[index]
+    return before if seconds - before <= after - seconds else after
+
+
+def make_point(timestamp, text, starts):
+    """Validate one model item into a {'seconds', 'label', 'text'} point, or None"""
+    seconds = parse_timestamp(timestamp)
+    if seconds is None or not isinstance(text, str) or not text.strip():
+        return None
+    seconds = round(snap_seconds(starts, seconds), 2)
+    return {'seconds': seconds, 'label': format_time(seconds), 'text': text.strip()}
+
+
+def _legacy_points(text, starts):
+    points = []
+    for line in text.splitlines():
+        match = LEGACY_LINE_PATTERN.search(line)
+        if match:
+            point = make_point(match.group(1), match.group(2), starts)
+            if point:
+                points.append(point)
+    return points
+
+
+def parse_summary_points(text, starts):
+    """Parse a model response into sorted, snapped points; malformed items are dropped"""
+    body = text.strip()
+    if body.startswith('```'):
+        body = body.strip('`').removeprefix('json').strip()
+    try:
+        items = json.loads(body)
+    except ValueError:
+        logger.warning("Summary response is not JSON; falling back to line parsing")
+        return sorted(_legacy_points(text, starts), key=lambda point: point['seconds'])
+
+    if isinstance(items, dict):
+        items = items.get('points') or items.get('items') or []
+    if not isinstance(items, list):
+        return []
+    points = []
+    for item in items:
+        if isinstance(item, dict):
+            point = make_point(item.get('timestamp'), item.get('point'), starts)
+            if point:
+                points.append(point)
+    dropped = len(items) - len(points)
+    if dropped:
+        logger.warning(f"Dropped {dropped} malformed summary points")
+    return sorted(points, key=lambda point: point['seconds'])
+
+
+def render_summary(points):
+    """Legacy one-line-per-point text form of a summary"""
+    return "\n".join(f"Timestamp: [{point['label']}] - Key Point: {point['text']}" for point in points)
+
+
+def dump_points(points):
+    return json.dumps(points, ensure_ascii=False, separators=(',', ':'))
+
+
+def load_points(serialized):
+    return json.loads(serialized)
+
+
+# Output languages named in prompts; other codes are passed through as codes
+LANGUAGE_NAMES = {
+    'ar': 'Arabic', 'bn': 'Bengali', 'de': 'German', 'en': 'English', 'es': 'Spanish',
+    'fa': 'Persian', 'fr': 'French', 'he': 'Hebrew', 'hi': 'Hindi', 'id': 'Indonesian',
+    'it': 'Italian', 'ja': 'Japanese', 'ko': 'Korean', 'nl': 'Dutch', 'pl': 'Polish',
+    'pt': 'Portuguese', 'ru': 'Russian', 'sv': 'Swedish', 'th': 'Thai', 'tr': 'Turkish',
+    'uk': 'Ukrainian', 'vi': 'Vietnamese', 'zh-Hans': 'Simplified Chinese',
+    'zh-Hant': 'Traditional Chinese',
+}
+
+
+def language_name(code):
+    return LANGUAGE_NAMES.get(code, f'the language with code "{code}"')
+
+
+def points_as_items(points):
+    """JSON array of {"timestamp", "point"} items, the format the model is asked for"""
+    return json.dumps([{'timestamp': point['label'], 'point': point['text']} for point in points],
+                      ensure_ascii=False)
+
+
+class PointStream:
+    """Incrementally parse a streamed JSON array of summary items.
+
+    feed() takes raw response fragments and calls on_point with each item as
+    soon as its object is complete, so clients can render points while the
+    rest of the summary is still being generated.
+    """
+
+    def __init__(self, starts, on_point):
+        self.starts = starts
+        self.on_point = on_point
+        self.buffer = ''
+        self._decoder = json.JSONDecoder()
+
+    def feed(self, fragment):
+        self.buffer += fragment
+        position = 0
+        while True:
+            # Skip the array punctuation between objects
+            position = self.buffer.find('{', position)
+            if position == -1:
+                position = len(self.buffer)
+                break
+            try:
+                item, position = self._decoder.raw_decode(self.buffer, position)
+            except ValueError:
+                break  # object not complete yet
+            point = make_point(item.get('timestamp'), item.get('point'), self.starts)
+            if point:
+                self.on_point(point)
+        self.buffer = self.buffer[position:]
@@ -0,0 +1,295 @@
+"""Hierarchical summaries of a video, built incrementally from time segments.
+
+Level 0 cuts the transcript into segments of segment_seconds, aligned to
+multiples of the segment length; a node at level n merges `fanout`
+consecutive nodes of level n-1, so its span is segment_seconds * fanout**n.
+Because spans are aligned, any time range maps onto the same nodes no
+matter who asks for it. Nodes are keyed by span and transcript hash in the
+summary_nodes table and generated only when a request first needs them:
+asking for "12:00-25:00", or for a finer or coarser view of a video that was
+already summarized, reuses every stored node and only runs the model for
+the spans nobody has asked about yet.
+"""
+import functools
+import logging
+import math
+import sqlite3
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+
+from singleflight import SingleFlight
+from summary_points import (dump_points, format_time, language_name, load_points, parse_summary_points,
+                            parse_timestamp, points_as_items, transcript_starts)
+
+logger = logging.getLogger(__name__)
+
+# Bump when SEGMENT_PROMPT or MERGE_PROMPT changes
+TREE_PROMPT_VERSION = 1
+
+# A merged node never has more points than this; children that fit are concatenated without a prompt
+MAX_NODE_POINTS = 5
+
+SEGMENT_PROMPT = """Summarize this part ({start} to {end}) of a video transcript. For each key point:
+1. Identify the most relevant transcript line
+2. Extract the main point
+3. Return it as a JSON object: {{"timestamp": "<time of that line, copied exactly, e.g. 04:15 or 01:02:03>", "point": "<point>"}}
+
+Transcript part:
+{transcript}
+
+Respond with a JSON array of 2-{max_points} such key points in the order they occur.
+Write every point in {language}, whatever the language of the transcript.
+"""
+
+MERGE_PROMPT = """Below are key points from consecutive parts of the section {start} to {end} of a video.
+Merge them into a summary of the whole section: keep the most important points, combine points that
+overlap, and keep the timestamp of the point each merged point is based on.
+
+{points}
+
+Respond with a JSON array of 3-{max_points} {{"timestamp", "point"}} objects in the order they occur.
+Write every point in {language}.
+"""
+
+
+def init_summary_tree_table(cursor):
+    """Create the summary_nodes table; called from migration 5"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS summary_nodes (
+            video_id TEXT NOT NULL,
+            transcript_hash TEXT NOT NULL,
+            output_language TEXT NOT NULL,
+            model TEXT NOT NULL,
+            prompt_version INTEGER NOT NULL,
+            span_seconds INTEGER NOT NULL,
+            start_seconds INTEGER NOT NULL,
+            points TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (video_id, transcript_hash, output_language, model, prompt_version,
+                         span_seconds, start_seconds),
+            FOREIGN KEY (video_id) REFERENCES videos (video_id)
+        )
+    ''')
+
+
+SELECT_NODES = '''
+    SELECT start_seconds, points FROM summary_nodes
+    WHERE video_id = ? AND transcript_hash = ? AND output_language = ? AND model = ?
+      AND prompt_version = ? AND span_seconds = ? AND start_seconds >= ? AND start_seconds < ?
+'''
+
+
+class InvalidRange(ValueError):
+    """The requested range or level does not fit the video"""
+
+
+def range_options(data):
+    """(start, end, level) from a range summary request body; raises ValueError"""
+    start = parse_timestamp(data.get('start', 0))
+    end = data.get('end')
+    if end is not None:
+        end = parse_timestamp(end)
+        if end is None:
+            start = None
+    if start is None:
+        raise ValueError('start and end must be seconds or MM:SS / HH:MM:SS timestamps')
+    level = data.get('level')
+    if level is not None and (isinstance(level, bool) or not isinstance(level, int)):
+        raise ValueError('level must be an integer')
+    return start, end, level
+
+
+class RangeSummary:
+    """Points of one view of a video: the nodes at `level` that cover [start, end)"""
+
+    __slots__ = ('points', 'level', 'levels', 'start', 'end', 'nodes', 'generated')
+
+    def __init__(self, points, level, levels, start, end, nodes, generated):
+        self.points = points
+        self.level = level
+        self.levels = levels
+        self.start = start
+        self.end = end
+        self.nodes = nodes
+        self.generated = generated
+
+
+class SummaryTree:
+    def __init__(self, db, generate, model, format_lines, segment_seconds=300, fanout=4,
+                 max_view_nodes=4, max_workers=4):
+        """generate(prompt) must return the model's JSON text; format_lines(entries) the prompt lines"""
+        self.db = db
+        self.generate = generate
+        self.model = model
+        self.format_lines = format_lines
+        self.segment_seconds = segment_seconds
+        self.fanout = fanout
+        self.max_view_nodes = max_view_nodes
+        self.max_workers = max_workers
+        self._flights = SingleFlight()
+
+    def span(self, level):
+        return self.segment_seconds * self.fanout ** level
+
+    def top_level(self, duration):
+        """The lowest level at which one node covers the whole video"""
+        level = 0
+        while self.span(level) < duration:
+            level += 1
+        return level
+
+    def view_level(self, start, end, levels):
+        """The finest level at which [start, end) is covered by at most max_view_nodes nodes"""
+        for level in range(levels + 1):
+            if len(self.covering(level, start, end)) <= self.max_view_nodes:
+                return level
+        return levels
+
+    def covering(self, level, start, end):
+        """Start times of the nodes at level that overlap [start, end)"""
+        span = self.span(level)
+        return list(range(int(start // span) * span, math.ceil(end), span))
+
+    def children(self, level, start, duration):
+        """Start times of the nodes one level down that are merged into (level, start), up to the video's end"""
+        child_span = self.span(level - 1)
+        return [child for child in range(start, start + self.span(level), child_span) if child < duration]
+
+    def _load(self, key, level, first, last):
+        """{start_seconds: points} of the stored nodes at level starting in [first, last]"""
+        video_id, digest, output_language = key
+        try:
+            with self.db.connection() as conn:
+                rows = conn.execute(SELECT_NODES, (video_id, digest, output_language, self.model,
+                                                   TREE_PROMPT_VERSION, self.span(level), first,
+                                                   last + 1)).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Summary node lookup failed for {video_id}: {e}")
+            return {}
+        return {start: load_points(points) for start, points in rows}
+
+    def _store(self, key, level, start, points):
+        video_id, digest, output_language = key
+        try:
+            with self.db.connection() as conn:
+                conn.execute('INSERT OR IGNORE INTO videos (video_id) VALUES (?)', (video_id,))
+                conn.execute('''
+                    INSERT OR REPLACE INTO summary_nodes
+                        (video_id, transcript_hash, output_language, model, prompt_version,
+                         span_seconds, start_seconds, points, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (video_id, digest, output_language, self.model, TREE_PROMPT_VERSION,
+                      self.span(level), start, dump_points(points), time.time()))
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to store summary node for {video_id}: {e}")
+
+    def _summarize_segment(self, entries, starts, output_language, start):
+        end = start + self.segment_seconds
+        first, last = bisect_left(starts, start), bisect_left(starts, end)
+        if first == last:
+            return []  # nothing is said in this segment
+        segment = entries[first:last]
+        prompt = SEGMENT_PROMPT.format(start=format_time(start), end=format_time(end),
+                                       transcript="\n".join(self.format_lines(segment)),
+                                       max_points=MAX_NODE_POINTS, language=language_name(output_language))
+        points = parse_summary_points(self.generate(prompt), starts[first:last])
+        if not points:
+            raise ValueError(f"No valid key points for segment {format_time(start)}")
+        return points[:MAX_NODE_POINTS]
+
+    def _merge(self, children, starts, output_language, level, start):
+        points = [point for child in children for point in child]
+        if len(points) <= MAX_NODE_POINTS:
+            return points
+        end = start + self.span(level)
+        prompt = MERGE_PROMPT.format(start=format_time(start), end=format_time(end),
+                                     points=points_as_items(points), max_points=MAX_NODE_POINTS,
+                                     language=language_name(output_language))
+        merged = parse_summary_points(self.generate(prompt), starts)
+        if not merged:
+            raise ValueError(f"No valid key points when merging {format_time(start)}-{format_time(end)}")
+        return merged[:MAX_NODE_POINTS]
+
+    def _build_node(self, key, level, start, build):
+        """Generate and store one missing node; returns (points, whether this call built it).
+
+        Concurrent requests for the node share one model call, and a request
+        that found it missing just before another stored it reuses it.
+        """
+        def run():
+            stored = self._load(key, level, start, start).get(start)
+            if stored is not None:
+                return stored, False
+            points = build()
+            self._store(key, level, start, points)
+            return points, True
+        (points, built), shared = self._flights.do(key + (level, start), run)
+        return points, built and not shared
+
+    def nodes(self, key, entries, level, node_starts, duration):
+        """Return ({start: points} for node_starts at level, number of nodes generated).
+
+        Stored nodes are loaded top-down; the missing ones (and whatever
+        missing descendants they need) are then generated bottom-up, one
+        level at a time with the levels' nodes in parallel.
+        """
+        starts = transcript_starts(entries)
+        output_language = key[2]
+        known = {}
+        wanted = {level: set(node_starts)}
+        for current in range(level, -1, -1):
+            if not wanted[current]:
+                known[current] = {}
+                wanted[current - 1] = set()
+                continue
+            known[current] = self._load(key, current, min(wanted[current]), max(wanted[current]))
+            missing = wanted[current] - set(known[current])
+            if current:
+                wanted[current - 1] = {child for node in missing for child in self.children(current, node, duration)}
+
+        def build(current, node):
+            if current == 0:
+                return self._summarize_segment(entries, starts, output_language, node)
+            children = [known[current - 1][child] for child in self.children(current, node, duration)]
+            return self._merge(children, starts, output_language, current, node)
+
+        generated = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for current in range(0, level + 1):
+                missing = sorted(wanted[current] - set(known[current]))
+                if not missing:
+                    continue
+                futures = [pool.submit(self._build_node, key, current, node, functools.partial(build, current, node))
+                           for node in missing]
+                built = 0
+                for node, future in zip(missing, futures):
+                    known[current][node], was_built = future.result()
+                    built += was_built
+                generated += built
+                logger.info(f"Built {built} of {len(missing)} missing level {current} summary nodes "
+                            f"for video {key[0]}")
+        return {node: known[level][node] for node in node_starts}, generated
+
+    def summarize_range(self, video_id, entries, digest, output_language, start=0, end=None, level=None):
+        """Summarize [start, end) seconds of a transcript at level (default: the view_level).
+
+        Raises InvalidRange for an empty or out-of-bounds range or level.
+        """
+        if not len(entries):
+            raise InvalidRange('Transcript is empty')
+        last = entries[len(entries) - 1]
+        duration = last['start'] + last['duration']
+        end = duration if end is None else min(end, duration)
+        if start < 0 or start >= end:
+            raise InvalidRange('Range must start before it ends and within the video')
+        levels = self.top_level(duration)
+        if level is None:
+            level = self.view_level(start, end, levels)
+        elif not 0 <= level <= levels:
+            raise InvalidRange(f'level must be between 0 and {levels} for this video')
+
+        node_starts = self.covering(level, start, end)
+        nodes, generated = self.nodes((video_id, digest, output_language), entries, level, node_starts, duration)
+        points = [point for node in node_starts for point in nodes[node] if start <= point['seconds'] < end]
+        return RangeSummary(points, level, levels, start, end, len(node_starts), generated)
@@ -0,0 +1,183 @@
+"""Persistent, compact storage for fetched transcripts.
+
+A transcript is held as two packed float arrays (start, duration) plus one
+concatenated text buffer with end offsets, instead of a list of per-entry
+dicts. The arrays are stored as little-endian SQLite blobs and entries are
+only decoded when they are accessed.
+"""
+import logging
+import sqlite3
+import sys
+import time
+from array import array
+
+from search import index_transcript
+from transcripts import ResolvedTranscript, language_matches, language_rank
+
+logger = logging.getLogger(__name__)
+
+
+def _to_blob(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_blob(typecode, blob):
+    values = array(typecode)
+    values.frombytes(blob)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+class CompactTranscript:
+    """Columnar transcript that still reads like a list of entry dicts"""
+
+    __slots__ = ('starts', 'durations', 'text', 'ends')
+
+    def __init__(self, starts, durations, text, ends):
+        self.starts = starts
+        self.durations = durations
+        self.text = text
+        self.ends = ends
+
+    @classmethod
+    def from_entries(cls, entries):
+        starts = array('d')
+        durations = array('d')
+        ends = array('I')
+        parts = []
+        offset = 0
+        for entry in entries:
+            starts.append(entry['start'])
+            durations.append(entry.get('duration', 0.0))
+            parts.append(entry['text'])
+            offset += len(entry['text'])
+            ends.append(offset)
+        return cls(starts, durations, ''.join(parts), ends)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def text_at(self, index):
+        begin = self.ends[index - 1] if index > 0 else 0
+        return self.text[begin:self.ends[index]]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return {
+            'text': self.text_at(index),
+            'start': self.starts[index],
+            'duration': self.durations[index],
+        }
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def nbytes(self):
+        return (self.starts.itemsize * len(self.starts)
+                + self.durations.itemsize * len(self.durations)
+                + self.ends.itemsize * len(self.ends)
+                + len(self.text.encode('utf-8')))
+
+
+def compact_from_columns(starts, durations, text_ends, text):
+    """Rebuild a CompactTranscript from its stored blob columns"""
+    return CompactTranscript(
+        _from_blob('d', starts),
+        _from_blob('d', durations),
+        text,
+        _from_blob('I', text_ends),
+    )
+
+
+def init_transcript_store_table(cursor):
+    """Create the pre-migration-6 transcripts table; called from migrations.create_base_schema.
+
+    Migration 6 adds the translated_from column.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transcripts (
+            video_id TEXT NOT NULL,
+            language TEXT NOT NULL,
+            is_generated INTEGER NOT NULL,
+            entry_count INTEGER NOT NULL,
+            starts BLOB NOT NULL,
+            durations BLOB NOT NULL,
+            text_ends BLOB NOT NULL,
+            text TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (video_id, language),
+            FOREIGN KEY (video_id) REFERENCES videos (video_id)
+        )
+    ''')
+
+
+class TranscriptStore:
+    def __init__(self, db):
+        self.db = db
+
+    def get(self, video_id, language=None, preferred_languages=None):
+        """Return a stored ResolvedTranscript, or None if it was never fetched.
+
+        With a language, only tracks in it (any region; Chinese by script,
+        see language_matches) are considered. Tracks in preferred_languages
+        come first, in that order; otherwise the newest track wins.
+        """
+        try:
+            with self.db.connection() as conn:
+                stored = [code for (code,) in conn.execute('''
+                    SELECT language FROM transcripts WHERE video_id = ? ORDER BY created_at DESC
+                ''', (video_id,))]
+                candidates = [code for code in stored if language is None or language_matches(code, language)]
+                if not candidates:
+                    return None
+                if preferred_languages:
+                    # Exact codes before regional variants; the sort is stable, so ties stay newest first
+                    preferred = list(preferred_languages)
+                    ranks = {code: language_rank(code, preferred) for code in candidates}
+                    candidates.sort(key=lambda code: (ranks[code] is None, ranks[code] or 0, code not in preferred))
+                row = conn.execute('''
+                    SELECT language, is_generated, translated_from, starts, durations, text_ends, text
+                    FROM transcripts WHERE video_id = ? AND language = ?
+                ''', (video_id, candidates[0])).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Transcript store lookup failed for {video_id}: {e}")
+            return None
+
+        if row is None:
+            return None
+
+        language, is_generated, translated_from, *columns = row
+        compact = compact_from_columns(*columns)
+        return ResolvedTranscript(video_id, language, bool(is_generated), compact, translated_from)
+
+    def put(self, resolved):
+        """Persist (and search-index) a ResolvedTranscript; returns it backed by a CompactTranscript"""
+        compact = resolved.entries
+        if not isinstance(compact, CompactTranscript):
+            compact = CompactTranscript.from_entries(compact)
+
+        try:
+            with self.db.connection() as conn:
+                conn.execute('INSERT OR IGNORE INTO videos (video_id) VALUES (?)', (resolved.video_id,))
+                conn.execute('''
+                    INSERT OR REPLACE INTO transcripts
+                        (video_id, language, is_generated, translated_from, entry_count, starts,
+                         durations, text_ends, text, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (resolved.video_id, resolved.language_code, int(resolved.is_generated),
+                      resolved.translated_from, len(compact), _to_blob(compact.starts), _to_blob(compact.durations),
+                      _to_blob(compact.ends), compact.text, time.time()))
+                index_transcript(conn, resolved.video_id, resolved.language_code, compact)
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to persist transcript for {resolved.video_id}: {e}")
+
+        return ResolvedTranscript(resolved.video_id, resolved.language_code,
+                                  resolved.is_generated, compact, resolved.translated_from)
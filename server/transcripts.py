@@ -0,0 +1,225 @@
+"""Transcript track selection shared by the server and the utility scripts.
+
+The caption list for a video is fetched once with list_transcripts(); the best
+track is then picked from it in a single pass and only that track is
+downloaded. Preference order is manual, then auto-generated, tracks in the
+preferred languages (English by default), then any other language in the
+order YouTube lists them.
+
+When the summary is wanted in a specific output language, a native track in
+that language is tried first, then YouTube's own translation of the best
+translatable track, and only then a track in some other language (which the
+model has to translate while summarizing).
+"""
+import logging
+import re
+
+from youtube_transcript_api import YouTubeTranscriptApi
+
+from metrics import REGISTRY, stage
+
+logger = logging.getLogger(__name__)
+
+PREFERRED_LANGUAGES = ['en', 'en-US', 'en-GB']
+LANGUAGE_PATTERN = re.compile(r'[A-Za-z]{2,3}(?:-[A-Za-z0-9]{2,8})*')
+TRADITIONAL_CHINESE_SUBTAGS = {'hant', 'tw', 'hk', 'mo'}
+
+FETCH_ATTEMPTS = REGISTRY.counter(
+    'transcript_fetch_attempts', 'Transcript track downloads by track kind and outcome',
+    labelnames=('kind', 'outcome'))
+RESOLVED = REGISTRY.counter(
+    'transcripts_resolved', 'Transcripts resolved, by track kind and whether earlier tracks failed first',
+    labelnames=('kind', 'fallback'))
+TRANSCRIPT_ENTRIES = REGISTRY.histogram(
+    'transcript_entries', 'Caption entries per resolved transcript',
+    buckets=(50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000))
+
+
+class TranscriptUnavailable(Exception):
+    """Raised when a video lists tracks but none of them could be fetched"""
+
+    def __init__(self, video_id, available_languages):
+        super().__init__(
+            f"No usable transcript for {video_id} (available: {available_languages})")
+        self.video_id = video_id
+        self.available_languages = available_languages
+
+
+class ResolvedTranscript:
+    __slots__ = ('video_id', 'language_code', 'is_generated', 'entries', 'translated_from')
+
+    def __init__(self, video_id, language_code, is_generated, entries, translated_from=None):
+        self.video_id = video_id
+        self.language_code = language_code
+        self.is_generated = is_generated
+        self.entries = entries
+        # Source language when this is YouTube's machine translation of another track
+        self.translated_from = translated_from
+
+    @property
+    def is_manual(self):
+        return not self.is_generated
+
+
+def base_language(code):
+    return code.split('-', 1)[0].lower()
+
+
+def normalize_language(code):
+    """Canonical output-language key ("en-US" -> "en"); raises ValueError if malformed.
+
+    Only Chinese keeps a script, since Simplified and Traditional summaries differ.
+    """
+    if not isinstance(code, str) or not LANGUAGE_PATTERN.fullmatch(code):
+        raise ValueError(f"Invalid language code: {code!r}")
+    base = base_language(code)
+    if base == 'zh':
+        subtags = set(code.lower().split('-')[1:])
+        return 'zh-Hant' if subtags & TRADITIONAL_CHINESE_SUBTAGS else 'zh-Hans'
+    return base
+
+
+def script_subtag(code):
+    """The script subtag of a language code ("latn" in "sr-Latn-RS"), or None"""
+    for subtag in code.split('-')[1:]:
+        if len(subtag) == 4 and subtag.isalpha():
+            return subtag.lower()
+    return None
+
+
+def language_matches(code, language):
+    """True if a track in `code` is in `language`, in any regional variant.
+
+    Chinese is compared by script (zh-TW is zh-Hant); for other languages
+    the scripts only have to agree when both codes name one.
+    """
+    if base_language(code) != base_language(language):
+        return False
+    if base_language(language) == 'zh':
+        return normalize_language(code) == normalize_language(language)
+    script, wanted = script_subtag(code), script_subtag(language)
+    return script is None or wanted is None or script == wanted
+
+
+def language_rank(code, languages):
+    """Position of code in languages (exact match first, then by base language), or None"""
+    if code in languages:
+        return languages.index(code)
+    base = base_language(code)
+    for position, language in enumerate(languages):
+        if base_language(language) == base:
+            return position
+    return None
+
+
+def summary_source(resolved, output_language):
+    """How a summary in output_language is reached from a resolved transcript"""
+    if resolved.translated_from:
+        return 'youtube_translation'
+    if language_matches(resolved.language_code, output_language):
+        return 'native_track'
+    return 'cross_language'
+
+
+def rank_transcripts(transcript_list, preferred_languages=PREFERRED_LANGUAGES):
+    """Order the tracks of a TranscriptList from most to least preferred"""
+    def rank(indexed):
+        position, track = indexed
+        preference = language_rank(track.language_code, preferred_languages)
+        if preference is not None:
+            tier = 1 if track.is_generated else 0
+            return (tier, preference)
+        return (2, position)
+
+    return [track for _, track in sorted(enumerate(transcript_list), key=rank)]
+
+
+def translation_code(track, output_language):
+    """The code YouTube uses to translate track into output_language, or None"""
+    if not getattr(track, 'is_translatable', False):
+        return None
+    codes = [getattr(language, 'language_code', None) or language['language_code']
+             for language in track.translation_languages]
+    matching = [code for code in codes if language_matches(code, output_language)]
+    if not matching:
+        return None
+    return output_language if output_language in matching else matching[0]
+
+
+def plan_tracks(transcript_list, preferred_languages=PREFERRED_LANGUAGES, output_language=None):
+    """Return the (track, translate_to) candidates to try, best first.
+
+    translate_to is None for a native track, else the language code to ask
+    YouTube to translate the track into.
+    """
+    ranked = rank_transcripts(transcript_list, preferred_languages)
+    if output_language is None:
+        return [(track, None) for track in ranked]
+
+    # Same test as TranscriptStore.get(), so a stored native track is found again
+    native = [track for track in ranked if language_matches(track.language_code, output_language)]
+    others = [track for track in ranked if not language_matches(track.language_code, output_language)]
+    plan = [(track, None) for track in native]
+    for track in others:
+        code = translation_code(track, output_language)
+        if code is not None:
+            plan.append((track, code))
+            break
+    plan.extend((track, None) for track in others)
+    return plan
+
+
+def fetch_entries(track):
+    """Download one track as a list of {'text', 'start', 'duration'} dicts"""
+    data = track.fetch()
+    # youtube-transcript-api >= 1.0 returns a FetchedTranscript object
+    if hasattr(data, 'to_raw_data'):
+        data = data.to_raw_data()
+    return data
+
+
+def list_transcript_tracks(video_id, http_client=None):
+    """Fetch a video's TranscriptList, over http_client's pooled connections if given"""
+    if hasattr(YouTubeTranscriptApi, 'list'):
+        # youtube-transcript-api >= 1.0
+        return YouTubeTranscriptApi(http_client=http_client).list(video_id)
+    if http_client is None:
+        return YouTubeTranscriptApi.list_transcripts(video_id)
+    from youtube_transcript_api._transcripts import TranscriptListFetcher
+    return TranscriptListFetcher(http_client).fetch(video_id)
+
+
+def resolve_transcript(video_id, preferred_languages=PREFERRED_LANGUAGES, http_client=None,
+                       output_language=None):
+    """Pick and fetch the best transcript track for a video.
+
+    With output_language, tracks are tried in plan_tracks() order, so the
+    result may be a YouTube translation (see ResolvedTranscript.translated_from).
+    TranscriptsDisabled / NoTranscriptFound from the transcript API propagate
+    unchanged; TranscriptUnavailable is raised when every track fails.
+    """
+    with stage('list_transcripts'):
+        transcript_list = list_transcript_tracks(video_id, http_client)
+    candidates = plan_tracks(transcript_list, preferred_languages or PREFERRED_LANGUAGES, output_language)
+
+    logger.info(f"Available transcripts for video {video_id}: "
+                f"{[(t.language_code, 'auto' if t.is_generated else 'manual', to) for t, to in candidates]}")
+
+    for attempt, (track, translate_to) in enumerate(candidates):
+        kind = 'translated' if translate_to else 'auto-generated' if track.is_generated else 'manual'
+        language_code = translate_to or track.language_code
+        try:
+            with stage('fetch_transcript'):
+                entries = fetch_entries(track.translate(translate_to) if translate_to else track)
+        except Exception as e:
+            FETCH_ATTEMPTS.inc(kind, 'error')
+            logger.warning(f"Failed to get {kind} transcript in {language_code}: {e}")
+            continue
+        FETCH_ATTEMPTS.inc(kind, 'ok')
+        RESOLVED.inc(kind, 'true' if attempt else 'false')
+        TRANSCRIPT_ENTRIES.observe(len(entries))
+        logger.info(f"Using {kind} transcript in: {language_code}")
+        return ResolvedTranscript(video_id, language_code, track.is_generated or bool(translate_to), entries,
+                                  translated_from=track.language_code if translate_to else None)
+
+    raise TranscriptUnavailable(video_id, list(dict.fromkeys(t.language_code for t, _ in candidates)))
@@ -0,0 +1,144 @@
+"""Shared, connection-pooled clients for the YouTube and Gemini upstreams.
+
+The upstreams themselves are backends (see backends.py); by default the
+transcript backend is YouTube over a single requests.Session with a sized
+keep-alive pool (and a default timeout). Calls to each upstream go
+through an UpstreamGuard (rate limit, retries, circuit breaker and the
+upstream's one concurrency limit, shared by the sync and async paths). For
+the async server, each call also gets an overall timeout so a slow upstream
+cannot pile up unbounded in-flight work.
+"""
+import asyncio
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backends import YouTubeTranscripts
+from ratelimit import UpstreamGuard
+
+# Matched by class name so this module does not import either client library
+GEMINI_RETRYABLE_ERRORS = {
+    'TooManyRequests', 'ResourceExhausted', 'ServiceUnavailable',
+    'InternalServerError', 'DeadlineExceeded',
+}
+TRANSCRIPT_RETRYABLE_ERRORS = {
+    'TooManyRequests', 'RequestBlocked', 'IpBlocked', 'YouTubeRequestFailed',
+}
+
+
+class UpstreamTimeout(Exception):
+    """Raised when an upstream call exceeds its configured timeout"""
+
+
+def _is_transient(exc):
+    return isinstance(exc, (UpstreamTimeout, requests.ConnectionError, requests.Timeout))
+
+
+def is_retryable_gemini_error(exc):
+    return _is_transient(exc) or type(exc).__name__ in GEMINI_RETRYABLE_ERRORS
+
+
+def is_retryable_transcript_error(exc):
+    return _is_transient(exc) or type(exc).__name__ in TRANSCRIPT_RETRYABLE_ERRORS
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that applies a default timeout to every request"""
+
+    def __init__(self, timeout, *args, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def pooled_session(pool_size, timeout):
+    session = requests.Session()
+    adapter = TimeoutHTTPAdapter(timeout, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class Upstreams:
+    def __init__(self, llm, transcripts=None, transcript_timeout=15.0, llm_timeout=120.0, pool_size=32,
+                 transcript_guard=None, llm_guard=None):
+        """llm is an LLMBackend; transcripts defaults to YouTube over the pooled session"""
+        self.transcript_guard = transcript_guard or UpstreamGuard('youtube', is_retryable_transcript_error)
+        self.llm_guard = llm_guard or UpstreamGuard('gemini', is_retryable_gemini_error)
+        self.transcript_timeout = transcript_timeout
+        self.llm_timeout = llm_timeout
+        self.http_session = pooled_session(pool_size, transcript_timeout)
+        self.transcripts = transcripts or YouTubeTranscripts(self.http_session)
+        self.llm = llm
+
+    def resolve_transcript_sync(self, video_id, languages=None, output_language=None):
+        """Guarded transcript resolution"""
+        return self.transcript_guard.call(self.transcripts.resolve, video_id, languages, output_language)
+
+    def generate_sync(self, prompt, **kwargs):
+        """Guarded completion; returns the response text"""
+        return self.llm_guard.call(self.llm.generate, prompt, **kwargs)
+
+    def stream_sync(self, prompt, on_text, **kwargs):
+        """Stream a completion through on_text and return the full text.
+
+        Not retried, since fragments may already have been handed to on_text.
+        """
+        def stream():
+            parts = []
+            for text in self.llm.stream(prompt, **kwargs):
+                parts.append(text)
+                on_text(text)
+            return "".join(parts)
+        return self.llm_guard.call(stream, retry=False)
+
+    async def _resolve_with_timeout(self, video_id, languages, output_language):
+        try:
+            return await asyncio.wait_for(
+                asyncio.to_thread(self.transcripts.resolve, video_id, languages, output_language),
+                self.transcript_timeout,
+            )
+        except asyncio.TimeoutError:
+            raise UpstreamTimeout(
+                f"Transcript fetch for {video_id} timed out after {self.transcript_timeout}s")
+
+    async def resolve_transcript(self, video_id, languages=None, output_language=None):
+        """Async transcript resolution"""
+        return await self.transcript_guard.call_async(
+            lambda: self._resolve_with_timeout(video_id, languages, output_language))
+
+    async def _with_llm_timeout(self, call):
+        try:
+            return await asyncio.wait_for(call, self.llm_timeout)
+        except asyncio.TimeoutError:
+            raise UpstreamTimeout(f"Gemini call timed out after {self.llm_timeout}s")
+
+    async def generate(self, prompt, **kwargs):
+        """Await a completion and return its text"""
+        return await self.llm_guard.call_async(
+            lambda: self._with_llm_timeout(self.llm.generate_async(prompt, **kwargs)))
+
+    async def stream(self, prompt, **kwargs):
+        """Async generator over the model's streamed text fragments.
+
+        Only opening the stream is retried; a stream that fails midway
+        is not, since fragments have already been handed to the caller.
+        The concurrency slot is held until the stream ends, as in stream_sync().
+        """
+        async with self.llm_guard.slot_async():
+            texts = await self.llm_guard.call_async(
+                lambda: self._with_llm_timeout(self.llm.open_stream_async(prompt, **kwargs)),
+                hold_slot=False)
+            texts = texts.__aiter__()
+            while True:
+                try:
+                    text = await asyncio.wait_for(texts.__anext__(), self.llm_timeout)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    raise UpstreamTimeout(f"Gemini stream stalled for {self.llm_timeout}s")
+                yield text
@@ -0,0 +1,122 @@
+"""Write-behind buffer for watch-history events.
+
+Views are accepted into memory immediately and written by a background
+thread in one transaction per batch. Repeated views of the same video by the
+same user within a flush window collapse into one row update (keeping the
+latest timestamp). A batch is flushed when it reaches max_batch events or
+flush_interval seconds after its first event, and on close().
+
+The writer thread is started by the first add(), so a process that imports
+the server and then forks (a preloading WSGI master) does not own it.
+"""
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+import queries
+
+logger = logging.getLogger(__name__)
+
+# Replayed backlog events carry their original (older) time, so a view only
+# ever moves a video up the history. Timestamps compare correctly as text.
+UPSERT_WATCHED = '''
+    INSERT INTO watched_videos (user_id, video_id, watched_at)
+    VALUES (?, ?, ?)
+    ON CONFLICT (user_id, video_id) DO UPDATE SET watched_at = MAX(watched_at, excluded.watched_at)
+'''
+
+
+def sqlite_timestamp(seconds=None):
+    """Format a Unix time like SQLite's CURRENT_TIMESTAMP (UTC)"""
+    moment = datetime.fromtimestamp(seconds, timezone.utc) if seconds is not None else datetime.now(timezone.utc)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+class WatchHistoryWriter:
+    def __init__(self, db, max_batch=500, flush_interval=1.0):
+        self.db = db
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._thread = None
+
+    def _ensure_started(self):
+        # Caller holds self._lock
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='watch-history-writer', daemon=True)
+            self._thread.start()
+
+    def add(self, user_id, video_id, watched_at=None):
+        """Queue one view; watched_at is a SQLite timestamp string (default: now)"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Watch history writer is closed')
+            self._ensure_started()
+            key = (user_id, video_id)
+            timestamp = watched_at or sqlite_timestamp()
+            previous = self._pending.get(key)
+            if previous is None or timestamp > previous:
+                self._pending[key] = timestamp
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._wakeup.notify()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _take_batch(self):
+        # Caller holds self._lock
+        batch = [(user_id, video_id, watched_at)
+                 for (user_id, video_id), watched_at in self._pending.items()]
+        self._pending = {}
+        return batch
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._wakeup.wait()
+                if not self._pending and self._closed:
+                    return
+                # Give the batch time to fill unless it is already full
+                if len(self._pending) < self.max_batch and not self._closed:
+                    self._wakeup.wait(self.flush_interval)
+                batch = self._take_batch()
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        try:
+            with self.db.connection() as conn:
+                conn.executemany(queries.ENSURE_VIDEO, {(video_id,) for _, video_id, _ in batch})
+                conn.executemany(UPSERT_WATCHED, batch)
+            logger.info(f"Flushed {len(batch)} watch history events")
+        except sqlite3.IntegrityError:
+            # An event for an unknown user poisoned the batch; write the rest row by row
+            self._write_rows(batch)
+        except Exception as e:
+            logger.error(f"Failed to flush {len(batch)} watch history events: {e}")
+
+    def _write_rows(self, batch):
+        written = 0
+        for user_id, video_id, watched_at in batch:
+            try:
+                with self.db.connection() as conn:
+                    conn.execute(queries.ENSURE_VIDEO, (video_id,))
+                    conn.execute(UPSERT_WATCHED, (user_id, video_id, watched_at))
+                written += 1
+            except sqlite3.IntegrityError as e:
+                logger.warning(f"Dropped watch event for user {user_id}, video {video_id}: {e}")
+        logger.info(f"Flushed {written} of {len(batch)} watch history events")
+
+    def close(self, timeout=10.0):
+        """Flush everything still buffered and stop the writer thread"""
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
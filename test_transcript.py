@@ -1,23 +1,27 @@
 #!/usr/bin/env python3
 
-from youtube_transcript_api import YouTubeTranscriptApi
+import os
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server'))
+from transcripts import list_transcript_tracks, rank_transcripts, fetch_entries
+
 def test_transcript(video_id):
     print(f"Testing transcript for video ID: {video_id}")
     
     try:
         # First, list available transcripts
         print("Listing available transcripts...")
-        transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+        transcript_list = list_transcript_tracks(video_id)
         
-        print("Available transcripts:")
-        for transcript in transcript_list:
+        print("Available transcripts (in preference order):")
+        candidates = rank_transcripts(transcript_list)
+        for transcript in candidates:
             print(f"  - {transcript.language_code} ({'auto-generated' if transcript.is_generated else 'manual'})")
         
-        # Try to get any transcript
-        print("\nTrying to fetch transcript...")
-        transcript = YouTubeTranscriptApi.get_transcript(video_id)
+        # Fetch only the preferred track from the list we already have
+        print(f"\nTrying to fetch transcript in {candidates[0].language_code}...")
+        transcript = fetch_entries(candidates[0])
         print(f"Success! Got {len(transcript)} transcript entries")
         print("First few entries:")
         for i, entry in enumerate(transcript[:3]):
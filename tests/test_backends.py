@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Checks that the backend interfaces are abstract: a fake that misses a
+method is refused at construction, and a complete one works.
+
+Run directly (python tests/test_backends.py) or with pytest.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+from backends import LLMBackend, TranscriptBackend
+
+
+class SyncOnlyLLM(LLMBackend):
+    def generate(self, prompt, **kwargs):
+        return 'text'
+
+    def stream(self, prompt, **kwargs):
+        yield 'text'
+
+
+class CompleteLLM(SyncOnlyLLM):
+    async def generate_async(self, prompt, **kwargs):
+        return 'text'
+
+    async def open_stream_async(self, prompt, **kwargs):
+        async def texts():
+            yield 'text'
+        return texts()
+
+
+def refused(cls):
+    try:
+        cls()
+    except TypeError as e:
+        return str(e)
+    return None
+
+
+def test_incomplete_backends_are_refused():
+    message = refused(SyncOnlyLLM)
+    assert message and 'generate_async' in message and 'open_stream_async' in message
+    assert refused(TranscriptBackend) and refused(LLMBackend)
+
+
+def test_complete_backend_can_be_constructed():
+    llm = CompleteLLM()
+    assert llm.generate('prompt') == 'text'
+    assert llm.probe() is None
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"ok  {name}")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Checks transcript compaction: non-speech cues and rolling-caption repeats
+are dropped, and fragments merge into segments that keep their first start
+time and respect the sentence, time and length limits.
+
+Run directly (python tests/test_compaction.py) or with pytest.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+from compaction import clean_caption, compact_entries, strip_overlap
+
+
+def entry(start, text, duration=2.0):
+    return {'start': start, 'duration': duration, 'text': text}
+
+
+def test_clean_caption_drops_cues_and_whitespace():
+    assert clean_caption('[Music]  so\nthis is (Applause) it ♪♪') == 'so this is it'
+    assert clean_caption('[ background noise ]') == ''
+
+
+def test_strip_overlap_removes_repeated_tail():
+    assert strip_overlap('we train the network'.split(), 'the Network, on more data') == 'on more data'
+    assert strip_overlap('we train'.split(), 'something new') == 'something new'
+    assert strip_overlap([], 'first line') == 'first line'
+    assert strip_overlap('all of it'.split(), 'all of it') == ''
+
+
+def test_rolling_captions_are_deduplicated():
+    entries = [entry(0.0, 'so today we'), entry(2.0, 'today we look at'), entry(4.0, 'look at gradients.')]
+    assert compact_entries(entries) == [
+        {'start': 0.0, 'duration': 6.0, 'text': 'so today we look at gradients.'}]
+
+
+def test_cue_only_entries_are_skipped():
+    entries = [entry(0.0, '[Music]'), entry(3.0, 'hello there.', duration=5.0)]
+    assert compact_entries(entries) == [{'start': 3.0, 'duration': 5.0, 'text': 'hello there.'}]
+
+
+def test_segments_close_at_sentences_once_long_enough():
+    entries = [entry(0.0, 'Hi.'), entry(2.0, 'This is'), entry(4.0, 'the talk.'), entry(6.0, 'Next part')]
+    segments = compact_entries(entries, min_seconds=4.0)
+    # "Hi." alone spans only 2s, so it does not end a segment
+    assert [(segment['start'], segment['text']) for segment in segments] == [
+        (0.0, 'Hi. This is the talk.'), (6.0, 'Next part')]
+
+
+def test_segments_respect_time_and_length_caps():
+    entries = [entry(float(start), f'word{start}') for start in range(0, 30, 2)]
+    by_time = compact_entries(entries, max_seconds=10.0)
+    assert [segment['start'] for segment in by_time] == [0.0, 10.0, 20.0]
+    assert all(segment['duration'] <= 10.0 for segment in by_time)
+
+    by_length = compact_entries(entries, max_seconds=1000.0, max_chars=20)
+    assert all(len(segment['text']) <= 20 for segment in by_length)
+    assert ' '.join(segment['text'] for segment in by_length) == ' '.join(e['text'] for e in entries)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"ok  {name}")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Checks the paginated list endpoints through the Flask test client on a
+throwaway database: following next_cursor through rows with equal
+timestamps, 304 answers to If-None-Match / If-Modified-Since, and 400 for
+a malformed cursor.
+
+Run directly (python tests/test_list_routes.py) or with pytest.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+TMP = tempfile.TemporaryDirectory()
+os.environ['DB_FILE'] = os.path.join(TMP.name, 'routes.db')
+os.environ.setdefault('GEMINI_API_KEY', 'test-key')
+import server
+
+server.init_database()
+with server.db.connection() as conn:
+    conn.execute("INSERT INTO users (client_generated_user_id) VALUES ('alice')")
+    conn.execute("INSERT INTO videos (video_id) VALUES ('abc')")
+    # Seven notes, five of them written in the same second
+    conn.executemany('INSERT INTO notes (user_id, video_id, content, created_at, updated_at) VALUES (1, ?, ?, ?, ?)',
+                     [('abc', f'note {i}', stamp, stamp) for i, stamp in enumerate(
+                         ['2024-01-01 09:00:00'] * 5 + ['2024-01-02 09:00:00'] * 2)])
+    conn.executemany('INSERT INTO videos (video_id) VALUES (?)', [(f'v{i}',) for i in range(4)])
+    conn.executemany("INSERT INTO watched_videos (user_id, video_id, watched_at) VALUES (1, ?, '2024-01-03 10:00:00')",
+                     [(f'v{i}',) for i in range(4)])
+
+client = server.app.test_client()
+
+
+def test_notes_pages_cover_equal_timestamps_once():
+    contents = []
+    url = '/users/1/notes_by_video/abc?limit=2'
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        body = response.get_json()
+        contents.extend(note['content'] for note in body['notes'])
+        url = body['next_cursor'] and f"/users/1/notes_by_video/abc?limit=2&cursor={body['next_cursor']}"
+    assert contents == [f'note {i}' for i in (6, 5, 4, 3, 2, 1, 0)]
+
+
+def test_unchanged_page_answers_304():
+    first = client.get('/users/1/watched_videos?limit=3')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert first.headers['Last-Modified'] == 'Wed, 03 Jan 2024 10:00:00 GMT'
+
+    again = client.get('/users/1/watched_videos?limit=3', headers={'If-None-Match': etag})
+    assert again.status_code == 304 and again.data == b''
+    assert again.headers['ETag'] == etag
+
+    since = client.get('/users/1/watched_videos?limit=3',
+                       headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert since.status_code == 304
+
+    other_page = client.get('/users/1/watched_videos?limit=2', headers={'If-None-Match': etag})
+    assert other_page.status_code == 200
+
+
+def test_malformed_cursor_is_a_bad_request():
+    for url in ('/users/1/watched_videos?cursor=not-a-cursor',
+                '/users/1/notes_by_video/abc?cursor=eyJhIjoxfQ',
+                '/users/1/watched_videos?limit=ten'):
+        response = client.get(url)
+        assert response.status_code == 400, url
+        assert 'error' in response.get_json()
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"ok  {name}")
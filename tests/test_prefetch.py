@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Checks that background prefetching stays within its quotas and yields to
+interactive load: per-client and global token buckets, the bounded queue,
+and workers holding back while is_busy() is true.
+
+Run directly (python tests/test_prefetch.py) or with pytest.
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+from prefetch import PrefetchQueue
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'condition not reached in time'
+        time.sleep(0.001)
+
+
+class Recorder:
+    def __init__(self):
+        self.runs = []
+        self.lock = threading.Lock()
+
+    def __call__(self, video_id):
+        with self.lock:
+            self.runs.append(video_id)
+
+
+def test_each_client_has_its_own_quota():
+    run = Recorder()
+    queue = PrefetchQueue(run, global_rate=1000, global_burst=1000, user_rate=0.001, user_burst=2)
+    try:
+        assert queue.submit('alice', ['a1', 'a2', 'a3', 'a4']) == (2, 2)
+        assert queue.submit('alice', ['a5']) == (0, 1)
+        # Another client is not held back by alice's spent quota
+        assert queue.submit('bob', ['b1', 'b2']) == (2, 0)
+        wait_until(lambda: queue.stats()['completed'] == 4)
+    finally:
+        queue.close()
+    assert sorted(run.runs) == ['a1', 'a2', 'b1', 'b2']
+    assert queue.stats()['rejected'] == 3
+
+
+def test_queued_video_is_not_charged_twice():
+    busy = threading.Event()
+    busy.set()
+    queue = PrefetchQueue(Recorder(), workers=1, user_rate=0.001, user_burst=3,
+                          is_busy=busy.is_set, busy_poll=0.01)
+    try:
+        assert queue.submit('alice', ['a1', 'a1', 'a2']) == (2, 1)
+        assert queue.submit('alice', ['a2']) == (0, 1)
+        assert queue.submit('alice', ['a3']) == (1, 0)
+    finally:
+        queue.close()
+
+
+def test_global_quota_caps_prefetch_starts():
+    run = Recorder()
+    queue = PrefetchQueue(run, workers=2, global_rate=0.001, global_burst=2, user_rate=1000, user_burst=1000,
+                          busy_poll=0.01)
+    try:
+        assert queue.submit('alice', ['v1', 'v2', 'v3', 'v4']) == (4, 0)
+        wait_until(lambda: queue.stats()['completed'] == 2)
+        time.sleep(0.1)
+        assert len(run.runs) == 2
+    finally:
+        queue.close()
+    assert len(run.runs) == 2
+
+
+def test_workers_yield_while_interactive_load_is_high():
+    run = Recorder()
+    busy = threading.Event()
+    busy.set()
+    queue = PrefetchQueue(run, workers=1, global_rate=1000, global_burst=1000, is_busy=busy.is_set,
+                          busy_poll=0.01)
+    try:
+        queue.submit('alice', ['v1', 'v2'])
+        time.sleep(0.1)
+        assert run.runs == [] and queue.running() == 0
+        busy.clear()
+        wait_until(lambda: queue.stats()['completed'] == 2)
+    finally:
+        queue.close()
+    assert run.runs == ['v1', 'v2']
+
+
+def test_full_queue_drops_oldest_candidates():
+    run = Recorder()
+    busy = threading.Event()
+    busy.set()
+    queue = PrefetchQueue(run, workers=1, max_queued=2, global_rate=1000, global_burst=1000,
+                          is_busy=busy.is_set, busy_poll=0.01)
+    try:
+        assert queue.submit('alice', ['v1', 'v2', 'v3', 'v4']) == (4, 0)
+        assert queue.stats()['dropped'] == 2
+        busy.clear()
+        wait_until(lambda: queue.stats()['completed'] == 2)
+    finally:
+        queue.close()
+    assert run.runs == ['v3', 'v4']
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"ok  {name}")
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Checks with EXPLAIN QUERY PLAN that the hot read paths use their indexes
+instead of scanning tables, on a freshly migrated throwaway database.
+
+Run directly (python tests/test_query_plan.py) or with pytest.
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+import queries
+from migrations import MIGRATIONS, MIN_SQLITE_VERSION, check_sqlite_version, migrate, schema_version
+from search import fts_query, search_statement
+from summary_tree import SELECT_NODES
+
+
+def migrated_connection(directory):
+    conn = sqlite3.connect(os.path.join(directory, 'plan.db'))
+    migrate(conn)
+    return conn
+
+
+def query_plan(conn, sql, params):
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+
+def assert_indexed(plan, index_name):
+    assert any(index_name in step for step in plan), f"expected {index_name} in plan: {plan}"
+    assert not any(step.startswith('SCAN') for step in plan), f"unexpected table scan: {plan}"
+    assert not any('TEMP B-TREE' in step for step in plan), f"unexpected sort: {plan}"
+
+
+def test_notes_by_video_uses_index():
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = migrated_connection(tmp)
+        first = query_plan(conn, queries.NOTES_BY_VIDEO, (1, 'abc', 51))
+        after = query_plan(conn, queries.NOTES_BY_VIDEO_AFTER, (1, 'abc', '2024-01-01 00:00:00', 10, 51))
+        conn.close()
+    assert_indexed(first, 'idx_notes_user_video_created')
+    assert_indexed(after, 'idx_notes_user_video_created')
+
+
+def test_watch_history_pages_use_index():
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = migrated_connection(tmp)
+        first = query_plan(conn, queries.WATCH_HISTORY, (1, 51))
+        after = query_plan(conn, queries.WATCH_HISTORY_AFTER, (1, '2024-01-01 00:00:00', 10, 51))
+        conn.close()
+    assert_indexed(first, 'idx_watched_videos_user_watched')
+    assert_indexed(after, 'idx_watched_videos_user_watched')
+
+
+def test_user_lookup_uses_unique_index():
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = migrated_connection(tmp)
+        plan = query_plan(conn, queries.SELECT_USER_BY_CLIENT_ID, ('client',))
+        conn.close()
+    assert_indexed(plan, 'sqlite_autoindex_users')
+
+
+def test_user_insert_reports_creation_without_returning():
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = migrated_connection(tmp)
+        created = conn.execute(queries.INSERT_USER, ('client',))
+        outcome = (created.rowcount, created.lastrowid)
+        again = conn.execute(queries.INSERT_USER, ('client',)).rowcount
+        found = conn.execute(queries.SELECT_USER_BY_CLIENT_ID, ('client',)).fetchone()
+        conn.close()
+    assert outcome == (1, found[0])
+    assert again == 0
+
+
+def test_old_sqlite_is_refused_with_a_clear_message():
+    check_sqlite_version(MIN_SQLITE_VERSION)
+    check_sqlite_version(sqlite3.sqlite_version_info)
+    try:
+        check_sqlite_version((3, 23, 1))
+        raise AssertionError('expected RuntimeError')
+    except RuntimeError as e:
+        assert '3.24.0 or newer' in str(e) and '3.23.1' in str(e)
+
+
+def test_search_uses_fts_indexes():
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = migrated_connection(tmp)
+        sql, params = search_statement(fts_query('gradient descent'), user_id=1)
+        plan = query_plan(conn, sql, params + [20, 0])
+        conn.close()
+    assert any('transcript_segments_fts VIRTUAL TABLE' in step for step in plan), plan
+    assert any('notes_fts VIRTUAL TABLE' in step for step in plan), plan
+    # Every real table is reached by key from the FTS matches, never scanned
+    assert not any(step.startswith('SCAN') and 'VIRTUAL TABLE' not in step for step in plan), plan
+
+
+def test_summary_nodes_lookup_uses_primary_key():
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = migrated_connection(tmp)
+        plan = query_plan(conn, SELECT_NODES, ('abc', 'hash', 'en', 'model', 1, 300, 600, 1500))
+        conn.close()
+    assert_indexed(plan, 'sqlite_autoindex_summary_nodes')
+
+
+def test_migrations_are_recorded_and_idempotent():
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = migrated_connection(tmp)
+        migrate(conn)
+        version = schema_version(conn)
+        foreign_keys = conn.execute('PRAGMA foreign_key_list(notes)').fetchall()
+        conn.close()
+    assert version == MIGRATIONS[-1][0]
+    assert any(fk[2] == 'videos' for fk in foreign_keys)
+
+
+BASELINE_SCHEMA = '''
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_generated_user_id TEXT UNIQUE NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE videos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        video_id TEXT UNIQUE NOT NULL,
+        title TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE notes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        video_id TEXT NOT NULL,
+        content TEXT NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    );
+    CREATE TABLE watched_videos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        video_id TEXT NOT NULL,
+        watched_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        UNIQUE(user_id, video_id)
+    );
+'''
+
+
+def test_migrates_populated_baseline_database():
+    # Before migration 1 foreign keys were not enforced, so rows of unknown users exist
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'baseline.db'))
+        conn.executescript(BASELINE_SCHEMA)
+        conn.execute("INSERT INTO users (client_generated_user_id) VALUES ('client')")
+        conn.execute("INSERT INTO notes (user_id, video_id, content) VALUES (1, 'abc', 'kept')")
+        conn.execute("INSERT INTO notes (user_id, video_id, content) VALUES (7, 'abc', 'orphaned')")
+        conn.execute("INSERT INTO watched_videos (user_id, video_id) VALUES (1, 'abc')")
+        conn.execute("INSERT INTO watched_videos (user_id, video_id) VALUES (7, 'def')")
+        conn.commit()
+        migrate(conn)
+        version = schema_version(conn)
+        notes = conn.execute('SELECT content FROM notes').fetchall()
+        orphaned_notes = conn.execute('SELECT content FROM orphaned_notes').fetchall()
+        watched = conn.execute('SELECT video_id FROM watched_videos').fetchall()
+        orphaned_watched = conn.execute('SELECT video_id FROM orphaned_watched_videos').fetchall()
+        violations = conn.execute('PRAGMA foreign_key_check').fetchall()
+        conn.close()
+    assert version == MIGRATIONS[-1][0]
+    assert notes == [('kept',)] and orphaned_notes == [('orphaned',)]
+    assert watched == [('abc',)] and orphaned_watched == [('def',)]
+    assert violations == []
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"ok  {name}")
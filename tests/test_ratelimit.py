@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Checks the upstream guard's building blocks on a fake clock: token bucket
+refill and waits, circuit breaker transitions, retries that run out, and
+the concurrency limit shared by the sync and async paths.
+
+Run directly (python tests/test_ratelimit.py) or with pytest.
+"""
+import asyncio
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+import ratelimit
+from ratelimit import CircuitBreaker, TokenBucket, UpstreamGuard, UpstreamUnavailable
+
+
+class FakeClock:
+    """Stands in for the time module inside ratelimit; sleep() advances the clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def with_fake_clock(test):
+    def run():
+        clock = FakeClock()
+        real_time, ratelimit.time = ratelimit.time, clock
+        try:
+            test(clock)
+        finally:
+            ratelimit.time = real_time
+    run.__name__ = test.__name__
+    return run
+
+
+class TooManyRequests(Exception):
+    pass
+
+
+@with_fake_clock
+def test_token_bucket_refills_at_rate(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.try_acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.try_acquire() == 0.5
+    clock.now += 0.5
+    assert bucket.try_acquire() == 0.0
+    # Idle time banks at most `burst` tokens
+    clock.now += 60
+    assert [bucket.try_acquire() for _ in range(4)] == [0.0, 0.0, 0.0, 0.5]
+
+
+@with_fake_clock
+def test_token_bucket_acquire_waits_or_times_out(clock):
+    bucket = TokenBucket(rate=1, burst=1)
+    assert bucket.acquire()
+    assert not bucket.acquire(timeout=0.5)
+    assert bucket.acquire(timeout=1.0)
+    assert clock.now == 1001.0
+
+
+@with_fake_clock
+def test_circuit_opens_and_recovers_through_half_open(clock):
+    breaker = CircuitBreaker('gemini', failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow() == 0.0
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow() == 30
+    clock.now += 30
+    # One trial call is let through; others wait for its outcome
+    assert breaker.allow() == 0.0 and breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow() == 1.0
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow() == 0.0
+
+
+@with_fake_clock
+def test_failed_trial_reopens_the_circuit(clock):
+    breaker = CircuitBreaker('gemini', failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow() == 0.0
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow() == 10
+
+
+@with_fake_clock
+def test_guard_retries_then_reports_unavailable(clock):
+    guard = UpstreamGuard('gemini', lambda e: isinstance(e, TooManyRequests), rate=100, burst=100,
+                          max_retries=2, backoff_base=1.0, failure_threshold=10)
+    calls = []
+
+    def quota_exceeded():
+        calls.append(clock.now)
+        raise TooManyRequests('quota exceeded')
+
+    try:
+        guard.call(quota_exceeded)
+        raise AssertionError('expected UpstreamUnavailable')
+    except UpstreamUnavailable as e:
+        assert isinstance(e.__cause__, TooManyRequests)
+        # The delay the next backoff would have used: base * 2 ** attempts
+        assert e.retry_after == 4.0
+    assert len(calls) == 3
+    assert guard.stats()['retries'] == 2
+
+
+@with_fake_clock
+def test_guard_passes_non_retryable_errors_through(clock):
+    guard = UpstreamGuard('youtube', lambda e: False, failure_threshold=1)
+
+    def no_transcript():
+        raise LookupError('no transcript')
+
+    for _ in range(3):
+        try:
+            guard.call(no_transcript)
+            raise AssertionError('expected LookupError')
+        except LookupError:
+            pass
+    # The upstream answered, so the circuit stays closed
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+
+@with_fake_clock
+def test_throttled_call_does_not_keep_the_trial(clock):
+    guard = UpstreamGuard('gemini', lambda e: True, rate=1, burst=1, max_retries=0, failure_threshold=1,
+                          reset_timeout=10, max_wait=0.5)
+    try:
+        guard.call(lambda: 1 / 0)
+    except UpstreamUnavailable:
+        pass
+    assert guard.breaker.state == CircuitBreaker.OPEN
+    clock.now += 10
+    guard.bucket.try_acquire()
+    try:
+        guard.call(lambda: 'never called')
+        raise AssertionError('expected the rate limit to reject the call')
+    except UpstreamUnavailable as e:
+        assert 'rate limit' in str(e)
+    assert guard.breaker.retry_in() == 0.0
+    clock.now += 1
+    assert guard.call(lambda: 'trial') == 'trial'
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_cancelled_trial_is_released():
+    guard = UpstreamGuard('gemini', lambda e: True, rate=1000, burst=1000, failure_threshold=1,
+                          reset_timeout=0.01)
+    guard.breaker.record_failure()
+    threading.Event().wait(0.02)
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(60)
+
+        task = asyncio.ensure_future(guard.call_async(hang))
+        await started.wait()
+        assert guard.breaker.retry_in() == 1.0  # the trial is taken
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        assert guard.breaker.retry_in() == 0.0
+        return await guard.call_async(lambda: asyncio.sleep(0, 'recovered'))
+
+    assert asyncio.run(scenario()) == 'recovered'
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_concurrency_limit_is_shared_by_sync_and_async_calls():
+    guard = UpstreamGuard('gemini', lambda e: False, rate=1000, burst=1000, concurrency=2)
+    active = peak = 0
+    lock = threading.Lock()
+
+    def enter():
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+
+    def leave():
+        nonlocal active
+        with lock:
+            active -= 1
+
+    def sync_call():
+        enter()
+        threading.Event().wait(0.02)
+        leave()
+
+    async def async_call():
+        enter()
+        await asyncio.sleep(0.02)
+        leave()
+
+    async def scenario():
+        threads = [threading.Thread(target=guard.call, args=(sync_call,)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        await asyncio.gather(*[guard.call_async(async_call) for _ in range(6)])
+        for thread in threads:
+            thread.join()
+
+    asyncio.run(scenario())
+    assert peak == 2
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"ok  {name}")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Checks request coalescing: concurrent callers for one key share a single
+run and its result or exception, and followers' waits are bounded.
+
+Run directly (python tests/test_singleflight.py) or with pytest.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+from singleflight import AsyncSingleFlight, FlightTimeout, SingleFlight
+
+
+def wait_for_followers(flight, key, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while flight._calls[key].followers < count:
+        assert time.monotonic() < deadline, 'followers did not join the flight'
+        time.sleep(0.001)
+
+
+def run_followers(flight, key, fn, count, timeout=None):
+    """Call flight.do(key, fn) from `count` threads; returns (threads, [(result, shared) or exception])"""
+    outcomes = []
+    lock = threading.Lock()
+
+    def call():
+        try:
+            outcome = flight.do(key, fn, timeout=timeout)
+        except Exception as e:
+            outcome = e
+        with lock:
+            outcomes.append(outcome)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def test_concurrent_callers_share_one_run():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'summary'
+
+    leader, outcomes = run_followers(flight, 'video', work, 1)
+    started.wait(5)
+    followers, follower_outcomes = run_followers(flight, 'video', work, 4)
+    wait_for_followers(flight, 'video', 4)
+    assert flight.in_flight() == 1
+    release.set()
+    for thread in leader + followers:
+        thread.join()
+
+    assert len(calls) == 1
+    assert outcomes == [('summary', False)]
+    assert follower_outcomes == [('summary', True)] * 4
+    assert flight.in_flight() == 0
+
+
+def test_followers_receive_the_leaders_exception():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def work():
+        started.set()
+        release.wait(5)
+        raise ValueError('upstream failed')
+
+    leader, outcomes = run_followers(flight, 'video', work, 1)
+    started.wait(5)
+    followers, follower_outcomes = run_followers(flight, 'video', work, 2)
+    wait_for_followers(flight, 'video', 2)
+    release.set()
+    for thread in leader + followers:
+        thread.join()
+
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes + follower_outcomes)
+    # The failed run is forgotten, so the next caller retries
+    assert flight.do('video', lambda: 'retried') == ('retried', False)
+
+
+def test_follower_wait_is_bounded():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def work():
+        started.set()
+        release.wait(5)
+        return 'late'
+
+    leader, outcomes = run_followers(flight, 'video', work, 1)
+    started.wait(5)
+    try:
+        flight.do('video', work, timeout=0.01)
+        raise AssertionError('expected FlightTimeout')
+    except FlightTimeout:
+        pass
+    release.set()
+    leader[0].join()
+    assert outcomes == [('late', False)]
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight()
+    assert flight.do('a', lambda: 1) == (1, False)
+    assert flight.do('b', lambda: 2) == (2, False)
+
+
+def test_async_followers_share_one_task():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'summary'
+
+        results = await asyncio.gather(*[flight.do('video', work) for _ in range(5)])
+        return calls, results, flight.in_flight()
+
+    calls, results, in_flight = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert sorted(results) == [('summary', False)] + [('summary', True)] * 4
+    assert in_flight == 0
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"ok  {name}")
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Checks the two-tier summary cache on a freshly migrated throwaway database
+and a fake clock: LRU eviction by entry count and byte budget, TTL expiry
+in both tiers, keying by output language, and falling through from memory
+to SQLite.
+
+Run directly (python tests/test_summary_cache.py) or with pytest.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+import summary_cache
+from db import ConnectionPool
+from migrations import migrate
+from summary_cache import SummaryCache, transcript_hash
+
+MODEL, VERSION = 'model', 1
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+
+def with_db(test):
+    def run():
+        clock = FakeClock()
+        real_time, summary_cache.time = summary_cache.time, clock
+        with tempfile.TemporaryDirectory() as tmp:
+            db = ConnectionPool(os.path.join(tmp, 'cache.db'), size=2)
+            with db.connection() as conn:
+                migrate(conn)
+            try:
+                test(db, clock)
+            finally:
+                db.close()
+                summary_cache.time = real_time
+    run.__name__ = test.__name__
+    return run
+
+
+def put(cache, video_id, summary, output_language='en'):
+    cache.put(video_id, 'en', 'hash', MODEL, VERSION, summary, output_language)
+
+
+def lookup(cache, video_id, output_language='en'):
+    entry, tier = cache.get(video_id, MODEL, VERSION, output_language)
+    return (entry.summary, tier) if entry else (None, None)
+
+
+@with_db
+def test_least_recently_used_entry_is_evicted(db, clock):
+    cache = SummaryCache(db, max_entries=2)
+    put(cache, 'a', 'summary a')
+    put(cache, 'b', 'summary b')
+    assert lookup(cache, 'a') == ('summary a', 'memory')
+    put(cache, 'c', 'summary c')
+    # b was used least recently, so it now comes from SQLite
+    assert lookup(cache, 'b') == ('summary b', 'db')
+    assert lookup(cache, 'c') == ('summary c', 'memory')
+    # Reading b back re-admitted it to memory, evicting a in turn
+    assert list(cache._entries) == [('b', MODEL, VERSION, 'en'), ('c', MODEL, VERSION, 'en')]
+
+
+@with_db
+def test_byte_budget_evicts_oldest_and_skips_oversized(db, clock):
+    cache = SummaryCache(db, max_bytes=20)
+    put(cache, 'a', 'x' * 8)
+    put(cache, 'b', 'é' * 4)  # 8 bytes of UTF-8
+    put(cache, 'c', 'z' * 8)
+    assert cache._bytes == 16
+    assert lookup(cache, 'a') == ('x' * 8, 'db')
+    put(cache, 'big', 'y' * 21)
+    assert ('big', MODEL, VERSION, 'en') not in cache._entries
+    assert lookup(cache, 'big') == ('y' * 21, 'db')
+    assert cache._bytes <= 20
+
+
+@with_db
+def test_entries_expire_in_both_tiers(db, clock):
+    cache = SummaryCache(db, ttl_seconds=100)
+    put(cache, 'a', 'summary a')
+    clock.now += 100
+    assert lookup(cache, 'a') == ('summary a', 'memory')
+    clock.now += 1
+    assert lookup(cache, 'a') == (None, None)
+    assert cache._bytes == 0
+    assert cache.get_any('a', MODEL, VERSION) is None
+
+
+@with_db
+def test_output_language_is_part_of_the_key(db, clock):
+    cache = SummaryCache(db)
+    put(cache, 'a', 'in English', 'en')
+    clock.now += 1
+    put(cache, 'a', 'en français', 'fr')
+    assert lookup(cache, 'a', 'en') == ('in English', 'memory')
+    assert lookup(cache, 'a', 'fr') == ('en français', 'memory')
+    assert lookup(cache, 'a', 'de') == (None, None)
+    newest = cache.get_any('a', MODEL, VERSION)
+    assert (newest.summary, newest.output_language) == ('en français', 'fr')
+
+
+@with_db
+def test_memory_miss_falls_through_to_sqlite(db, clock):
+    put(SummaryCache(db), 'a', 'summary a')
+    # A fresh process starts with an empty memory tier
+    cache = SummaryCache(db)
+    assert lookup(cache, 'a') == ('summary a', 'db')
+    assert lookup(cache, 'a') == ('summary a', 'memory')
+    assert lookup(cache, 'a', 'fr') == (None, None)
+
+
+def test_transcript_hash_covers_timing_and_text():
+    entries = [{'start': 0.0, 'text': 'hello'}, {'start': 1.5, 'text': 'world'}]
+    assert transcript_hash(entries) == transcript_hash([dict(entry) for entry in entries])
+    assert transcript_hash(entries) != transcript_hash([entries[0], {'start': 1.6, 'text': 'world'}])
+    assert transcript_hash(entries) != transcript_hash([entries[0], {'start': 1.5, 'text': 'World'}])
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"ok  {name}")
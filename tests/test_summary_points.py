@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Checks that model responses are validated into summary points: JSON and
+legacy text parsing, incremental parsing of streamed fragments, and
+snapping timestamps onto real transcript entry starts.
+
+Run directly (python tests/test_summary_points.py) or with pytest.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+from summary_points import (PointStream, dump_points, format_time, load_points, parse_summary_points,
+                            parse_timestamp, snap_seconds)
+
+STARTS = [0.0, 12.5, 75.0, 3725.0]
+
+
+def test_parse_timestamp_formats():
+    assert parse_timestamp('04:15') == 255
+    assert parse_timestamp('[01:02:03]') == 3723
+    assert parse_timestamp('1:02:03.5') == 3723
+    assert parse_timestamp(90) == 90.0
+    assert parse_timestamp('04:75') is None
+    assert parse_timestamp('soon') is None
+    assert parse_timestamp(-1) is None
+    assert parse_timestamp(True) is None
+    assert format_time(3723) == '01:02:03'
+    assert format_time(255) == '04:15'
+
+
+def test_parse_timestamp_past_100_minutes():
+    assert parse_timestamp('120:00') == 7200
+    assert parse_timestamp('[125:30]') == 7530
+    assert parse_timestamp(' 02:05:30 ') == 7530
+    assert parse_timestamp('1:60:00') is None
+
+
+def test_parse_timestamp_rejects_surrounding_garbage():
+    for value in ('abc12:34xyz', '12:34 and more', 'at 12:34', '[12:34', '12:345', '1:2:3:45', ':12:34', ''):
+        assert parse_timestamp(value) is None, value
+
+
+def test_snap_to_first_and_last_entry():
+    assert snap_seconds(STARTS, -5) == 0.0
+    assert snap_seconds(STARTS, 0) == 0.0
+    assert snap_seconds(STARTS, 99999) == 3725.0
+    assert snap_seconds(STARTS, 3725.0) == 3725.0
+    # Ties go to the earlier entry
+    assert snap_seconds([10.0, 20.0], 15.0) == 10.0
+    assert snap_seconds([], 42) == 42
+
+
+def test_parse_json_points_sorted_and_snapped():
+    text = '[{"timestamp": "01:02:05", "point": "Late"}, {"timestamp": "00:13", "point": "Early"}]'
+    points = parse_summary_points(text, STARTS)
+    assert points == [
+        {'seconds': 12.5, 'label': '00:12', 'text': 'Early'},
+        {'seconds': 3725.0, 'label': '01:02:05', 'text': 'Late'},
+    ]
+    assert load_points(dump_points(points)) == points
+
+
+def test_parse_fenced_json():
+    text = '```json\n[{"timestamp": "01:15", "point": "Fenced"}]\n```'
+    assert parse_summary_points(text, STARTS) == [{'seconds': 75.0, 'label': '01:15', 'text': 'Fenced'}]
+
+
+def test_parse_drops_malformed_items():
+    text = ('{"points": [{"timestamp": "00:00", "point": "Kept"}, {"timestamp": "never", "point": "Bad time"},'
+            ' {"timestamp": "00:12", "point": "  "}, "not an object"]}')
+    assert [point['text'] for point in parse_summary_points(text, STARTS)] == ['Kept']
+    assert parse_summary_points('"just a string"', STARTS) == []
+
+
+def test_parse_non_json_falls_back_to_legacy_lines():
+    text = ("Here is the summary:\n"
+            "Timestamp: [01:15] - Key Point: Second\n"
+            "[00:00] - First\n"
+            "no timestamp on this line")
+    assert [(point['seconds'], point['text']) for point in parse_summary_points(text, STARTS)] == [
+        (0.0, 'First'), (75.0, 'Second')]
+    long_video = [0.0, 1200.0, 7200.0]
+    assert [point['seconds'] for point in parse_summary_points('[120:00] - Late in the talk', long_video)] == [7200.0]
+
+
+def test_point_stream_handles_objects_split_across_fragments():
+    points = []
+    stream = PointStream(STARTS, points.append)
+    fragments = ['[{"timesta', 'mp": "00:12", "point": "One, with {braces}', '"}', ',\n  {"timestamp": "01:0',
+                 '2:05", "poi', 'nt": "Two"}', ', {"timestamp": "bad", "point": "Dropped"}]']
+    seen = []
+    for fragment in fragments:
+        stream.feed(fragment)
+        seen.append(len(points))
+    assert seen == [0, 0, 1, 1, 1, 2, 2]
+    assert [(point['seconds'], point['text']) for point in points] == [
+        (12.5, 'One, with {braces}'), (3725.0, 'Two')]
+    assert stream.buffer == ''
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"ok  {name}")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Checks the hierarchical summary tree on a three-hour fake transcript with a
+fake model: range parsing, which aligned nodes cover a range, the default
+view level, and reuse of summary_nodes stored by earlier requests.
+
+Run directly (python tests/test_summary_tree.py) or with pytest.
+"""
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+from db import ConnectionPool
+from migrations import migrate
+from summary_points import format_time
+from summary_tree import InvalidRange, SummaryTree, range_options
+
+# One caption every 30 seconds for three hours
+ENTRIES = [{'text': f'line {i}', 'start': i * 30.0, 'duration': 30.0} for i in range(360)]
+LINE_PATTERN = re.compile(r'^\[([\d:]+)\] (.*)$', re.MULTILINE)
+
+
+class FakeModel:
+    """Answers segment prompts with their first two lines and merge prompts with the first three points"""
+
+    def __init__(self):
+        self.prompts = []
+        self.lock = threading.Lock()
+
+    def __call__(self, prompt):
+        with self.lock:
+            self.prompts.append(prompt)
+        if prompt.startswith('Summarize this part'):
+            items = [{'timestamp': label, 'point': text} for label, text in LINE_PATTERN.findall(prompt)[:2]]
+        else:
+            items = json.loads(re.search(r'^\[.*\]$', prompt, re.MULTILINE).group(0))[:3]
+        return json.dumps(items)
+
+
+def format_lines(entries):
+    return [f"[{format_time(entry['start'])}] {entry['text']}" for entry in entries]
+
+
+def make_tree(db, model):
+    return SummaryTree(db, model, 'fake-model', format_lines, segment_seconds=300, fanout=4, max_view_nodes=4)
+
+
+def with_db(test):
+    def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            db = ConnectionPool(os.path.join(tmp, 'tree.db'), size=4)
+            with db.connection() as conn:
+                migrate(conn)
+            try:
+                test(db)
+            finally:
+                db.close()
+    run.__name__ = test.__name__
+    return run
+
+
+def test_range_options_reads_long_video_timestamps():
+    assert range_options({'start': '120:00', 'end': '130:00'}) == (7200, 7800, None)
+    assert range_options({'start': '02:00:00', 'level': 1}) == (7200, None, 1)
+    assert range_options({}) == (0, None, None)
+    for data in ({'start': 'abc12:34xyz'}, {'start': 0, 'end': '130:00 or so'}, {'level': True}):
+        try:
+            range_options(data)
+            raise AssertionError(f'expected ValueError for {data}')
+        except ValueError:
+            pass
+
+
+def test_covering_aligns_to_node_spans():
+    tree = make_tree(None, FakeModel())
+    assert tree.covering(0, 7200, 7800) == [7200, 7500]
+    assert tree.covering(0, 7201, 7500.5) == [7200, 7500]
+    assert tree.covering(1, 7250, 7800) == [7200]
+    assert tree.covering(2, 0, 10800) == [0, 4800, 9600]
+    assert tree.top_level(10800) == 3
+
+
+def test_view_level_is_finest_that_fits():
+    tree = make_tree(None, FakeModel())
+    assert tree.view_level(0, 10800, 3) == 2
+    assert tree.view_level(7200, 7800, 3) == 0
+    assert tree.view_level(7200, 9600, 3) == 1
+
+
+@with_db
+def test_long_video_range_covers_only_the_requested_span(db):
+    model = FakeModel()
+    start, end, level = range_options({'start': '120:00', 'end': '130:00'})
+    view = make_tree(db, model).summarize_range('abc', ENTRIES, 'hash', 'en', start, end, level)
+    assert (view.level, view.levels, view.nodes, view.generated) == (0, 3, 2, 2)
+    assert view.points and all(7200 <= point['seconds'] < 7800 for point in view.points)
+    assert [point['label'] for point in view.points] == ['02:00:00', '02:00:30', '02:05:00', '02:05:30']
+    assert len(model.prompts) == 2
+
+
+@with_db
+def test_stored_nodes_are_reused_across_calls(db):
+    first = FakeModel()
+    make_tree(db, first).summarize_range('abc', ENTRIES, 'hash', 'en', 7200, 7800)
+
+    # A fresh tree (as after a restart) finds the same nodes in summary_nodes
+    second = FakeModel()
+    tree = make_tree(db, second)
+    again = tree.summarize_range('abc', ENTRIES, 'hash', 'en', 7200, 7800)
+    assert again.generated == 0 and second.prompts == []
+
+    # A coarser view only generates the two missing segments and the merge
+    coarser = tree.summarize_range('abc', ENTRIES, 'hash', 'en', 7200, 8400, level=1)
+    assert coarser.generated == 3
+    assert len(second.prompts) == 3
+    assert sum(prompt.startswith('Summarize this part') for prompt in second.prompts) == 2
+
+    # Another output language or transcript is a different tree
+    other = tree.summarize_range('abc', ENTRIES, 'hash', 'fr', 7200, 7800)
+    assert other.generated == 2
+
+
+@with_db
+def test_invalid_ranges_are_rejected(db):
+    tree = make_tree(db, FakeModel())
+    for start, end, level in ((7800, 7200, None), (-1, 600, None), (11000, None, None), (0, 600, 4)):
+        try:
+            tree.summarize_range('abc', ENTRIES, 'hash', 'en', start, end, level)
+            raise AssertionError(f'expected InvalidRange for {start}-{end} level {level}')
+        except InvalidRange:
+            pass
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"ok  {name}")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Checks the persistent transcript store on a freshly migrated throwaway
+database: the columnar encoding round-trips every entry, and what put()
+hands back and what get() later reads are the same transcript, including
+whether it is a YouTube translation.
+
+Run directly (python tests/test_transcript_store.py) or with pytest.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+from db import ConnectionPool
+from migrations import migrate
+from transcript_store import CompactTranscript, TranscriptStore, _to_blob, compact_from_columns
+from transcripts import ResolvedTranscript, summary_source
+
+ENTRIES = [
+    {'text': 'Bonjour à tous.', 'start': 0.0, 'duration': 2.5},
+    {'text': 'On commence.', 'start': 2.5, 'duration': 3.0},
+]
+
+# Empty cues and multi-byte text must keep their offsets
+MIXED_ENTRIES = [
+    {'text': '', 'start': 0.0, 'duration': 0.5},
+    {'text': 'naïve café', 'start': 0.5, 'duration': 1.25},
+    {'text': '', 'start': 1.75, 'duration': 0.0},
+    {'text': '日本語の字幕 🎬', 'start': 2.0, 'duration': 3.5},
+    {'text': 'end', 'start': 1e5 + 0.125, 'duration': 2.0},
+]
+
+
+def with_store(test):
+    def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            db = ConnectionPool(os.path.join(tmp, 'store.db'), size=1)
+            with db.connection() as conn:
+                migrate(conn)
+            try:
+                test(TranscriptStore(db))
+            finally:
+                db.close()
+    run.__name__ = test.__name__
+    return run
+
+
+def test_compact_transcript_round_trips_through_blobs():
+    compact = CompactTranscript.from_entries(MIXED_ENTRIES)
+    assert list(compact) == MIXED_ENTRIES
+    assert list(compact.ends) == [0, 10, 10, 18, 21]
+
+    restored = compact_from_columns(_to_blob(compact.starts), _to_blob(compact.durations),
+                                    _to_blob(compact.ends), compact.text)
+    assert list(restored) == MIXED_ENTRIES
+    assert len(restored) == 5
+    assert restored[-1] == MIXED_ENTRIES[-1]
+    assert restored[1:4] == MIXED_ENTRIES[1:4]
+    assert restored.text_at(2) == '' and restored.text_at(3) == '日本語の字幕 🎬'
+    assert restored.nbytes() == 5 * (8 + 8 + 4) + len(compact.text.encode('utf-8'))
+
+
+@with_store
+def test_stored_transcript_keeps_empty_and_non_ascii_entries(store):
+    store.put(ResolvedTranscript('abc', 'ja', False, MIXED_ENTRIES))
+    stored = store.get('abc', 'ja')
+    assert isinstance(stored.entries, CompactTranscript)
+    assert list(stored.entries) == MIXED_ENTRIES
+    assert store.get('abc', 'en') is None
+    assert store.get('missing') is None
+
+
+@with_store
+def test_translation_is_reported_on_fresh_and_stored_paths(store):
+    fetched = ResolvedTranscript('abc', 'fr', True, ENTRIES, translated_from='en')
+    fresh = store.put(fetched)
+    stored = store.get('abc', 'fr')
+    for resolved in (fresh, stored):
+        assert resolved.translated_from == 'en'
+        assert summary_source(resolved, 'fr') == 'youtube_translation'
+    assert list(stored.entries) == ENTRIES
+
+
+@with_store
+def test_native_track_is_not_a_translation(store):
+    store.put(ResolvedTranscript('abc', 'fr-CA', False, ENTRIES))
+    stored = store.get('abc', 'fr')
+    assert stored.translated_from is None
+    assert summary_source(stored, 'fr') == 'native_track'
+    assert summary_source(stored, 'en') == 'cross_language'
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"ok  {name}")
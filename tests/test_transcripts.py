@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Checks language handling in transcript selection: output-language keys,
+which track codes count as a language, and the order plan_tracks() tries
+native, translated and other tracks in.
+
+Run directly (python tests/test_transcripts.py) or with pytest.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+from transcripts import language_matches, normalize_language, plan_tracks
+
+
+class FakeTrack:
+    def __init__(self, language_code, is_generated=False, translation_languages=()):
+        self.language_code = language_code
+        self.is_generated = is_generated
+        self.is_translatable = bool(translation_languages)
+        self.translation_languages = [{'language_code': code} for code in translation_languages]
+
+    def __repr__(self):
+        return self.language_code
+
+
+def planned(tracks, output_language, preferred_languages=None):
+    plan = plan_tracks(tracks, preferred_languages or ['en'], output_language)
+    return [(track.language_code, translate_to) for track, translate_to in plan]
+
+
+def test_normalize_language():
+    assert normalize_language('en-US') == 'en'
+    assert normalize_language('PT-br') == 'pt'
+    assert normalize_language('zh') == 'zh-Hans'
+    assert normalize_language('zh-CN') == 'zh-Hans'
+    assert normalize_language('zh-TW') == 'zh-Hant'
+    assert normalize_language('zh-Hant-HK') == 'zh-Hant'
+    for code in ('', 'e', 'english!', 'en_US', None, 42):
+        try:
+            normalize_language(code)
+            raise AssertionError(f'expected ValueError for {code!r}')
+        except ValueError:
+            pass
+
+
+def test_language_matches():
+    assert language_matches('en-GB', 'en')
+    assert language_matches('en', 'en-US')
+    assert not language_matches('es', 'en')
+    # Chinese is matched by script, not by base language
+    assert language_matches('zh-TW', 'zh-Hant')
+    assert language_matches('zh', 'zh-Hans')
+    assert not language_matches('zh-Hans', 'zh-Hant')
+    # Other languages only disagree when both codes name a script
+    assert language_matches('sr', 'sr-Latn')
+    assert not language_matches('sr-Cyrl', 'sr-Latn')
+
+
+def test_plan_prefers_native_then_translation_then_others():
+    tracks = [FakeTrack('en', is_generated=True, translation_languages=['fr', 'de']),
+              FakeTrack('fr-CA'), FakeTrack('en-GB')]
+    assert planned(tracks, 'fr') == [('fr-CA', None), ('en', 'fr'), ('en-GB', None), ('en', None)]
+    # No native track: the best translatable track is translated first, the others follow untranslated
+    assert planned(tracks, 'de') == [('en', 'de'), ('en-GB', None), ('en', None), ('fr-CA', None)]
+    # Without an output language the plan is just the preference order
+    assert planned(tracks, None) == [('en-GB', None), ('en', None), ('fr-CA', None)]
+
+
+def test_plan_keeps_chinese_scripts_apart():
+    tracks = [FakeTrack('zh-Hans', translation_languages=['zh-Hant', 'en']), FakeTrack('en')]
+    # A Simplified track is not native for a Traditional viewer
+    assert planned(tracks, 'zh-Hant') == [('zh-Hans', 'zh-Hant'), ('en', None), ('zh-Hans', None)]
+    assert planned(tracks, 'zh-Hans')[0] == ('zh-Hans', None)
+    assert planned([FakeTrack('zh-TW')], 'zh-Hant') == [('zh-TW', None)]
+
+
+def test_translation_target_matches_script():
+    tracks = [FakeTrack('en', translation_languages=['zh-Hans', 'zh-Hant'])]
+    assert planned(tracks, 'zh-Hant') == [('en', 'zh-Hant'), ('en', None)]
+    tracks = [FakeTrack('en', translation_languages=['zh-Hans'])]
+    assert planned(tracks, 'zh-Hant') == [('en', None)]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"ok  {name}")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Checks the write-behind watch-history buffer on a freshly migrated
+throwaway database: repeated views collapse, a view never moves a video
+back in history, batches flush on size, on time and on close(), and events
+of unknown users are dropped without losing the rest of their batch.
+
+Run directly (python tests/test_watch_history.py) or with pytest.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+from db import ConnectionPool
+from migrations import migrate
+from watch_history import UPSERT_WATCHED, WatchHistoryWriter, sqlite_timestamp
+
+EARLY, MIDDLE, LATE = (sqlite_timestamp(seconds) for seconds in (1_700_000_000, 1_700_000_060, 1_700_000_120))
+
+
+def with_db(test):
+    def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            db = ConnectionPool(os.path.join(tmp, 'history.db'), size=2)
+            with db.connection() as conn:
+                migrate(conn)
+                conn.executemany('INSERT INTO users (client_generated_user_id) VALUES (?)', [('alice',), ('bob',)])
+            try:
+                test(db)
+            finally:
+                db.close()
+    run.__name__ = test.__name__
+    return run
+
+
+def history(db):
+    with db.connection() as conn:
+        return sorted(conn.execute('SELECT user_id, video_id, watched_at FROM watched_videos').fetchall())
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'condition not reached in time'
+        time.sleep(0.005)
+
+
+@with_db
+def test_repeated_views_collapse_to_the_latest(db):
+    writer = WatchHistoryWriter(db, flush_interval=60)
+    writer.add(1, 'v1', MIDDLE)
+    writer.add(1, 'v1', LATE)
+    writer.add(1, 'v1', EARLY)
+    writer.add(2, 'v1', EARLY)
+    assert writer.pending() == 2
+    writer.close()
+    assert history(db) == [(1, 'v1', LATE), (2, 'v1', EARLY)]
+
+
+@with_db
+def test_older_view_does_not_move_a_video_back(db):
+    with db.connection() as conn:
+        conn.execute('INSERT INTO videos (video_id) VALUES (?)', ('v1',))
+        conn.execute(UPSERT_WATCHED, (1, 'v1', LATE))
+    writer = WatchHistoryWriter(db, flush_interval=60)
+    writer.add(1, 'v1', EARLY)
+    writer.add(1, 'v2', EARLY)
+    writer.close()
+    assert history(db) == [(1, 'v1', LATE), (1, 'v2', EARLY)]
+
+
+@with_db
+def test_full_batch_flushes_without_waiting(db):
+    writer = WatchHistoryWriter(db, max_batch=3, flush_interval=60)
+    try:
+        for video_id in ('v1', 'v2', 'v3'):
+            writer.add(1, video_id, MIDDLE)
+        wait_until(lambda: len(history(db)) == 3)
+    finally:
+        writer.close()
+
+
+@with_db
+def test_partial_batch_flushes_after_interval(db):
+    writer = WatchHistoryWriter(db, max_batch=500, flush_interval=0.05)
+    try:
+        writer.add(1, 'v1', MIDDLE)
+        wait_until(lambda: history(db) == [(1, 'v1', MIDDLE)])
+        assert writer.pending() == 0
+    finally:
+        writer.close()
+
+
+@with_db
+def test_unknown_users_are_dropped_from_the_batch(db):
+    writer = WatchHistoryWriter(db, flush_interval=60)
+    writer.add(1, 'v1', MIDDLE)
+    writer.add(99, 'v2', MIDDLE)
+    writer.add(2, 'v3', MIDDLE)
+    writer.close()
+    assert history(db) == [(1, 'v1', MIDDLE), (2, 'v3', MIDDLE)]
+
+
+@with_db
+def test_close_flushes_and_refuses_new_views(db):
+    writer = WatchHistoryWriter(db, flush_interval=60)
+    writer.add(1, 'v1', MIDDLE)
+    writer.close()
+    assert history(db) == [(1, 'v1', MIDDLE)]
+    try:
+        writer.add(1, 'v2')
+        raise AssertionError('expected RuntimeError')
+    except RuntimeError:
+        pass
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"ok  {name}")
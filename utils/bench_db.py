@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the notes / watch-history SQL paths with a connection per
+request (the old route behaviour) against the pooled WAL connections used
+by the server now. Runs against a throwaway database file.
+
+Usage: python utils/bench_db.py [--requests N] [--threads N]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+from db import ConnectionPool
+
+SCHEMA = '''
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_generated_user_id TEXT UNIQUE NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE notes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        video_id TEXT NOT NULL,
+        content TEXT NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE watched_videos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        video_id TEXT NOT NULL,
+        watched_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(user_id, video_id)
+    );
+'''
+
+USERS = 50
+
+
+def request_ops(conn, i):
+    """The statements run by save_note, get_notes_by_video and log_watched_video"""
+    user_id = i % USERS + 1
+    video_id = f"video{i % 200}"
+    cursor = conn.cursor()
+    cursor.execute('SELECT id FROM users WHERE id = ?', (user_id,))
+    cursor.fetchone()
+    cursor.execute('INSERT INTO notes (user_id, video_id, content) VALUES (?, ?, ?)',
+                   (user_id, video_id, f"note {i}"))
+    conn.commit()
+    cursor.execute('''
+        SELECT id, content, created_at, updated_at FROM notes
+        WHERE user_id = ? AND video_id = ? ORDER BY created_at DESC
+    ''', (user_id, video_id))
+    cursor.fetchall()
+    cursor.execute('''
+        INSERT OR REPLACE INTO watched_videos (user_id, video_id, watched_at)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+    ''', (user_id, video_id))
+    conn.commit()
+
+
+def setup(db_file):
+    conn = sqlite3.connect(db_file)
+    conn.executescript(SCHEMA)
+    conn.executemany('INSERT INTO users (client_generated_user_id) VALUES (?)',
+                     [(f"user{n}",) for n in range(USERS)])
+    conn.commit()
+    conn.close()
+
+
+def run(label, handler, requests, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(handler, range(requests)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {requests / elapsed:10.0f} req/s  ({elapsed:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before_db = os.path.join(tmp, 'before.db')
+        setup(before_db)
+
+        def connect_per_request(i):
+            conn = sqlite3.connect(before_db, timeout=30)
+            try:
+                request_ops(conn, i)
+            finally:
+                conn.close()
+
+        run('connect per request', connect_per_request, args.requests, args.threads)
+
+        after_db = os.path.join(tmp, 'after.db')
+        setup(after_db)
+        pool = ConnectionPool(after_db, size=args.threads, busy_timeout=30)
+
+        def pooled(i):
+            with pool.connection() as conn:
+                request_ops(conn, i)
+
+        run('pooled WAL connections', pooled, args.requests, args.threads)
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
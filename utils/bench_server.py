@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Offline load benchmark for the summarizer server.
+
+YouTube and Gemini are replaced by fake backends with configurable latency,
+transcript size and error rate, and requests are driven through the Flask
+app's test client against a throwaway database, so results only depend on
+the server code and the machine. Each scenario reports throughput,
+p50/p99 latency and memory; --save-baseline records the results and
+--baseline compares a run against them (exit status 1 on regression).
+
+Usage: python utils/bench_server.py [--scenarios cold_cache,hot_cache,...] [--scale N]
+                                   [--save-baseline FILE | --baseline FILE]
+"""
+import argparse
+import asyncio
+import atexit
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import random
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server')
+sys.path.insert(0, SERVER_DIR)
+
+WORDS = ('the', 'model', 'data', 'we', 'see', 'here', 'that', 'this', 'is', 'what', 'happens', 'when',
+         'you', 'train', 'network', 'on', 'more', 'examples', 'and', 'then', 'look', 'at', 'results',
+         'really', 'important', 'because', 'so', 'next', 'step', 'works', 'well', 'in', 'practice')
+BRACKETED_TIME = re.compile(r'\[(\d+(?::\d{2}){1,2})\]')
+# Points quoted back to the model (translation and summary tree merge prompts)
+ITEM_TIME = re.compile(r'"timestamp": "(\d+(?::\d{2}){1,2})"')
+
+SCENARIOS = ('cold_cache', 'hot_cache', 'same_video_burst', 'long_transcript', 'range_deep_dive', 'note_heavy')
+REGRESSION_METRICS = (('throughput', -1), ('p50_ms', 1), ('p99_ms', 1))
+
+
+class TooManyRequests(Exception):
+    """Injected upstream failure; retryable by class name, like the real clients' 429s"""
+
+
+class FakeUpstream:
+    def __init__(self, latency, jitter, error_rate, seed):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def delay(self, extra=0.0):
+        """Sample this call's latency and decide whether it fails"""
+        self.calls += 1
+        seconds = self.latency * self.rng.uniform(1 - self.jitter, 1 + self.jitter) + extra
+        return seconds, self.rng.random() < self.error_rate
+
+
+def fake_entries(video_id, count, seed):
+    rng = random.Random(f"{seed}:{video_id}")
+    entries = []
+    start = 0.0
+    for _ in range(count):
+        duration = round(rng.uniform(1.5, 4.0), 2)
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 10)))
+        entries.append({'start': round(start, 2), 'duration': duration, 'text': text})
+        start += duration
+    return entries
+
+
+def fake_response(prompt, points):
+    """A plausible model answer citing `points` of the prompt's timestamps"""
+    times = list(dict.fromkeys(BRACKETED_TIME.findall(prompt) or ITEM_TIME.findall(prompt))) or ['00:00']
+    step = max(1, len(times) // points)
+    picked = times[::step][:points]
+    if prompt.startswith('This is one part'):
+        return '\n'.join(f"Timestamp: [{t}] - Key Point: Point about the part at {t}" for t in picked)
+    return json.dumps([{'timestamp': t, 'point': f"Key point discussed at {t}"} for t in picked])
+
+
+def make_backends(args):
+    from backends import LLMBackend, TranscriptBackend
+    from transcripts import ResolvedTranscript
+
+    class FakeTranscripts(TranscriptBackend):
+        """Stand-in for YouTube; transcript size is set per scenario through .entries"""
+
+        def __init__(self):
+            self.upstream = FakeUpstream(args.transcript_latency, args.jitter, args.transcript_error_rate, args.seed)
+            self.entries = args.entries
+
+        def resolve(self, video_id, languages=None, output_language=None):
+            seconds, fail = self.upstream.delay()
+            time.sleep(seconds)
+            if fail:
+                raise TooManyRequests(f"fake transcript failure for {video_id}")
+            return ResolvedTranscript(video_id, 'en', False, fake_entries(video_id, self.entries, args.seed))
+
+    class FakeLLM(LLMBackend):
+        """Stand-in for Gemini; latency grows with the prompt size"""
+
+        def __init__(self):
+            self.upstream = FakeUpstream(args.llm_latency, args.jitter, args.llm_error_rate, args.seed + 1)
+
+        def _call(self, prompt):
+            seconds, fail = self.upstream.delay(len(prompt) / 4000 * args.llm_seconds_per_1k_tokens)
+            if fail:
+                raise TooManyRequests('fake Gemini quota exceeded')
+            return seconds, fake_response(prompt, args.points)
+
+        def _fragments(self, text):
+            size = max(1, len(text) // args.fragments)
+            return [text[i:i + size] for i in range(0, len(text), size)]
+
+        def generate(self, prompt, **kwargs):
+            seconds, text = self._call(prompt)
+            time.sleep(seconds)
+            return text
+
+        def stream(self, prompt, **kwargs):
+            seconds, text = self._call(prompt)
+            fragments = self._fragments(text)
+            for fragment in fragments:
+                time.sleep(seconds / len(fragments))
+                yield fragment
+
+        async def generate_async(self, prompt, **kwargs):
+            seconds, text = self._call(prompt)
+            await asyncio.sleep(seconds)
+            return text
+
+        async def open_stream_async(self, prompt, **kwargs):
+            seconds, text = self._call(prompt)
+            fragments = self._fragments(text)
+
+            async def texts():
+                for fragment in fragments:
+                    await asyncio.sleep(seconds / len(fragments))
+                    yield fragment
+            return texts()
+
+    return FakeTranscripts(), FakeLLM()
+
+
+def configure_environment(args):
+    """Point the server at a throwaway database and lift its production rate limits.
+
+    Must run before the server module is imported; explicitly exported
+    variables win, so realistic limits can still be benchmarked.
+    """
+    tmp = tempfile.mkdtemp(prefix='bench-server-')
+    atexit.register(shutil.rmtree, tmp, True)
+    defaults = {
+        'GEMINI_API_KEY': 'offline-benchmark',
+        'DB_FILE': os.path.join(tmp, 'bench.db'),
+        'GEMINI_RATE': '100000', 'GEMINI_BURST': '100000', 'GEMINI_CONCURRENCY': '256',
+        'TRANSCRIPT_RATE': '100000', 'TRANSCRIPT_BURST': '100000',
+        'UPSTREAM_BACKOFF_BASE': '0.01', 'UPSTREAM_BACKOFF_MAX': '0.1',
+    }
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))]
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+def run_requests(name, requests, concurrency):
+    """Run request callables (each returning an HTTP status) and summarize latency"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def timed(request):
+        nonlocal errors
+        started = time.perf_counter()
+        status = request()
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, requests))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'scenario': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(latencies) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'rss_mb': round(rss_mb(), 1),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+class Bench:
+    def __init__(self, server, transcripts, args):
+        self.server = server
+        self.transcripts = transcripts
+        self.args = args
+        self.local = threading.local()
+
+    def client(self):
+        # Flask test clients are not shared between threads
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.server.app.test_client()
+        return client
+
+    def summarize(self, video_id):
+        return lambda: self.client().post('/summarize', json={'videoId': video_id}).status_code
+
+    def videos(self, prefix, count):
+        return [f"{prefix}-{n:04d}" for n in range(count)]
+
+    def scaled(self, n):
+        return max(1, int(n * self.args.scale))
+
+    def cold_cache(self):
+        """Every request is a first-time summary: transcript fetch, prompt and LLM call"""
+        videos = self.videos('cold', self.scaled(40))
+        return [self.summarize(v) for v in videos]
+
+    def hot_cache(self):
+        """Repeat requests served from the in-memory summary cache"""
+        videos = self.videos('hot', 20)
+        run_requests('warmup', [self.summarize(v) for v in videos], self.args.concurrency)
+        return [self.summarize(v) for v in itertools.islice(itertools.cycle(videos), self.scaled(2000))]
+
+    def same_video_burst(self):
+        """Bursts of identical concurrent requests that should share one pipeline run"""
+        requests = []
+        for video_id in self.videos('burst', self.scaled(10)):
+            requests += [self.summarize(video_id)] * self.args.concurrency
+        return requests
+
+    def long_transcript(self):
+        """Multi-hour transcripts that take the chunked map-reduce path"""
+        self.transcripts.entries = self.args.long_entries
+        return [self.summarize(v) for v in self.videos('long', self.scaled(4))]
+
+    def range_deep_dive(self):
+        """Zooming into parts of long videos: /summarize/range views built from shared summary tree nodes"""
+        self.transcripts.entries = self.args.long_entries
+        rng = random.Random(self.args.seed)
+        # fake_entries() captions average 2.75 seconds
+        minutes = int(self.args.long_entries * 2.75 // 60)
+
+        def view(video_id, start, length, level):
+            body = {'videoId': video_id, 'start': start * 60, 'end': (start + length) * 60}
+            if level is not None:
+                body['level'] = level
+            return lambda: self.client().post('/summarize/range', json=body).status_code
+
+        requests = []
+        for video_id in self.videos('range', self.scaled(4)):
+            for _ in range(self.scaled(50)):
+                length = rng.choice((5, 10, 20, 40))
+                start = rng.randrange(max(1, minutes - length))
+                requests.append(view(video_id, start, length, rng.choice((None, None, 0, 1))))
+        return requests
+
+    def note_heavy(self):
+        """Users with thousands of notes: paging notes and history while adding notes"""
+        server = self.server
+        users = []
+        with server.db.connection() as conn:
+            for n in range(10):
+                user_id = conn.execute(server.queries.INSERT_USER, (f"bench-user-{n}",)).fetchone()[0]
+                users.append(user_id)
+                videos = [f"notes-{n}-{v:03d}" for v in range(20)]
+                conn.executemany(server.queries.ENSURE_VIDEO, [(v,) for v in videos])
+                conn.executemany('INSERT INTO notes (user_id, video_id, content) VALUES (?, ?, ?)',
+                                 [(user_id, videos[i % len(videos)], f"note {i} " + ' '.join(WORDS[:12]))
+                                  for i in range(self.args.notes_per_user)])
+                conn.executemany('INSERT OR IGNORE INTO watched_videos (user_id, video_id) VALUES (?, ?)',
+                                 [(user_id, v) for v in videos])
+
+        rng = random.Random(self.args.seed)
+
+        def read_notes(user_id, video_id):
+            def request():
+                response = self.client().get(f'/users/{user_id}/notes_by_video/{video_id}')
+                cursor = response.get_json().get('next_cursor') if response.status_code == 200 else None
+                if cursor:
+                    response = self.client().get(f'/users/{user_id}/notes_by_video/{video_id}?cursor={cursor}')
+                return response.status_code
+            return request
+
+        def add_note(user_id, video_id):
+            return lambda: self.client().post(f'/users/{user_id}/notes',
+                                              json={'video_id': video_id, 'content': 'bench note'}).status_code
+
+        def read_history(user_id):
+            return lambda: self.client().get(f'/users/{user_id}/watched_videos').status_code
+
+        requests = []
+        for _ in range(self.scaled(2000)):
+            index = rng.randrange(len(users))
+            user_id, video_id = users[index], f"notes-{index}-{rng.randrange(20):03d}"
+            roll = rng.random()
+            if roll < 0.8:
+                requests.append(read_notes(user_id, video_id))
+            elif roll < 0.9:
+                requests.append(add_note(user_id, video_id))
+            else:
+                requests.append(read_history(user_id))
+        return requests
+
+    def run(self, name):
+        result = run_requests(name, getattr(self, name)(), self.args.concurrency)
+        self.transcripts.entries = self.args.entries
+        return result
+
+
+def compare(results, baseline, tolerance):
+    """Print per-metric changes against a baseline; returns the regressed metrics"""
+    base_results = {r['scenario']: r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        base = base_results.get(result['scenario'])
+        if base is None:
+            continue
+        for metric, direction in REGRESSION_METRICS:
+            if not base[metric]:
+                continue
+            change = (result[metric] - base[metric]) / base[metric]
+            flag = ''
+            if change * direction > tolerance:
+                flag = '  REGRESSION'
+                regressions.append(f"{result['scenario']}.{metric}")
+            print(f"  {result['scenario']:<18} {metric:<11} {base[metric]:>10} -> {result[metric]:>10} "
+                  f"({change:+.0%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply every scenario\'s request count')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--transcript-latency', type=float, default=0.2)
+    parser.add_argument('--llm-latency', type=float, default=0.5)
+    parser.add_argument('--llm-seconds-per-1k-tokens', type=float, default=0.02)
+    parser.add_argument('--jitter', type=float, default=0.3, help='latency spread, as a fraction of the mean')
+    parser.add_argument('--transcript-error-rate', type=float, default=0.0)
+    parser.add_argument('--llm-error-rate', type=float, default=0.0)
+    parser.add_argument('--entries', type=int, default=600, help='caption entries per transcript')
+    parser.add_argument('--long-entries', type=int, default=6000)
+    parser.add_argument('--notes-per-user', type=int, default=5000)
+    parser.add_argument('--points', type=int, default=6)
+    parser.add_argument('--fragments', type=int, default=8, help='streamed fragments per response')
+    parser.add_argument('--save-baseline', metavar='FILE')
+    parser.add_argument('--baseline', metavar='FILE', help='compare against a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    configure_environment(args)
+    import server  # reads its configuration from the environment at import time
+    logging.getLogger().setLevel(logging.WARNING)
+    server.init_database()
+
+    transcripts, llm = make_backends(args)
+    server.upstreams.transcripts = transcripts
+    server.upstreams.llm = llm
+    bench = Bench(server, transcripts, args)
+
+    print(f"{'scenario':<18} {'requests':>8} {'errors':>6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'rss MB':>8}")
+    results = []
+    for name in names:
+        result = bench.run(name)
+        results.append(result)
+        print(f"{name:<18} {result['requests']:>8} {result['errors']:>6} {result['throughput']:>9.1f} "
+              f"{result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['rss_mb']:>8.1f}")
+    print(f"upstream calls: transcripts={transcripts.upstream.calls} llm={llm.upstream.calls}")
+
+    config = {key: value for key, value in vars(args).items()
+              if key not in ('scenarios', 'save_baseline', 'baseline', 'tolerance')}
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'config': config, 'python': platform.python_version(), 'machine': platform.machine(),
+                       'cpus': os.cpu_count(), 'results': results}, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['config'] != config:
+            print("warning: baseline was recorded with different settings")
+        print(f"Compared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
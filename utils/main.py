@@ -1,9 +1,24 @@
-from youtube_transcript_api import YouTubeTranscriptApi
 from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import google.generativeai as genai
+import argparse
+import json
 import os
+import re
+import sys
+import time
 from dotenv import load_dotenv
 
+# Share the transcript selection logic with the server
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+from compaction import compact_entries
+from ratelimit import TokenBucket
+from summary_points import format_time
+from transcripts import resolve_transcript
+from upstream import pooled_session
+
+VIDEO_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]{11}')
+
 # Load environment variables
 load_dotenv()
 
@@ -23,14 +38,6 @@ except Exception as e:
     print("Please check your API key is valid")
     exit(1)
 
-def format_time(seconds):
-    """
-    Converts seconds to minutes:seconds format
-    """
-    minutes = int(seconds // 60)
-    remaining_seconds = int(seconds % 60)
-    return f"{minutes:02d}:{remaining_seconds:02d}"
-
 def extract_video_id(url):
     """
     Extracts the video ID from a YouTube URL.
@@ -45,23 +52,23 @@ def extract_video_id(url):
             return parsed_url.path.split('/')[2]
     raise ValueError("Invalid YouTube URL")
 
-def generate_summary_with_timestamps(transcript_entries):
+def summarize_entries(transcript_entries):
     """
-    Generates a summary with guaranteed timestamp associations using Gemini 1.5 Flash model
+    Summarizes transcript entries with Gemini 1.5 Flash; raises on failure
     """
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # First, create a structured format of the transcript with timestamps
-        formatted_transcript = []
-        for entry in transcript_entries:
-            timestamp = format_time(entry['start'])
-            text = entry['text']
-            formatted_transcript.append(f"[{timestamp}] {text}")
-        
-        transcript_text = "\n".join(formatted_transcript)
-        
-        prompt = f"""Analyze this video transcript and create a structured summary. For each key point:
+    model = genai.GenerativeModel('gemini-1.5-flash')
+    
+    # First, create a structured format of the transcript with timestamps,
+    # merging caption fragments and dropping repeated rolling-caption text
+    formatted_transcript = []
+    for entry in compact_entries(transcript_entries):
+        timestamp = format_time(entry['start'])
+        text = entry['text']
+        formatted_transcript.append(f"[{timestamp}] {text}")
+    
+    transcript_text = "\n".join(formatted_transcript)
+    
+    prompt = f"""Analyze this video transcript and create a structured summary. For each key point:
 1. Identify the most relevant timestamp
 2. Extract the main point
 3. Format as: "Timestamp: [MM:SS] - Key Point: [point]"
@@ -72,9 +79,16 @@ Transcript:
 Please provide a summary with 5-7 key points, each with its timestamp. Format exactly as shown above.
 Focus on main topics, important statements, and significant transitions in the video.
 """
-        
-        response = model.generate_content(prompt)
-        return response.text
+    
+    response = model.generate_content(prompt)
+    return response.text
+
+def generate_summary_with_timestamps(transcript_entries):
+    """
+    Generates a summary with guaranteed timestamp associations using Gemini 1.5 Flash model
+    """
+    try:
+        return summarize_entries(transcript_entries)
     except Exception as e:
         return f"Error generating summary: {e}"
 
@@ -88,7 +102,9 @@ def get_transcript_with_timestamps(video_url):
         
         # Try to get transcript with error handling
         try:
-            transcript = YouTubeTranscriptApi.get_transcript(video_id)
+            resolved = resolve_transcript(video_id)
+            transcript = resolved.entries
+            print(f"Using {'manual' if resolved.is_manual else 'auto-generated'} transcript in: {resolved.language_code}")
         except Exception as transcript_error:
             print(f"Error getting transcript: {transcript_error}")
             print("Make sure the video has captions available.")
@@ -109,7 +125,141 @@ def get_transcript_with_timestamps(video_url):
     except Exception as e:
         print(f"Error: {e}")
 
+def parse_video_ref(line):
+    """
+    Accepts a YouTube URL or a bare video ID
+    """
+    try:
+        return extract_video_id(line)
+    except (ValueError, KeyError, IndexError):
+        if VIDEO_ID_PATTERN.fullmatch(line):
+            return line
+        raise ValueError(f"Not a YouTube URL or video ID: {line}")
+
+def read_video_refs(stream):
+    """
+    Yields video IDs from a stream of URLs / IDs, one per line (# comments allowed)
+    """
+    for line in stream:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+def load_checkpoint(output_path):
+    """
+    Returns the video IDs already summarized successfully in an existing output file
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # partial line from an interrupted run
+            if record.get('status') == 'ok':
+                done.add(record['video_id'])
+    return done
+
+def summarize_video(video_id, transcript_limiter, llm_limiter, http_session=None):
+    """
+    Fetches and summarizes one video; returns a JSON-serializable result record
+    """
+    started = time.monotonic()
+    try:
+        transcript_limiter.acquire()
+        resolved = resolve_transcript(video_id, http_client=http_session)
+        llm_limiter.acquire()
+        summary = summarize_entries(resolved.entries)
+        return {
+            'video_id': video_id,
+            'status': 'ok',
+            'language': resolved.language_code,
+            'is_generated': resolved.is_generated,
+            'summary': summary,
+            'seconds': round(time.monotonic() - started, 2),
+        }
+    except Exception as e:
+        return {
+            'video_id': video_id,
+            'status': 'error',
+            'error': f"{type(e).__name__}: {e}",
+            'seconds': round(time.monotonic() - started, 2),
+        }
+
+def run_batch(input_stream, output_path, workers, transcript_rate, llm_rate):
+    """
+    Summarizes every video in input_stream concurrently and appends JSONL results
+    to output_path. Videos already present with status "ok" are skipped, so an
+    interrupted run can be resumed by re-running the same command.
+    """
+    done = load_checkpoint(output_path)
+    transcript_limiter = TokenBucket(transcript_rate)
+    llm_limiter = TokenBucket(llm_rate)
+    http_session = pooled_session(workers, timeout=15)
+    counts = {'ok': 0, 'error': 0, 'skipped': 0}
+    
+    with open(output_path, 'a', encoding='utf-8') as output, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        
+        def write_finished():
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                in_flight.discard(future)
+                record = future.result()
+                output.write(json.dumps(record) + "\n")
+                output.flush()
+                counts[record['status']] += 1
+                print(f"[{record['status']}] {record['video_id']} ({record['seconds']}s)", file=sys.stderr)
+        
+        for ref in read_video_refs(input_stream):
+            try:
+                video_id = parse_video_ref(ref)
+            except ValueError as e:
+                print(f"Skipping: {e}", file=sys.stderr)
+                continue
+            if video_id in done:
+                counts['skipped'] += 1
+                continue
+            done.add(video_id)
+            
+            # Keep a bounded window of work so huge inputs are streamed
+            while len(in_flight) >= workers * 2:
+                write_finished()
+            in_flight.add(pool.submit(summarize_video, video_id, transcript_limiter, llm_limiter, http_session))
+        
+        while in_flight:
+            write_finished()
+    
+    print(f"Done: {counts['ok']} summarized, {counts['error']} failed, "
+          f"{counts['skipped']} already done", file=sys.stderr)
+    return counts
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="YouTube Video Summarizer")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="summarize every URL / video ID in FILE ('-' for stdin)")
+    parser.add_argument('--output', default='summaries.jsonl',
+                        help="JSONL results file, also used as the resume checkpoint")
+    parser.add_argument('--workers', type=int, default=4, help="videos processed concurrently")
+    parser.add_argument('--transcript-rate', type=float, default=2.0,
+                        help="max transcript fetches per second")
+    parser.add_argument('--llm-rate', type=float, default=1.0,
+                        help="max Gemini requests per second")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.batch:
+        if args.batch == '-':
+            run_batch(sys.stdin, args.output, args.workers, args.transcript_rate, args.llm_rate)
+        else:
+            with open(args.batch, encoding='utf-8') as input_file:
+                run_batch(input_file, args.output, args.workers, args.transcript_rate, args.llm_rate)
+        sys.exit(0)
+    
     # Example usage
     print("YouTube Video Summarizer")
     print("=" * 40)